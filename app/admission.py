@@ -0,0 +1,101 @@
+# File: app/admission.py
+
+import os
+import shutil
+import time
+from typing import Callable, Optional
+from app.utils import logger
+
+
+class AdmissionController:
+    """
+    Contrôle d'admission pour l'endpoint d'upload.
+
+    Refuse les nouvelles soumissions lorsque le serveur est saturé : trop d'ingestions
+    simultanées, trop de jobs d'upload en attente, pas assez d'espace disque libre
+    dans le répertoire d'upload ou quota du spool atteint. Les mesures coûteuses
+    (file d'attente, disque, spool) sont mises en cache pendant `cache_ttl` secondes.
+    """
+
+    def __init__(
+        self,
+        upload_directory: str,
+        pending_jobs_counter: Callable[[], int],
+        max_inflight_ingests: int = 0,
+        max_pending_jobs: int = 0,
+        min_free_disk_bytes: int = 0,
+        spool_bytes_counter: Optional[Callable[[], int]] = None,
+        max_spool_bytes: int = 0,
+        retry_after: int = 30,
+        cache_ttl: float = 1.0
+    ):
+        self.upload_directory = upload_directory
+        self.pending_jobs_counter = pending_jobs_counter
+        self.max_inflight_ingests = max_inflight_ingests
+        self.max_pending_jobs = max_pending_jobs
+        self.min_free_disk_bytes = min_free_disk_bytes
+        self.spool_bytes_counter = spool_bytes_counter
+        self.max_spool_bytes = max_spool_bytes
+        self.retry_after = retry_after
+        self.cache_ttl = cache_ttl
+        self.inflight = 0
+        self._pending_jobs = 0
+        self._free_disk = 0
+        self._spool_bytes = 0
+        self._measured_at = 0.0
+
+    def _refresh(self) -> None:
+        now = time.monotonic()
+        if now - self._measured_at < self.cache_ttl:
+            return
+        self._measured_at = now
+        if self.max_pending_jobs:
+            try:
+                self._pending_jobs = self.pending_jobs_counter()
+            except Exception as e:
+                logger.error(f"Impossible de lire la taille de la file d'attente: {e}")
+                self._pending_jobs = 0
+        if self.min_free_disk_bytes:
+            # Le répertoire d'upload peut ne pas encore exister : on mesure son parent existant
+            path = os.path.abspath(self.upload_directory)
+            while not os.path.exists(path):
+                path = os.path.dirname(path)
+            self._free_disk = shutil.disk_usage(path).free
+        if self.max_spool_bytes and self.spool_bytes_counter:
+            try:
+                self._spool_bytes = self.spool_bytes_counter()
+            except Exception as e:
+                logger.error(f"Impossible de lire l'occupation du spool: {e}")
+                self._spool_bytes = 0
+
+    def try_admit(self, pending_jobs: bool = True, storage: bool = True) -> Optional[str]:
+        """
+        Tente d'admettre une nouvelle ingestion.
+
+        Args:
+            pending_jobs (bool): Vérifier la taille de la file des jobs (la requête crée un job).
+            storage (bool): Vérifier l'espace disque et le quota du spool (la requête écrit sur disque).
+
+        Returns:
+            Optional[str]: None si la requête est admise (elle doit alors appeler `release`),
+            sinon la raison du refus.
+        """
+        if self.max_inflight_ingests and self.inflight >= self.max_inflight_ingests:
+            return f"Trop d'uploads en cours ({self.inflight}/{self.max_inflight_ingests})."
+
+        self._refresh()
+        if pending_jobs and self.max_pending_jobs and self._pending_jobs >= self.max_pending_jobs:
+            return f"Trop de jobs d'upload en attente ({self._pending_jobs}/{self.max_pending_jobs})."
+        if storage and self.min_free_disk_bytes and self._free_disk < self.min_free_disk_bytes:
+            return f"Espace disque insuffisant ({self._free_disk // (1024 * 1024)} Mo libres)."
+        if storage and self.max_spool_bytes and self._spool_bytes >= self.max_spool_bytes:
+            return f"Quota du spool atteint ({self._spool_bytes // (1024 * 1024)} Mo utilisés)."
+
+        self.inflight += 1
+        return None
+
+    def release(self) -> None:
+        """
+        Libère le créneau d'une ingestion admise.
+        """
+        self.inflight = max(0, self.inflight - 1)
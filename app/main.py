@@ -1,34 +1,84 @@
 # File: app/main.py
 
 from fastapi import FastAPI, File, UploadFile, Form, HTTPException, BackgroundTasks, Request, Security
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Tuple
 from datetime import date
+from contextlib import asynccontextmanager
 import os
+import re
 import uuid
+import json
+import hashlib
+import shutil
+import asyncio
 import traceback
 from fastapi import Depends
 from fastapi import HTTPException, Security, status
 
-from dotenv import load_dotenv
-
+from app.admission import AdmissionController
+from app.resumable import (
+    ResumableSessionRequest, create_session, load_session, session_status, append_chunk,
+    finalize_session, start_session_gc
+)
 from app.utils import (
     create_upload_directory,
     create_identification_file,
-    rename_file,
+    build_file_save_path,
     logger,
     envoyer_notification_erreur_systeme,
-    get_api_key,
     get_user_email,
-    API_KEY_NAME
+    configure_logging
 )
+from app.security import APITokenMiddleware
+from app.validation import StreamValidator, check_filename, check_size, HEAD_BYTES
 
-from sharepoint_connector.sharepoint_uploader import upload_files_to_sharepoint
+from sharepoint_connector.job_lock import is_directory_locked
+from sharepoint_connector.job_queue import (
+    init_job_queue, enqueue_upload_job, pending_job_count, queue_snapshot, queue_stats, get_job_status,
+    KIND_SUBMISSION, KIND_RETRY, STATUS_SUCCEEDED, STATUS_FAILED
+)
+from sharepoint_connector.worker import start_embedded_dispatcher
+from sharepoint_connector.webhooks import init_webhooks, start_webhook_dispatcher
+from sharepoint_connector.integrity import hash_dossier
+from sharepoint_connector.remote_index import init_remote_index
+from sharepoint_connector.audit import record_event, start_audit_compaction, EVENT_DOSSIER_RECEIVED
+from sharepoint_connector.spool import init_spool, start_spool_gc, register_dossier, list_pending_dossiers, spool_bytes, spool_usage
+from sharepoint_connector.config import get_settings
 
-load_dotenv()
+settings = get_settings()
+UPLOAD_WORKER_MODE = settings.upload_worker_mode
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Initialise la file d'attente des uploads, le nettoyage du spool local et des
+    sessions reprenables, l'envoi des webhooks de fin de job et, en mode 'embedded',
+    démarre un dispatcher dans le processus de l'API.
+    En mode 'external', les uploads sont consommés par
+    `python -m sharepoint_connector.worker`.
+    """
+    configure_logging()
+    init_job_queue()
+    init_spool()
+    init_remote_index()
+    init_webhooks()
+    stop_events = [
+        start_spool_gc(UPLOAD_DIRECTORY),
+        start_session_gc(RESUMABLE_SESSIONS_DIRECTORY, RESUMABLE_SESSION_TTL),
+        start_webhook_dispatcher(),
+        start_audit_compaction()
+    ]
+    if UPLOAD_WORKER_MODE == "embedded":
+        stop_events.append(start_embedded_dispatcher())
+    else:
+        logger.info("Mode worker externe: les uploads sont traités par sharepoint_connector.worker.")
+    yield
+    for stop_event in stop_events:
+        stop_event.set()
+
+app = FastAPI(lifespan=lifespan)
 
 # CORS Configuration
 origins = [
@@ -46,13 +96,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-UPLOAD_DIRECTORY = os.getenv("UPLOAD_DIRECTORY")
-ALLOWED_EXTENSIONS_STR = os.getenv("ALLOWED_EXTENSIONS_STR", ".pdf,.docx,.xlsx,.jpg,.jpeg,.png,.gif")
-ALLOWED_EXTENSIONS = [ext.strip().lower() for ext in ALLOWED_EXTENSIONS_STR.split(',')]
+UPLOAD_DIRECTORY = settings.upload_directory
+ALLOWED_EXTENSIONS = settings.allowed_extensions
+
+# Sessions d'upload reprenables (hors de UPLOAD_DIRECTORY pour ne pas être prises pour des dossiers)
+RESUMABLE_SESSIONS_DIRECTORY = settings.resumable_sessions_directory
+RESUMABLE_SESSION_TTL = settings.resumable_session_ttl_hours * 3600
 
-if not UPLOAD_DIRECTORY:
-    UPLOAD_DIRECTORY = "uploaded_files"
-    logger.warning(f"UPLOAD_DIRECTORY not set in .env, using default: {UPLOAD_DIRECTORY}")
+# Limites de taille des fichiers reçus (voir validation.py)
+UPLOAD_MAX_FILE_BYTES = settings.upload_max_file_mb * 1024 * 1024
+UPLOAD_MAX_DOSSIER_BYTES = settings.upload_max_dossier_mb * 1024 * 1024
+
+# Contrôle d'admission (0 = pas de limite)
+admission = AdmissionController(
+    upload_directory=UPLOAD_DIRECTORY,
+    # Seules les soumissions comptent: les relances et imports en masse ne bloquent pas les participants
+    pending_jobs_counter=lambda: pending_job_count(kind=KIND_SUBMISSION),
+    max_inflight_ingests=settings.admission_max_inflight_ingests,
+    max_pending_jobs=settings.admission_max_pending_jobs,
+    min_free_disk_bytes=settings.admission_min_free_disk_mb * 1024 * 1024,
+    spool_bytes_counter=spool_bytes,
+    max_spool_bytes=settings.spool_quota_mb * 1024 * 1024,
+    retry_after=settings.admission_retry_after
+)
 
 @app.post("/uploadfiles/")
 async def create_upload_files(
@@ -60,7 +126,7 @@ async def create_upload_files(
     name: str = Form(...),
     date_of_birth: str = Form(...),
     email: str = Form(...),
-    background_tasks: BackgroundTasks = BackgroundTasks()
+    reference: Optional[str] = Form(None)
 ):
     """
     Endpoint pour uploader des fichiers. Protégé par un token de sécurité.
@@ -108,41 +174,49 @@ async def create_upload_files(
         logger.warning("No valid files uploaded.")
         raise HTTPException(status_code=400, detail="No valid files uploaded.")
 
+    # Contrôle de chaque fichier (extension, taille, signature) avant de créer le dossier
+    for file_data in files_data:
+        file = file_data["file"]
+        validator = StreamValidator(file.filename, UPLOAD_MAX_FILE_BYTES)
+        check_size(file.filename, file.size, UPLOAD_MAX_FILE_BYTES)
+        head = await file.read(HEAD_BYTES)
+        validator.feed(head)
+        if len(head) < HEAD_BYTES:
+            validator.finish()  # fichier entièrement lu
+        file_data.update(validator=validator, head=head)
+    check_size("dossier", sum(file_data["file"].size or 0 for file_data in files_data), UPLOAD_MAX_DOSSIER_BYTES)
+
     upload_dir = create_upload_directory(UPLOAD_DIRECTORY, email)
     create_identification_file(upload_dir, name, date_of_birth, email)
+    dossier_bytes = 0
+    dossier_files = []
 
     for file_data in files_data:
         file = file_data["file"]
         description = file_data["description"]
+        validator = file_data["validator"]
 
-        file_extension = os.path.splitext(file.filename)[1].lower()
-
-        if file_extension not in ALLOWED_EXTENSIONS:
-            logger.warning(f"File type not allowed for file: {file.filename}. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}")
-            raise HTTPException(
-                status_code=400,
-                detail=f"File type not allowed for file: {file.filename}. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}"
-            )
-        
-        # Renommer le fichier avec le nom original et l'horodatage
-        new_filename = rename_file(upload_dir, file.filename, description)
-        
-        # Déterminer le répertoire où sauvegarder le fichier
-        if description:
-            description_dir = os.path.join(upload_dir, description)
-            os.makedirs(description_dir, exist_ok=True)
-            logger.info(f"Created description directory: {description_dir}")
-            file_save_path = os.path.join(description_dir, os.path.basename(new_filename))
-        else:
-            file_save_path = new_filename
+        # Renommer le fichier avec le nom original et l'horodatage, dans le sous-dossier de sa description
+        file_save_path = build_file_save_path(upload_dir, file.filename, description)
 
         try:
+            # Empreinte calculée au fil de l'écriture, vérifiée après l'upload vers SharePoint
+            digest = hashlib.sha256()
+            file_bytes = 0
             with open(file_save_path, "wb") as f:
-                while True:
-                    chunk = await file.read(1024 * 1024)  # Lire par morceaux de 1MB
-                    if not chunk:
-                        break
+                chunk = file_data["head"]
+                while chunk:
                     f.write(chunk)
+                    digest.update(chunk)
+                    file_bytes += len(chunk)
+                    chunk = await file.read(1024 * 1024)  # Lire par morceaux de 1MB
+                    # Validé avant l'écriture : un fichier refusé n'est pas écrit plus loin
+                    validator.feed(chunk)
+            validator.finish()
+            dossier_bytes += file_bytes
+            dossier_files.append(
+                (os.path.relpath(file_save_path, upload_dir).replace("\\", "/"), file_bytes, digest.hexdigest())
+            )
             file_info = {
                 "original_filename": file.filename,
                 "content_type": file.content_type,
@@ -151,20 +225,27 @@ async def create_upload_files(
             }
             uploaded_files_info.append(file_info)
             logger.info(f"Saved file {file.filename} to {file_save_path}")
+        except HTTPException:
+            # Fichier refusé en cours de réception : le dossier incomplet n'est pas conservé
+            shutil.rmtree(upload_dir, ignore_errors=True)
+            raise
         except Exception as e:
             logger.error(f"Error saving file {file.filename}: {e}")
             raise HTTPException(status_code=500, detail=f"Error saving file {file.filename}: {e}")
         finally:
             await file.close()
     
-    background_tasks.add_task(upload_files_to_sharepoint, upload_dir, email)  # Lancer l'upload vers SharePoint en arrière-plan
-    logger.info(f"Initiated SharePoint upload for directory: {upload_dir}")
+    register_dossier(upload_dir, email, dossier_bytes, files=dossier_files)
+    job_id = enqueue_upload_job(upload_dir, email, reference=reference)  # L'upload vers SharePoint est traité par un worker
+    logger.info(f"Queued SharePoint upload job {job_id} for directory: {upload_dir}")
+    record_event(EVENT_DOSSIER_RECEIVED, email, upload_dir, job_id, dossier_bytes, dossier_files, detail="formulaire")
 
     response = {
         "name": name,
         "date_of_birth": date_of_birth,
         "email": email,
         "uploaded_files_info": uploaded_files_info,
+        "job_id": job_id,
         "message": "Files uploaded and saved successfully! SharePoint upload initiated in the background."
     }
 
@@ -198,87 +279,104 @@ async def global_exception_handler(request: Request, exc: Exception):
         content={"detail": "Une erreur interne s'est produite. L'équipe de support a été notifiée."},
         background=background_tasks
     )
+# Endpoints qui créent un nouveau dossier ou une nouvelle session d'upload
+ADMISSION_PATHS = {"/uploadfiles/", "/resumable/"}
+# Morceaux d'une session reprenable (écrits sur disque) et finalisation (crée le job d'upload)
+RESUMABLE_CHUNK_PATH = re.compile(r"^/resumable/[^/]+/files/\d+$")
+RESUMABLE_FINALIZE_PATH = re.compile(r"^/resumable/[^/]+/finalize$")
+
+def admission_checks(method: str, path: str) -> Optional[Tuple[bool, bool]]:
+    """
+    Retourne les contrôles à appliquer à une requête (file des jobs, espace disque),
+    ou None si elle n'est pas soumise au contrôle d'admission.
+    """
+    if method == "POST" and path in ADMISSION_PATHS:
+        return True, True
+    if method == "PUT" and RESUMABLE_CHUNK_PATH.match(path):
+        return False, True
+    if method == "POST" and RESUMABLE_FINALIZE_PATH.match(path):
+        return True, False
+    return None
+
 @app.middleware("http")
-async def security_middleware(request: Request, call_next):
+async def admission_middleware(request: Request, call_next):
     """
-    Middleware pour valider le token de sécurité pour chaque requête.
+    Middleware de contrôle d'admission : rejette les uploads avec un 503 et un
+    en-tête Retry-After lorsque le serveur est saturé, avant la lecture du corps.
     """
-    try:
-        # Extraire le token depuis les en-têtes
-        api_key = request.headers.get(API_KEY_NAME)
-        if not api_key:
-            logger.warning("Token de sécurité manquant dans les en-têtes de la requête.")
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Token de sécurité manquant.",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        
-        expected_api_key = os.getenv("API_SECURITY_TOKEN")
-        if api_key != expected_api_key:
-            logger.warning("Token de sécurité invalide fourni.")
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Token de sécurité invalide.",
-            )
-        
-        # Si le token est valide, continuez le traitement de la requête
-        response = await call_next(request)
-        return response
-    except HTTPException as http_exc:
-        # Gérer les exceptions HTTP
+    checks = admission_checks(request.method, request.url.path)
+    if checks is None:
+        return await call_next(request)
+
+    content_length = request.headers.get("content-length")
+    if (request.url.path in ADMISSION_PATHS and content_length and content_length.isdigit()
+            and int(content_length) > UPLOAD_MAX_DOSSIER_BYTES):
+        logger.warning(f"Upload refusé: {content_length} octets, maximum {UPLOAD_MAX_DOSSIER_BYTES}.")
         return JSONResponse(
-            status_code=http_exc.status_code,
-            content={"detail": http_exc.detail},
+            status_code=413,
+            content={"detail": f"Dossier trop volumineux: maximum {UPLOAD_MAX_DOSSIER_BYTES} octets."},
         )
-    except Exception as e:
-        # Gérer les autres exceptions
-        error_trace = traceback.format_exc()
-        logger.error(f"Exception dans le middleware de sécurité: {e}\nTraceback: {error_trace}")
+
+    reason = admission.try_admit(*checks)
+    if reason:
+        logger.warning(f"Upload refusé par le contrôle d'admission: {reason}")
         return JSONResponse(
-            status_code=500,
-            content={"detail": "Une erreur interne s'est produite. L'équipe de support a été notifiée."},
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"detail": f"Service temporairement saturé. {reason}"},
+            headers={"Retry-After": str(admission.retry_after)},
         )
+    try:
+        return await call_next(request)
+    finally:
+        admission.release()
+
+# Authentification par token, avant le contrôle d'admission et la lecture du corps
+app.add_middleware(APITokenMiddleware)
+
 @app.get("/cause-error")
 async def cause_error():
     raise ValueError("Ceci est une erreur de test.")
 
 @app.post("/retry-failed-uploads/")
-async def retry_failed_uploads(background_tasks: BackgroundTasks):
+async def retry_failed_uploads():
     """
     Endpoint pour relancer les uploads échoués.
-    Parcourt tous les dossiers dans `uploaded_files/` et relance le processus
-    d'upload vers SharePoint si le dossier existe encore.
+    Relance le processus d'upload vers SharePoint pour tous les dossiers du spool
+    local qui n'ont pas encore été confirmés sur SharePoint.
     """
-    if not os.path.exists(UPLOAD_DIRECTORY):
-        # S'il n'y a pas de dossier du tout, on retourne un message sans erreur
-        return {"message": f"Le répertoire {UPLOAD_DIRECTORY} n'existe pas ou est vide."}
-    
-    # Récupérer la liste de tous les dossiers dans UPLOAD_DIRECTORY
-    subdirs = [
-        os.path.join(UPLOAD_DIRECTORY, d) for d in os.listdir(UPLOAD_DIRECTORY)
-        if os.path.isdir(os.path.join(UPLOAD_DIRECTORY, d))
-    ]
-    
-    if not subdirs:
+    # Les dossiers en attente sont lus depuis l'index du spool, sans parcourir le disque
+    dossiers = list_pending_dossiers()
+
+    if not dossiers:
         return {"message": "Aucun dossier à relancer. Tous les uploads sont peut-être déjà traités."}
     
     # Pour accumuler des informations sur ce qui va être relancé
     relaunch_info = []
     
-    for subdir in subdirs:
-        # On récupère l'email en lisant identification_client.txt
-        user_email = get_user_email(subdir)
+    for dossier in dossiers:
+        subdir = dossier["upload_dir"]
+        # Ignorer les dossiers en cours d'upload par un autre worker
+        if is_directory_locked(subdir):
+            logger.info(f"Dossier {subdir} déjà en cours d'upload. Relance ignorée.")
+            relaunch_info.append({
+                "folder": subdir,
+                "status": "Déjà en cours"
+            })
+            continue
+
+        # L'email est indexé à l'ingestion ; à défaut on lit identification_client.txt
+        user_email = dossier["email"] or get_user_email(subdir)
         if not user_email:
             # Si pas d'email, on ignore ou on log un warning
             logger.warning(f"Aucun email trouvé dans le dossier {subdir}. Upload non relancé.")
             continue
         
-        # Ajout de la tâche d'upload en arrière-plan
-        background_tasks.add_task(upload_files_to_sharepoint, subdir, user_email)
+        # Ajout du job d'upload dans la file d'attente
+        job_id = enqueue_upload_job(subdir, user_email, kind=KIND_RETRY)
         relaunch_info.append({
             "folder": subdir,
             "email": user_email,
+            "job_id": job_id,
             "status": "Relance programmée"
         })
     
@@ -286,4 +384,135 @@ async def retry_failed_uploads(background_tasks: BackgroundTasks):
     return {
         "message": "La relance des uploads échoués a été lancée en arrière-plan.",
         "details": relaunch_info
-    }
\ No newline at end of file
+    }
+
+@app.get("/queue/")
+async def get_upload_queue(limit: int = 100):
+    """
+    Endpoint d'observation de la file d'attente des uploads : position et temps
+    d'attente des jobs en attente, et temps d'attente observés par type de job
+    (nouvelles soumissions / relances) sur la dernière heure.
+    """
+    return {
+        "stats": queue_stats(),
+        "pending": queue_snapshot(limit=limit)
+    }
+
+@app.get("/spool/")
+async def get_spool_usage():
+    """
+    Endpoint d'observation du spool local : nombre de dossiers, volume occupé,
+    quota et espace disque libre.
+    """
+    return spool_usage(UPLOAD_DIRECTORY)
+
+@app.post("/resumable/")
+async def create_resumable_session(session_request: ResumableSessionRequest):
+    """
+    Crée une session d'upload reprenable. Le client envoie ensuite chaque fichier
+    par morceaux (PUT), peut reprendre après une coupure à partir de l'offset
+    courant (GET), puis finalise la session.
+    """
+    if not session_request.files:
+        raise HTTPException(status_code=400, detail="No valid files uploaded.")
+    for file in session_request.files:
+        check_filename(file.filename)
+        check_size(file.filename, file.size, UPLOAD_MAX_FILE_BYTES)
+        if file.size <= 0:
+            raise HTTPException(status_code=400, detail=f"Fichier refusé: {file.filename}: fichier vide")
+    check_size("dossier", sum(file.size for file in session_request.files), UPLOAD_MAX_DOSSIER_BYTES)
+
+    os.makedirs(RESUMABLE_SESSIONS_DIRECTORY, exist_ok=True)
+    session = create_session(RESUMABLE_SESSIONS_DIRECTORY, session_request)
+    return session_status(RESUMABLE_SESSIONS_DIRECTORY, session)
+
+@app.get("/resumable/{session_id}")
+async def get_resumable_session(session_id: str):
+    """
+    Retourne l'offset courant de chaque fichier d'une session reprenable.
+    """
+    session = load_session(RESUMABLE_SESSIONS_DIRECTORY, session_id)
+    return session_status(RESUMABLE_SESSIONS_DIRECTORY, session)
+
+@app.put("/resumable/{session_id}/files/{index}")
+async def put_resumable_chunk(session_id: str, index: int, request: Request):
+    """
+    Ajoute un morceau au fichier `index` de la session. L'en-tête `Upload-Offset`
+    doit contenir l'offset courant du fichier ; le corps est écrit sur disque au fil de l'eau.
+    """
+    session = load_session(RESUMABLE_SESSIONS_DIRECTORY, session_id)
+    try:
+        offset = int(request.headers.get("Upload-Offset", ""))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="En-tête Upload-Offset manquant ou invalide.")
+
+    new_offset = await append_chunk(RESUMABLE_SESSIONS_DIRECTORY, session, index, offset, request.stream())
+    return {
+        "session_id": session_id,
+        "index": index,
+        "offset": new_offset,
+        "complete": new_offset == session["files"][index]["size"]
+    }
+
+@app.post("/resumable/{session_id}/finalize")
+async def finalize_resumable_session(session_id: str):
+    """
+    Finalise une session complète : crée le dossier `{email}-{uuid}` et lance l'upload vers SharePoint.
+    """
+    session = load_session(RESUMABLE_SESSIONS_DIRECTORY, session_id)
+    upload_dir, uploaded_files_info, dossier_bytes = finalize_session(RESUMABLE_SESSIONS_DIRECTORY, session, UPLOAD_DIRECTORY)
+
+    # Les morceaux ont été reçus en plusieurs requêtes : les empreintes sont calculées sur les fichiers assemblés
+    dossier_files = await asyncio.to_thread(hash_dossier, upload_dir)
+    register_dossier(upload_dir, session["email"], dossier_bytes, files=dossier_files)
+    job_id = enqueue_upload_job(upload_dir, session["email"], reference=session.get("reference"))
+    logger.info(f"Queued SharePoint upload job {job_id} for directory: {upload_dir}")
+    record_event(EVENT_DOSSIER_RECEIVED, session["email"], upload_dir, job_id, dossier_bytes, dossier_files, detail="session reprenable")
+
+    return {
+        "name": session["name"],
+        "date_of_birth": session["date_of_birth"],
+        "email": session["email"],
+        "uploaded_files_info": uploaded_files_info,
+        "job_id": job_id,
+        "message": "Files uploaded and saved successfully! SharePoint upload initiated in the background."
+    }
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Retourne l'état d'un job d'upload : statut, état de chaque fichier, octets
+    envoyés, tentatives et lien SharePoint final. Lu depuis la base des jobs,
+    sans parcourir le disque.
+    """
+    job_status = await asyncio.to_thread(get_job_status, job_id)
+    if job_status is None:
+        raise HTTPException(status_code=404, detail="Job introuvable.")
+    return job_status
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, interval: float = 1.0):
+    """
+    Flux Server-Sent Events de l'état d'un job : un événement à chaque changement,
+    jusqu'à ce que le job soit terminé.
+    """
+    if await asyncio.to_thread(get_job_status, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job introuvable.")
+
+    async def events():
+        last_payload = None
+        while True:
+            job_status = await asyncio.to_thread(get_job_status, job_id)
+            if job_status is None:
+                # Job supprimé de la base pendant le suivi
+                yield f"event: error\ndata: {json.dumps({'detail': 'Job introuvable.'}, ensure_ascii=False)}\n\n"
+                return
+            payload = json.dumps(job_status, ensure_ascii=False)
+            if payload != last_payload:
+                yield f"event: status\ndata: {payload}\n\n"
+                last_payload = payload
+            if job_status["status"] in (STATUS_SUCCEEDED, STATUS_FAILED):
+                return
+            await asyncio.sleep(max(interval, 0.2))
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
@@ -0,0 +1,273 @@
+# File: app/resumable.py
+
+import asyncio
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from fastapi import HTTPException, status
+from pydantic import BaseModel
+from app.utils import create_upload_directory, create_identification_file, build_file_save_path, logger
+from app.validation import HEAD_BYTES, UPLOAD_VALIDATION, check_head, validate_file
+
+SESSION_FILE = "session.json"
+SESSION_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+# Un seul PUT à la fois par fichier de session dans ce processus
+_part_locks: Dict[str, asyncio.Lock] = {}
+
+
+class ResumableFile(BaseModel):
+    filename: str
+    size: int
+    description: Optional[str] = None
+
+
+class ResumableSessionRequest(BaseModel):
+    name: str
+    date_of_birth: str
+    email: str
+    files: List[ResumableFile]
+    reference: Optional[str] = None
+
+
+def _session_dir(sessions_dir: str, session_id: str) -> str:
+    return os.path.join(sessions_dir, session_id)
+
+
+def _part_path(sessions_dir: str, session_id: str, index: int) -> str:
+    return os.path.join(_session_dir(sessions_dir, session_id), f"{index}.part")
+
+
+def _check_path_component(value: str, field: str) -> None:
+    """
+    Vérifie qu'un nom fourni par le client (nom de fichier, description) ne peut
+    désigner qu'une entrée du dossier d'upload.
+
+    Raises:
+        HTTPException: 400 si le nom est vide ou contient un séparateur ou « .. ».
+    """
+    if not value.strip() or "/" in value or "\\" in value or "\0" in value or ".." in value or value.strip() == ".":
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"{field} invalide: {value!r}")
+
+
+def create_session(sessions_dir: str, request: ResumableSessionRequest) -> Dict:
+    """
+    Crée une session d'upload reprenable et retourne ses métadonnées.
+
+    Raises:
+        HTTPException: 400 si un nom de fichier ou une description n'est pas un simple nom.
+    """
+    for file in request.files:
+        _check_path_component(file.filename, "Nom de fichier")
+        if file.description:
+            _check_path_component(file.description, "Description")
+
+    session_id = uuid.uuid4().hex
+    session_dir = _session_dir(sessions_dir, session_id)
+    os.makedirs(session_dir)
+    session = {
+        "session_id": session_id,
+        "name": request.name,
+        "date_of_birth": request.date_of_birth,
+        "email": request.email,
+        "files": [file.model_dump() for file in request.files],
+        "reference": request.reference,
+        "created_at": time.time()
+    }
+    with open(os.path.join(session_dir, SESSION_FILE), "w", encoding="utf-8") as f:
+        json.dump(session, f)
+    for index in range(len(request.files)):
+        open(_part_path(sessions_dir, session_id, index), "wb").close()
+    logger.info(f"Session d'upload reprenable {session_id} créée pour {request.email} ({len(request.files)} fichier(s)).")
+    return session
+
+
+def load_session(sessions_dir: str, session_id: str) -> Dict:
+    """
+    Charge une session existante.
+
+    Raises:
+        HTTPException: 404 si la session n'existe pas (ou plus).
+    """
+    session_file = os.path.join(_session_dir(sessions_dir, session_id), SESSION_FILE)
+    if not SESSION_ID_PATTERN.match(session_id) or not os.path.isfile(session_file):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session d'upload introuvable ou expirée.")
+    with open(session_file, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def session_status(sessions_dir: str, session: Dict) -> Dict:
+    """
+    Retourne l'offset courant de chaque fichier de la session.
+    """
+    files = []
+    for index, file in enumerate(session["files"]):
+        offset = os.path.getsize(_part_path(sessions_dir, session["session_id"], index))
+        files.append({
+            "index": index,
+            "filename": file["filename"],
+            "size": file["size"],
+            "offset": offset,
+            "complete": offset == file["size"]
+        })
+    return {"session_id": session["session_id"], "files": files}
+
+
+async def append_chunk(sessions_dir: str, session: Dict, index: int, offset: int, stream: AsyncIterator[bytes]) -> int:
+    """
+    Ajoute un morceau de fichier à la session, écrit directement sur disque au fil du flux.
+
+    Args:
+        offset (int): Position annoncée par le client ; doit être égale à la taille déjà reçue.
+        stream (AsyncIterator[bytes]): Corps de la requête.
+
+    Returns:
+        int: Nouvel offset du fichier.
+
+    Raises:
+        HTTPException: 404 si l'index est inconnu, 409 si l'offset ne correspond pas,
+        413 si le fichier dépasse la taille annoncée à la création de la session,
+        400 si le début du fichier ne correspond pas à son extension (la partie reçue est alors effacée).
+    """
+    if not 0 <= index < len(session["files"]):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Fichier {index} inconnu dans la session.")
+    expected_size = session["files"][index]["size"]
+    filename = session["files"][index]["filename"]
+    head_size = min(HEAD_BYTES, expected_size) if UPLOAD_VALIDATION == "on" else 0
+    path = _part_path(sessions_dir, session["session_id"], index)
+
+    lock = _part_locks.setdefault(path, asyncio.Lock())
+    async with lock:
+        current = os.path.getsize(path)
+        if offset != current:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail={"message": "Offset invalide.", "offset": current}
+            )
+        written = current
+        head = b""
+        if 0 < current < head_size:
+            with open(path, "rb") as f:
+                head = f.read()
+        with open(path, "ab") as f:
+            async for chunk in stream:
+                if written + len(chunk) > expected_size:
+                    raise HTTPException(
+                        status_code=413,
+                        detail={"message": "Le fichier dépasse la taille annoncée.", "offset": written}
+                    )
+                if written < head_size:
+                    # Signature contrôlée dès que le début du fichier est reçu, avant de l'écrire
+                    head += chunk[:head_size - written]
+                    if len(head) >= head_size:
+                        try:
+                            check_head(filename, head)
+                        except HTTPException:
+                            f.truncate(0)
+                            raise
+                f.write(chunk)
+                written += len(chunk)
+        # La date de modification de la session sert à détecter les sessions abandonnées
+        os.utime(os.path.join(_session_dir(sessions_dir, session["session_id"]), SESSION_FILE), None)
+    return written
+
+
+def finalize_session(sessions_dir: str, session: Dict, upload_directory: str) -> Tuple[str, List[Dict], int]:
+    """
+    Transforme une session complète en dossier d'upload `{email}-{uuid}`, avec la même
+    structure que l'endpoint /uploadfiles/.
+
+    Returns:
+        Tuple[str, List[Dict], int]: Dossier créé, informations des fichiers et taille totale.
+
+    Raises:
+        HTTPException: 409 si un fichier de la session est incomplet, 400 s'il est
+        vide, d'un autre type que son extension ou tronqué.
+    """
+    state = session_status(sessions_dir, session)
+    incomplete = [file["filename"] for file in state["files"] if not file["complete"]]
+    if incomplete:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"message": "Fichiers incomplets.", "files": incomplete}
+        )
+
+    for index, file in enumerate(session["files"]):
+        validate_file(_part_path(sessions_dir, session["session_id"], index), file["filename"])
+
+    upload_dir = create_upload_directory(upload_directory, session["email"])
+    create_identification_file(upload_dir, session["name"], session["date_of_birth"], session["email"])
+    uploaded_files_info = []
+    total_bytes = 0
+    root = os.path.realpath(upload_dir)
+    for index, file in enumerate(session["files"]):
+        file_save_path = build_file_save_path(upload_dir, file["filename"], file["description"])
+        if os.path.commonpath([root, os.path.realpath(file_save_path)]) != root:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Nom de fichier invalide: {file['filename']!r}")
+        part_path = _part_path(sessions_dir, session["session_id"], index)
+        shutil.move(part_path, file_save_path)
+        _part_locks.pop(part_path, None)
+        total_bytes += file["size"]
+        uploaded_files_info.append({
+            "original_filename": file["filename"],
+            "saved_path": file_save_path,
+            "description": file["description"]
+        })
+        logger.info(f"Saved file {file['filename']} to {file_save_path}")
+
+    shutil.rmtree(_session_dir(sessions_dir, session["session_id"]), ignore_errors=True)
+    logger.info(f"Session d'upload reprenable {session['session_id']} finalisée dans {upload_dir}.")
+    return upload_dir, uploaded_files_info, total_bytes
+
+
+def collect_stale_sessions(sessions_dir: str, ttl: float) -> int:
+    """
+    Supprime les sessions sans activité depuis plus de `ttl` secondes.
+
+    Returns:
+        int: Nombre de sessions supprimées.
+    """
+    if not os.path.isdir(sessions_dir):
+        return 0
+    removed = 0
+    cutoff = time.time() - ttl
+    for entry in os.scandir(sessions_dir):
+        if not entry.is_dir() or not SESSION_ID_PATTERN.match(entry.name):
+            continue
+        try:
+            last_activity = os.path.getmtime(os.path.join(entry.path, SESSION_FILE))
+        except FileNotFoundError:
+            last_activity = entry.stat().st_mtime
+        if last_activity < cutoff:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            for path in [path for path in _part_locks if path.startswith(entry.path + os.sep)]:
+                _part_locks.pop(path, None)
+            removed += 1
+            logger.info(f"Session d'upload reprenable abandonnée supprimée: {entry.name}")
+    return removed
+
+
+def start_session_gc(sessions_dir: str, ttl: float, interval: float = 600) -> threading.Event:
+    """
+    Démarre la suppression périodique des sessions abandonnées dans un thread.
+
+    Returns:
+        threading.Event: Événement à positionner pour arrêter le thread.
+    """
+    stop_event = threading.Event()
+
+    def _run():
+        while not stop_event.is_set():
+            try:
+                collect_stale_sessions(sessions_dir, ttl)
+            except Exception as e:
+                logger.error(f"Erreur lors du nettoyage des sessions d'upload: {e}")
+            stop_event.wait(interval)
+
+    threading.Thread(target=_run, name="resumable-gc", daemon=True).start()
+    return stop_event
@@ -0,0 +1,120 @@
+# File: app/security.py
+
+"""
+Authentification des requêtes de l'API par token (en-tête X-API-Token).
+
+Les tokens acceptés sont lus une seule fois : API_SECURITY_TOKEN et, pendant
+une rotation, les tokens supplémentaires de API_SECURITY_TOKENS (séparés par
+des virgules). La comparaison se fait en temps constant sur les empreintes
+SHA-256 des tokens, et tous les tokens actifs sont toujours comparés.
+
+`APITokenMiddleware` rejette les requêtes non authentifiées avant la lecture
+du corps ; `get_api_key` applique la même validation comme dépendance FastAPI.
+"""
+
+import hashlib
+import hmac
+from functools import lru_cache
+from typing import Iterable, Optional
+from fastapi import HTTPException, Security, status
+from fastapi.responses import JSONResponse
+from fastapi.security import APIKeyHeader
+from sharepoint_connector.config import get_settings
+from app.utils import logger
+
+# Définir le nom de l'en-tête où le token sera attendu
+API_KEY_NAME = "X-API-Token"
+_API_KEY_HEADER = API_KEY_NAME.lower().encode("latin-1")
+
+# Créer une instance de sécurité pour l'en-tête
+api_key_header = APIKeyHeader(name=API_KEY_NAME, auto_error=False)
+
+
+class APITokenValidator:
+    """
+    Valide un token par rapport à l'ensemble des tokens actifs.
+    """
+    def __init__(self, tokens: Iterable[str]):
+        self._digests = [hashlib.sha256(token.encode()).digest() for token in tokens if token]
+        if not self._digests:
+            logger.warning("Aucun token d'API configuré (API_SECURITY_TOKEN): toutes les requêtes seront refusées.")
+
+    def is_valid(self, api_key: str) -> bool:
+        candidate = hashlib.sha256(api_key.encode()).digest()
+        valid = False
+        for digest in self._digests:
+            # Pas d'arrêt au premier token valide : la durée ne dépend pas du token trouvé
+            valid |= hmac.compare_digest(candidate, digest)
+        return valid
+
+    def check(self, api_key: Optional[str]) -> str:
+        """
+        Raises:
+            HTTPException: 401 si le token est manquant, 403 s'il est invalide.
+        """
+        if not api_key:
+            logger.warning("Token de sécurité manquant dans les en-têtes de la requête.")
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token de sécurité manquant.",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        if not self.is_valid(api_key):
+            logger.warning("Token de sécurité invalide fourni.")
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Token de sécurité invalide.",
+            )
+        return api_key
+
+
+@lru_cache(maxsize=None)
+def get_token_validator() -> APITokenValidator:
+    return APITokenValidator(get_settings().active_api_tokens)
+
+
+class APITokenMiddleware:
+    """
+    Middleware ASGI qui valide le token de sécurité de chaque requête HTTP.
+    """
+    def __init__(self, app, validator: Optional[APITokenValidator] = None):
+        self.app = app
+        self.validator = validator or get_token_validator()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        api_key = None
+        for name, value in scope["headers"]:
+            if name == _API_KEY_HEADER:
+                api_key = value.decode("latin-1")
+                break
+        try:
+            self.validator.check(api_key)
+        except HTTPException as http_exc:
+            response = JSONResponse(
+                status_code=http_exc.status_code,
+                content={"detail": http_exc.detail},
+                headers=http_exc.headers
+            )
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+
+def get_api_key(api_key: Optional[str] = Security(api_key_header)) -> str:
+    """
+    Fonction de dépendance pour valider le token de sécurité présent dans les en-têtes de la requête.
+
+    Args:
+        api_key (Optional[str]): Le token récupéré depuis l'en-tête de la requête.
+
+    Returns:
+        str: Le token valide si la validation réussit.
+
+    Raises:
+        HTTPException: Si le token est manquant ou invalide.
+    """
+    return get_token_validator().check(api_key)
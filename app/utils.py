@@ -1,43 +1,43 @@
 # File: app/utils.py
 
 import os
+import json
 import uuid
 from datetime import datetime
-from typing import Optional
-from fastapi import HTTPException
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from typing import List, Optional
-from jinja2 import Environment, FileSystemLoader, select_autoescape
+from typing import Dict, List, Optional
 from logging.handlers import TimedRotatingFileHandler
 import logging
 import shutil
-from fastapi import HTTPException, Security, status
-from fastapi.security import APIKeyHeader
+import threading
 from email.utils import formataddr
 
-# Définir le nom de l'en-tête où le token sera attendu
-API_KEY_NAME = "X-API-Token"
+# Répertoire des templates d'e-mail (l'environnement Jinja2 est créé au premier envoi)
+TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), '..', 'email_templates')
+_template_env = None
 
-# Créer une instance de sécurité pour l'en-tête
-api_key_header = APIKeyHeader(name=API_KEY_NAME, auto_error=False)
 
-# Initialiser l'environnement Jinja2
-TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), '..', 'email_templates')
-env = Environment(
-    loader=FileSystemLoader(TEMPLATES_DIR),
-    autoescape=select_autoescape(['html', 'xml'])
-)
+def get_template_env():
+    """Retourne l'environnement Jinja2 des templates d'e-mail, créé au premier appel."""
+    global _template_env
+    if _template_env is None:
+        from jinja2 import Environment, FileSystemLoader, select_autoescape
 
+        _template_env = Environment(
+            loader=FileSystemLoader(TEMPLATES_DIR),
+            autoescape=select_autoescape(['html', 'xml'])
+        )
+    return _template_env
 
-# Configuration du Logging
-LOG_DIRECTORY = os.path.join(os.path.dirname(__file__), '..', 'logs')
-ARCHIVE_DIRECTORY = os.path.join(LOG_DIRECTORY, 'archive')
 
-# Créer les dossiers de log et d'archive s'ils n'existent pas
-os.makedirs(LOG_DIRECTORY, exist_ok=True)
-os.makedirs(ARCHIVE_DIRECTORY, exist_ok=True)
+# Fichier d'identification envoyé sur SharePoint, et sa version structurée (locale uniquement)
+IDENTIFICATION_FILE = "identification_client.txt"
+DOSSIER_METADATA_FILE = ".dossier.json"
+
+# Configuration du Logging (le répertoire est lu dans Settings.log_directory)
+ARCHIVE_SUBDIRECTORY = 'archive'
 
 class ArchivingTimedRotatingFileHandler(TimedRotatingFileHandler):
     """
@@ -45,6 +45,7 @@ class ArchivingTimedRotatingFileHandler(TimedRotatingFileHandler):
     """
     def __init__(self, filename, when='midnight', interval=1, backupCount=0, encoding=None, delay=False, utc=False, atTime=None):
         super().__init__(filename, when, interval, backupCount, encoding, delay, utc, atTime)
+        self.archive_directory = os.path.join(os.path.dirname(self.baseFilename), ARCHIVE_SUBDIRECTORY)
 
     def doRollover(self):
         super().doRollover()
@@ -52,28 +53,49 @@ class ArchivingTimedRotatingFileHandler(TimedRotatingFileHandler):
         if self.backupCount > 0:
             for i in range(self.backupCount, 0, -1):
                 sfn = f"{self.baseFilename}.{self.extMatch.match(str(i))}"
-                dfn = os.path.join(ARCHIVE_DIRECTORY, os.path.basename(sfn))
+                dfn = os.path.join(self.archive_directory, os.path.basename(sfn))
                 if os.path.exists(sfn):
                     shutil.move(sfn, dfn)
 
 
 
-# Configuration du Logger
+# Configuration du Logger (le fichier de log est attaché par configure_logging)
 logger = logging.getLogger("app_logger")
 logger.setLevel(logging.INFO)
 
-# Création du gestionnaire de fichiers de log avec rotation quotidienne
-log_file = os.path.join(LOG_DIRECTORY, 'app.log')
-handler = ArchivingTimedRotatingFileHandler(
-    log_file,
-    when='midnight',
-    interval=1,
-    backupCount=30,  # Nombre de fichiers de log à conserver dans l'archive
-    encoding='utf-8'
-)
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-handler.setFormatter(formatter)
-logger.addHandler(handler)
+_logging_lock = threading.Lock()
+_logging_configured = False
+
+
+def configure_logging(log_directory: Optional[str] = None) -> None:
+    """
+    Crée les dossiers de log et attache au logger le fichier de log à rotation
+    quotidienne (dans `log_directory`, par défaut Settings.log_directory). À appeler
+    uniquement depuis les points d'entrée (démarrage de l'API, `main` des workers
+    et des commandes) ; les appels suivants sont sans effet.
+    """
+    global _logging_configured
+    with _logging_lock:
+        if _logging_configured:
+            return
+        if log_directory is None:
+            from sharepoint_connector.config import get_settings
+            log_directory = get_settings().log_directory
+        os.makedirs(os.path.join(log_directory, ARCHIVE_SUBDIRECTORY), exist_ok=True)
+        handler = ArchivingTimedRotatingFileHandler(
+            os.path.join(log_directory, 'app.log'),
+            when='midnight',
+            interval=1,
+            backupCount=30,  # Nombre de fichiers de log à conserver dans l'archive
+            encoding='utf-8'
+        )
+        handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+        logger.addHandler(handler)
+        _logging_configured = True
+
+def is_logging_configured() -> bool:
+    """Indique si `configure_logging` a été appelée dans ce processus."""
+    return _logging_configured
 
 def create_upload_directory(base_dir: str, email: str) -> str:
     """Creates a unique upload directory based on email and a UUID without replacing '@'."""
@@ -85,18 +107,73 @@ def create_upload_directory(base_dir: str, email: str) -> str:
     return upload_dir
 
 def create_identification_file(upload_dir: str, name: str, date_of_birth: str, email: str) -> None:
-    """Creates the identification_client.txt file with client information."""
-    file_path = os.path.join(upload_dir, "identification_client.txt")
+    """
+    Creates the identification_client.txt file with client information, and the
+    structured metadata record of the dossier (see `read_dossier_metadata`).
+    """
+    file_path = os.path.join(upload_dir, IDENTIFICATION_FILE)
     try:
+        write_dossier_metadata(upload_dir, {"name": name, "date_of_birth": date_of_birth, "email": email})
         with open(file_path, "w", encoding="utf-8") as f:
-            f.write(f"Nom: {name}\n")
-            f.write(f"Date de naissance: {date_of_birth}\n")
-            f.write(f"Email: {email}\n")
+            # Une valeur sur plusieurs lignes casserait le format du fichier lu dans SharePoint
+            f.write(f"Nom: {_single_line(name)}\n")
+            f.write(f"Date de naissance: {_single_line(date_of_birth)}\n")
+            f.write(f"Email: {_single_line(email)}\n")
         logger.info(f"Created identification file at: {file_path}")
     except Exception as e:
+        from fastapi import HTTPException
+
         logger.error(f"Failed to create identification file at {file_path}: {e}")
         raise HTTPException(status_code=500, detail="Failed to create identification file.")
 
+def _single_line(value: str) -> str:
+    return " ".join(str(value).split())
+
+def write_dossier_metadata(upload_dir: str, metadata: Dict[str, str]) -> None:
+    """
+    Écrit les métadonnées du dossier (nom, date de naissance, email) au format JSON.
+    Le fichier est remplacé atomiquement.
+    """
+    path = os.path.join(upload_dir, DOSSIER_METADATA_FILE)
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(metadata, f, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+def read_dossier_metadata(upload_dir: str) -> Dict[str, str]:
+    """
+    Lit les métadonnées d'un dossier en une seule lecture.
+
+    Les dossiers créés avant l'introduction du fichier JSON sont lus depuis
+    identification_client.txt.
+
+    Returns:
+        Dict[str, str]: Clés "name", "date_of_birth" et "email" (vide si le dossier n'a pas de métadonnées).
+    """
+    try:
+        with open(os.path.join(upload_dir, DOSSIER_METADATA_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as e:
+        logger.error(f"Métadonnées illisibles pour le dossier {upload_dir}: {e}")
+
+    identification_file = os.path.join(upload_dir, IDENTIFICATION_FILE)
+    if not os.path.isfile(identification_file):
+        logger.warning(f"Le fichier {identification_file} n'existe pas.")
+        return {}
+    labels = {"Nom:": "name", "Date de naissance:": "date_of_birth", "Email:": "email"}
+    metadata = {}
+    try:
+        with open(identification_file, "r", encoding="utf-8") as f:
+            for line in f:
+                for label, key in labels.items():
+                    if line.startswith(label) and key not in metadata:
+                        metadata[key] = line[len(label):].strip()
+    except Exception as e:
+        logger.error(f"Erreur lors de la lecture du fichier {identification_file}: {e}")
+    return metadata
+
 def rename_file(upload_dir: str, original_filename: str, description: str) -> str:
     """
     Renomme le fichier en utilisant le nom original et un horodatage de réception.
@@ -118,9 +195,34 @@ def rename_file(upload_dir: str, original_filename: str, description: str) -> st
     logger.info(f"Renamed file '{original_filename}' to '{new_filename}'")
     return new_file_path
 
+def build_file_save_path(upload_dir: str, original_filename: str, description: Optional[str]) -> str:
+    """
+    Détermine le chemin de sauvegarde d'un fichier reçu dans un dossier d'upload.
+
+    Le fichier est renommé avec son horodatage de réception (voir `rename_file`) et
+    placé dans un sous-dossier portant sa description, si elle est fournie. Si un
+    fichier de même nom a été reçu dans la même seconde, un compteur est ajouté
+    (`nom_timestamp_2.ext`) plutôt que de l'écraser.
+
+    Returns:
+        str: Chemin complet où sauvegarder le fichier.
+    """
+    new_filename = rename_file(upload_dir, original_filename, description)
+    if description:
+        description_dir = os.path.join(upload_dir, description)
+        os.makedirs(description_dir, exist_ok=True)
+        logger.info(f"Created description directory: {description_dir}")
+        new_filename = os.path.join(description_dir, os.path.basename(new_filename))
+    name, file_extension = os.path.splitext(new_filename)
+    save_path, counter = new_filename, 1
+    while os.path.exists(save_path):
+        counter += 1
+        save_path = f"{name}_{counter}{file_extension}"
+    return save_path
+
 def get_user_name(upload_dir: str) -> Optional[str]:
     """
-    Extrait le nom de l'utilisateur depuis le fichier identification_client.txt.
+    Retourne le nom de l'utilisateur d'un dossier d'upload.
     
     Args:
         upload_dir (str): Chemin vers le répertoire d'upload de l'utilisateur.
@@ -128,22 +230,7 @@ def get_user_name(upload_dir: str) -> Optional[str]:
     Returns:
         Optional[str]: Nom de l'utilisateur si trouvé, sinon None.
     """
-    identification_file = os.path.join(upload_dir, "identification_client.txt")
-    if not os.path.isfile(identification_file):
-        logger.warning(f"Le fichier {identification_file} n'existe pas.")
-        return None
-    
-    try:
-        with open(identification_file, "r", encoding="utf-8") as f:
-            for line in f:
-                if line.startswith("Nom:"):
-                    name = line.split("Nom:")[1].strip()
-                    logger.info(f"Extracted user name: {name}")
-                    return name
-    except Exception as e:
-        logger.error(f"Erreur lors de la lecture du fichier {identification_file}: {e}")
-    
-    return None
+    return read_dossier_metadata(upload_dir).get("name") or None
 
 # File: app/utils.py
 
@@ -169,7 +256,7 @@ def send_email(subject: str, template_name: str, context: dict, recipients: List
 
     # Charger et rendre le template avec le contexte
     try:
-        template = env.get_template(template_name)
+        template = get_template_env().get_template(template_name)
         html_content = template.render(context)
     except Exception as e:
         logger.error(f"Erreur lors du rendu du template {template_name}: {e}")
@@ -229,39 +316,9 @@ def envoyer_notification_erreur_systeme(user_email: str, error: Exception, trace
 
 
 
-def get_api_key(api_key: Optional[str] = Security(api_key_header)) -> str:
-    """
-    Fonction de dépendance pour valider le token de sécurité présent dans les en-têtes de la requête.
-    
-    Args:
-        api_key (Optional[str]): Le token récupéré depuis l'en-tête de la requête.
-
-    Returns:
-        str: Le token valide si la validation réussit.
-
-    Raises:
-        HTTPException: Si le token est manquant ou invalide.
-    """
-    if not api_key:
-        logger.warning("Token de sécurité manquant dans les en-têtes de la requête.")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token de sécurité manquant.",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    expected_api_key = os.getenv("API_SECURITY_TOKEN")
-    if api_key != expected_api_key:
-        logger.warning("Token de sécurité invalide fourni.")
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Token de sécurité invalide.",
-        )
-    
-    return api_key
 def get_user_email(upload_dir: str) -> Optional[str]:
     """
-    Extrait l'email de l'utilisateur depuis le fichier identification_client.txt.
+    Retourne l'email de l'utilisateur d'un dossier d'upload.
 
     Args:
         upload_dir (str): Chemin vers le répertoire d'upload.
@@ -269,19 +326,4 @@ def get_user_email(upload_dir: str) -> Optional[str]:
     Returns:
         Optional[str]: Adresse email de l'utilisateur si trouvé, sinon None.
     """
-    identification_file = os.path.join(upload_dir, "identification_client.txt")
-    if not os.path.isfile(identification_file):
-        logger.warning(f"Le fichier {identification_file} n'existe pas.")
-        return None
-    
-    try:
-        with open(identification_file, "r", encoding="utf-8") as f:
-            for line in f:
-                if line.startswith("Email:"):
-                    email = line.split("Email:")[1].strip()
-                    logger.info(f"Extracted user email: {email}")
-                    return email
-    except Exception as e:
-        logger.error(f"Erreur lors de la lecture du fichier {identification_file}: {e}")
-    
-    return None
+    return read_dossier_metadata(upload_dir).get("email") or None
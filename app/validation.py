@@ -0,0 +1,180 @@
+# File: app/validation.py
+
+"""
+Validation des fichiers reçus, au fil du flux.
+
+Chaque fichier est contrôlé pendant sa réception :
+
+- extension autorisée (ALLOWED_EXTENSIONS) ;
+- taille non nulle et inférieure à UPLOAD_MAX_FILE_MB ;
+- signature ("magic bytes") cohérente avec l'extension, dès le premier morceau :
+  une page HTML renommée en .pdf est refusée avant d'être écrite ;
+- fin de fichier attendue pour le type (marqueur %%EOF d'un PDF, fin d'image
+  PNG/GIF, répertoire central d'une archive docx/xlsx), pour détecter les
+  fichiers tronqués.
+
+Avec UPLOAD_VALIDATION=off, seules l'extension et la taille sont contrôlées.
+"""
+
+import os
+from typing import Dict, List, Optional, Tuple
+from fastapi import HTTPException, status
+from sharepoint_connector.config import ALLOWED_EXTENSIONS, UPLOAD_MAX_FILE_MB, UPLOAD_VALIDATION
+from app.utils import logger
+
+HEAD_BYTES = 1024
+ZIP_SIGNATURE = b"PK\x03\x04"
+JPEG_SIGNATURE = b"\xff\xd8\xff"
+
+# Signatures acceptées par extension, et position maximale où les chercher
+SIGNATURES: Dict[str, Tuple[List[bytes], int]] = {
+    ".pdf": ([b"%PDF-"], HEAD_BYTES),  # la norme tolère quelques octets avant l'en-tête
+    ".docx": ([ZIP_SIGNATURE], 0),
+    ".xlsx": ([ZIP_SIGNATURE], 0),
+    ".jpg": ([JPEG_SIGNATURE], 0),
+    ".jpeg": ([JPEG_SIGNATURE], 0),
+    ".png": ([b"\x89PNG\r\n\x1a\n"], 0),
+    ".gif": ([b"GIF87a", b"GIF89a"], 0),
+}
+
+# Marqueur de fin attendu par extension, et taille de la fin de fichier où le chercher
+TRAILERS: Dict[str, Tuple[bytes, int]] = {
+    ".pdf": (b"%%EOF", 1024),
+    ".docx": (b"PK\x05\x06", 22 + 65535),  # fin du répertoire central, suivie d'un commentaire éventuel
+    ".xlsx": (b"PK\x05\x06", 22 + 65535),
+    # Pas de contrôle de fin pour les JPEG : certains téléphones ajoutent des données après l'image
+    ".png": (b"IEND", 64),
+    ".gif": (b";", 64),
+}
+
+
+def _reject(filename: str, reason: str, status_code: int = status.HTTP_400_BAD_REQUEST):
+    logger.warning(f"Fichier refusé: {filename}: {reason}")
+    raise HTTPException(status_code=status_code, detail=f"Fichier refusé: {filename}: {reason}")
+
+
+def check_filename(filename: str) -> str:
+    """
+    Vérifie l'extension d'un fichier reçu.
+
+    Returns:
+        str: Extension du fichier, en minuscules.
+
+    Raises:
+        HTTPException: 400 si l'extension n'est pas autorisée.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in ALLOWED_EXTENSIONS:
+        logger.warning(f"File type not allowed for file: {filename}. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}")
+        raise HTTPException(
+            status_code=400,
+            detail=f"File type not allowed for file: {filename}. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}"
+        )
+    return extension
+
+
+def check_size(filename: str, size: Optional[int], max_bytes: int) -> None:
+    """
+    Raises:
+        HTTPException: 413 si la taille annoncée dépasse `max_bytes`.
+    """
+    if size is not None and size > max_bytes:
+        _reject(filename, f"{size} octets, maximum {max_bytes}", 413)
+
+
+def check_head(filename: str, head: bytes) -> None:
+    """
+    Vérifie que le début d'un fichier (HEAD_BYTES octets, ou le fichier entier
+    s'il est plus petit) porte la signature de son extension.
+
+    Raises:
+        HTTPException: 400 si le contenu ne correspond pas à l'extension.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    signatures, max_offset = SIGNATURES.get(extension, ([], 0))
+    if signatures and not any(0 <= head.find(signature, 0, max_offset + len(signature)) for signature in signatures):
+        _reject(filename, f"le contenu ne correspond pas à un fichier {extension}")
+
+
+class StreamValidator:
+    """
+    Valide un fichier morceau par morceau : `feed` pour chaque morceau reçu (lève
+    une HTTPException dès qu'une anomalie est détectable), puis `finish`.
+    """
+
+    def __init__(self, filename: str, max_bytes: int = UPLOAD_MAX_FILE_MB * 1024 * 1024, check_content: bool = UPLOAD_VALIDATION == "on"):
+        self.filename = filename
+        self.extension = check_filename(filename)
+        self.max_bytes = max_bytes
+        self.check_content = check_content
+        self.size = 0
+        self._head = bytearray()
+        self._head_checked = False
+        self._tail = bytearray()
+        self._trailer = TRAILERS.get(self.extension)
+
+    def feed(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            _reject(self.filename, f"plus de {self.max_bytes} octets", 413)
+        if not self.check_content:
+            return
+        if not self._head_checked:
+            self._head += chunk[:HEAD_BYTES - len(self._head)]
+            if len(self._head) >= HEAD_BYTES:
+                self._check_head()
+        if self._trailer is not None:
+            self._tail += chunk[-self.tail_bytes:]
+            del self._tail[:-self.tail_bytes]
+
+    @property
+    def tail_bytes(self) -> int:
+        return self._trailer[1] if self._trailer is not None else 0
+
+    def skip(self, count: int) -> None:
+        """
+        Compte `count` octets sans les lire (milieu d'un fichier déjà sur disque).
+        """
+        if not self._head_checked and self.check_content:
+            self._check_head()
+        self.size += count
+        self._tail.clear()
+
+    def _check_head(self) -> None:
+        self._head_checked = True
+        check_head(self.filename, bytes(self._head))
+
+    def finish(self) -> None:
+        """
+        Raises:
+            HTTPException: 400 si le fichier est vide, d'un autre type ou tronqué.
+        """
+        if self.size == 0:
+            _reject(self.filename, "fichier vide")
+        if not self.check_content:
+            return
+        if not self._head_checked:
+            self._check_head()
+        if self._trailer is not None and self._trailer[0] not in self._tail:
+            _reject(self.filename, f"fichier {self.extension} incomplet ou corrompu")
+
+
+def validate_file(path: str, filename: str, max_bytes: int = UPLOAD_MAX_FILE_MB * 1024 * 1024) -> None:
+    """
+    Valide un fichier déjà sur disque (upload reçu en plusieurs requêtes) en ne
+    lisant que son début et sa fin.
+
+    Raises:
+        HTTPException: Si le fichier est refusé.
+    """
+    validator = StreamValidator(filename, max_bytes)
+    size = os.path.getsize(path)
+    check_size(filename, size, max_bytes)
+    with open(path, "rb") as f:
+        head = f.read(HEAD_BYTES)
+        validator.feed(head)
+        if size > HEAD_BYTES + validator.tail_bytes:
+            validator.skip(size - HEAD_BYTES - validator.tail_bytes)
+            f.seek(size - validator.tail_bytes)
+        validator.feed(f.read())
+    validator.finish()
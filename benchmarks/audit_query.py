@@ -0,0 +1,83 @@
+# File: benchmarks/audit_query.py
+
+"""
+Mesure le compactage et l'interrogation du journal d'audit (voir audit.py).
+
+Un an de journaux quotidiens est généré (dossiers reçus avec leurs fichiers,
+uploads et notifications), compacté, puis interrogé comme pour « quels fichiers
+le participant X a-t-il soumis au dernier trimestre ».
+
+    python benchmarks/audit_query.py --participants 5000 --events-per-day 600
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="Compactage et interrogation du journal d'audit.")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--participants", type=int, default=5000)
+    parser.add_argument("--events-per-day", type=int, default=600)
+    parser.add_argument("--files", type=int, default=5, help="Fichiers par dossier reçu.")
+    args = parser.parse_args(argv)
+
+    from sharepoint_connector.audit import compact_pending, query_events, EVENT_DOSSIER_RECEIVED
+    from app.utils import logger
+    logger.disabled = True
+
+    directory = tempfile.mkdtemp(prefix="audit-bench-")
+    rng = random.Random(0)
+    first_day = date(2025, 1, 1)
+    events = ["dossier_received", "upload_succeeded", "notification_sent", "notification_sent"]
+    journal_bytes = 0
+    for offset in range(args.days):
+        day = first_day + timedelta(days=offset)
+        ts = time.mktime(day.timetuple())
+        path = os.path.join(directory, f"events-{day.isoformat()}.jsonl")
+        with open(path, "w", encoding="utf-8") as f:
+            for i in range(args.events_per_day):
+                event = events[i % len(events)]
+                email = f"participant{rng.randrange(args.participants)}@example.com"
+                files = [[f"Releves/releve_{j}.pdf", 200000, "%064x" % rng.getrandbits(256)] for j in range(args.files)]
+                f.write(json.dumps({
+                    "ts": ts + i, "event": event, "email": email, "job_id": None, "upload_dir": None,
+                    "bytes": 200000 * args.files, "detail": None,
+                    "files": files if event == "dossier_received" else []
+                }) + "\n")
+        journal_bytes += os.path.getsize(path)
+
+    start = time.perf_counter()
+    compact_pending(directory)
+    compaction = time.perf_counter() - start
+    archive_bytes = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+    total = args.days * args.events_per_day
+    print(f"{total} événements sur {args.days} jours: compactés en {compaction:.1f} s")
+    print(f"  journaux {journal_bytes / 1e6:.0f} Mo -> bases {archive_bytes / 1e6:.0f} Mo")
+
+    last_day = first_day + timedelta(days=args.days - 1)
+    since = (last_day - timedelta(days=90)).isoformat()
+    timings, found_total = [], 0
+    for i in range(20):
+        email = f"participant{i}@example.com"
+        start = time.perf_counter()
+        found = query_events(email, since, last_day.isoformat(), EVENT_DOSSIER_RECEIVED, directory)
+        timings.append((time.perf_counter() - start) * 1000)
+        found_total += len(found)
+    timings.sort()
+    print(f"  dossiers reçus d'un participant sur 90 jours: médiane {timings[len(timings) // 2]:.1f} ms, "
+          f"max {timings[-1]:.1f} ms ({found_total} dossiers pour 20 participants)")
+    print(f"  répertoire de travail: {directory}")
+
+
+if __name__ == "__main__":
+    main()
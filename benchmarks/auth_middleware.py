@@ -0,0 +1,92 @@
+# File: benchmarks/auth_middleware.py
+
+"""
+Mesure le surcoût par requête de l'authentification par token.
+
+Les requêtes sont envoyées directement à l'application ASGI (sans réseau) :
+une application sans authentification sert de référence, comparée à
+`APITokenMiddleware` et à l'ancien middleware `@app.middleware("http")` qui
+lisait API_SECURITY_TOKEN à chaque requête.
+
+    python benchmarks/auth_middleware.py --requests 20000
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI, Request  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from app.security import APITokenMiddleware, APITokenValidator, API_KEY_NAME  # noqa: E402
+
+TOKEN = "benchmark-token"
+
+
+def build_app(auth: Optional[str]) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    if auth == "asgi":
+        app.add_middleware(APITokenMiddleware, validator=APITokenValidator([TOKEN]))
+    elif auth == "legacy":
+        @app.middleware("http")
+        async def security_middleware(request: Request, call_next):
+            api_key = request.headers.get(API_KEY_NAME)
+            if not api_key or api_key != os.getenv("API_SECURITY_TOKEN"):
+                return JSONResponse(status_code=403, content={"detail": "Token de sécurité invalide."})
+            return await call_next(request)
+    return app
+
+
+async def run(app: FastAPI, requests: int, token: str) -> float:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/ping", "raw_path": b"/ping", "root_path": "", "query_string": b"",
+        "headers": [(b"host", b"localhost"), (API_KEY_NAME.lower().encode(), token.encode())],
+        "client": ("127.0.0.1", 50000), "server": ("localhost", 80), "state": {}
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    for _ in range(min(requests, 1000)):  # échauffement
+        await app(dict(scope), receive, send)
+    start = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="Surcoût par requête de l'authentification par token.")
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args(argv)
+    os.environ["API_SECURITY_TOKEN"] = TOKEN
+    # Les refus sont journalisés : sans ce réglage, chaque requête refusée écrirait sur stderr
+    logging.getLogger("app_logger").setLevel(logging.ERROR)
+
+    baseline = asyncio.run(run(build_app(None), args.requests, TOKEN))
+    print(f"sans authentification: {baseline:7.1f} us/requête")
+    for name, auth, token in [
+        ("APITokenMiddleware", "asgi", TOKEN),
+        ("APITokenMiddleware (refus)", "asgi", "mauvais-token"),
+        ("ancien middleware http", "legacy", TOKEN)
+    ]:
+        elapsed = asyncio.run(run(build_app(auth), args.requests, token))
+        print(f"{name}: {elapsed:7.1f} us/requête ({elapsed - baseline:+.1f} us)")
+
+
+if __name__ == "__main__":
+    main()
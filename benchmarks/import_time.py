@@ -0,0 +1,79 @@
+# File: benchmarks/import_time.py
+
+"""
+Mesure le temps d'import des points d'entrée (API et worker) avec `python -X importtime`.
+
+Chaque module est importé dans un processus neuf ; le script affiche le temps
+total et les modules les plus coûteux (temps cumulé).
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py app.main --top 15 --max-ms 400
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, List, Optional, Tuple
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MODULES = ["app.main", "sharepoint_connector.worker"]
+
+# Format de -X importtime : "import time: self [us] | cumulative | imported package"
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure_import(module: str) -> Tuple[float, List[Tuple[str, float]]]:
+    """
+    Importe un module dans un sous-processus et analyse la sortie de -X importtime.
+
+    Returns:
+        Tuple[float, List[Tuple[str, float]]]: Temps total (ms) et temps cumulé
+        (ms) de chaque module importé.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONPATH": PROJECT_ROOT}
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Import de {module} impossible:\n{result.stderr[-2000:]}")
+
+    cumulative: Dict[str, float] = {}
+    total = 0.0
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        cumulative_ms = int(match.group(2)) / 1000
+        cumulative[match.group(4)] = cumulative_ms
+        # Les imports de premier niveau (sans indentation) s'additionnent en temps total
+        if len(match.group(3)) == 1:
+            total += cumulative_ms
+    return total, sorted(cumulative.items(), key=lambda item: item[1], reverse=True)
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="Temps d'import des points d'entrée.")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--top", type=int, default=10, help="Nombre de modules les plus coûteux à afficher.")
+    parser.add_argument("--max-ms", type=float, help="Budget (ms) : code de sortie 1 si un module le dépasse.")
+    args = parser.parse_args(argv)
+
+    over_budget = False
+    for module in args.modules:
+        total, modules = measure_import(module)
+        print(f"{module}: {total:.1f} ms")
+        for name, cumulative_ms in modules[:args.top]:
+            print(f"  {cumulative_ms:8.1f} ms  {name}")
+        if args.max_ms is not None and total > args.max_ms:
+            print(f"  budget de {args.max_ms:.0f} ms dépassé")
+            over_budget = True
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == "__main__":
+    main()
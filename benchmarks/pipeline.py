@@ -0,0 +1,106 @@
+# File: benchmarks/pipeline.py
+
+"""
+Mesure le coût de la chaîne d'upload hors réseau : les dossiers sont envoyés vers
+une destination locale (LocalDirectoryBackend), avec les mêmes étapes que vers
+SharePoint (bail, avancement du job, regroupement, vérification, nettoyage).
+
+    python benchmarks/pipeline.py --dossiers 20 --files 30 --size-kb 200
+    python benchmarks/pipeline.py --bundle --mirrors 2
+    python benchmarks/pipeline.py --participants 5  # soumissions répétées, mêmes documents
+"""
+
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Optional
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="Coût de la chaîne d'upload vers une destination locale.")
+    parser.add_argument("--dossiers", type=int, default=20)
+    parser.add_argument("--files", type=int, default=30, help="Fichiers par dossier.")
+    parser.add_argument("--size-kb", type=int, default=200, help="Taille de chaque fichier.")
+    parser.add_argument("--bundle", action="store_true", help="Regrouper les petits fichiers (UPLOAD_BUNDLE_MODE=zip).")
+    parser.add_argument("--mirrors", type=int, default=1, help="Nombre de destinations locales alimentées en parallèle.")
+    parser.add_argument("--participants", type=int, default=0,
+                        help="Participants soumettant tour à tour les mêmes documents (0 = un par dossier).")
+    parser.add_argument("--full-sync", action="store_true", help="Tout renvoyer à chaque soumission (INCREMENTAL_SYNC=off).")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="pipeline-bench-")
+    # La configuration est lue au premier import : on la fixe avant
+    os.environ.update({
+        "ENV_FILE": os.path.join(workdir, "absent.env"),
+        "JOB_DATABASE_PATH": os.path.join(workdir, "jobs.sqlite3"),
+        "AUDIT_DIRECTORY": os.path.join(workdir, "audit"),
+        "TARGET_FOLDER_RELATIVE_URL": "Archives",
+        "UPLOAD_BUNDLE_MODE": "zip" if args.bundle else "off",
+        "INCREMENTAL_SYNC": "off" if args.full_sync else "on",
+        "REGIME_RETRAITE_EMAIL": "",
+        "SUPPORT_EMAILS": ""
+    })
+    from sharepoint_connector.integrity import hash_dossier
+    from sharepoint_connector.job_queue import init_job_queue
+    from sharepoint_connector.sharepoint_uploader import upload_files_to_sharepoint
+    from sharepoint_connector.remote_index import init_remote_index
+    from sharepoint_connector.spool import init_spool, register_dossier
+    from sharepoint_connector.storage import LocalDirectoryBackend
+    from app.utils import create_identification_file, logger
+
+    logger.setLevel(logging.ERROR)
+    init_job_queue()
+    init_spool()
+    init_remote_index()
+
+    dossiers = []
+    for i in range(args.dossiers):
+        participant = i % args.participants if args.participants else i
+        email = f"participant{participant}@example.com"
+        dossier = os.path.join(workdir, "uploads", f"{email}-{i}")
+        os.makedirs(os.path.join(dossier, "Releves"))
+        create_identification_file(dossier, f"Participant {participant}", "1960-01-01", email)
+        for j in range(args.files):
+            with open(os.path.join(dossier, "Releves", f"document_{j}.pdf"), "wb") as f:
+                f.write(random.Random(f"{participant}-{j}").randbytes(args.size_kb * 1024))
+        register_dossier(dossier, email, 0, files=hash_dossier(dossier))
+        dossiers.append((dossier, email))
+
+    class CountingBackend(LocalDirectoryBackend):
+        # Chaque appel correspond à une requête vers SharePoint (ou à un lot $batch)
+        calls = 0
+
+        def ensure_folder(self, *call_args, **kwargs):
+            CountingBackend.calls += 1
+            return super().ensure_folder(*call_args, **kwargs)
+
+        def put_content(self, *call_args, **kwargs):
+            # put_file passe aussi par ici
+            CountingBackend.calls += 1
+            return super().put_content(*call_args, **kwargs)
+
+        def get_files_metadata(self, *call_args, **kwargs):
+            CountingBackend.calls += 1
+            return super().get_files_metadata(*call_args, **kwargs)
+
+    backends = [CountingBackend(os.path.join(workdir, f"archive_{i}")) for i in range(args.mirrors)]
+    start = time.perf_counter()
+    failures = sum(not upload_files_to_sharepoint(dossier, email, backends=backends) for dossier, email in dossiers)
+    elapsed = time.perf_counter() - start
+
+    total_mb = args.dossiers * args.files * args.size_kb / 1024
+    print(f"{args.dossiers} dossiers x {args.files} fichiers x {args.size_kb} Ko vers {args.mirrors} destination(s) locale(s)")
+    print(f"  {elapsed:.2f} s, {elapsed / args.dossiers * 1000:.1f} ms/dossier, {total_mb / elapsed:.1f} Mo/s, {failures} échec(s)")
+    print(f"  {CountingBackend.calls / args.dossiers:.1f} appels à la destination par dossier")
+    print(f"  répertoire de travail: {workdir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -46,6 +46,9 @@ class SharePoint_Connect {
 
         // Load plugin textdomain for translations
         add_action( 'init', array( $this, 'load_textdomain' ) );
+
+        // Webhook de fin d'upload envoyé par SharePoint Connect
+        add_action( 'rest_api_init', array( $this, 'register_webhook_route' ) );
     }
 
     private function default_settings() {
@@ -61,6 +64,7 @@ class SharePoint_Connect {
             'doc_type_key'            => '',
             'relative_file_path'      => 'wp-content/documents-private/',
             'delete_on_success'       => false, // Nouveau paramètre par défaut
+            'webhook_secret'          => '',
         );
     }
 
@@ -186,6 +190,15 @@ class SharePoint_Connect {
             'sharepoint-connect',
             'spc_main_section'
         );
+
+        // Secret partagé des webhooks de fin d'upload
+        add_settings_field(
+            'webhook_secret',
+            __( 'Secret des webhooks', 'sharepoint-connect' ),
+            array( $this, 'webhook_secret_callback' ),
+            'sharepoint-connect',
+            'spc_main_section'
+        );
     }
 
     public function sanitize_settings( $input ) {
@@ -206,6 +219,7 @@ class SharePoint_Connect {
 
         // Nouveau paramètre : delete_on_success
         $sanitized['delete_on_success']       = isset( $input['delete_on_success'] ) && $input['delete_on_success'] ? true : false;
+        $sanitized['webhook_secret']          = sanitize_text_field( $input['webhook_secret'] );
 
         // Logs de débogage
         error_log( "SharePoint Connect: Sanitized settings: " . wp_json_encode( $sanitized ) );
@@ -329,6 +343,18 @@ class SharePoint_Connect {
         echo '<p class="description">' . __( 'Cochez cette case pour supprimer l\'entrée et ses fichiers associés après un envoi réussi à SharePoint.', 'sharepoint-connect' ) . '</p>';
     }
 
+    // Secret des webhooks
+    public function webhook_secret_callback() {
+        printf(
+            '<input type="text" id="webhook_secret" name="spc_settings[webhook_secret]" value="%s" size="50" />',
+            esc_attr( $this->settings['webhook_secret'] )
+        );
+        echo '<p class="description">' . sprintf(
+            __( 'Valeur de WEBHOOK_SECRET côté SharePoint Connect. Si elle est renseignée, la suppression attend la confirmation de l\'upload envoyée à %s.', 'sharepoint-connect' ),
+            esc_html( rest_url( 'sharepoint-connect/v1/webhook' ) )
+        ) . '</p>';
+    }
+
     public function enqueue_admin_styles( $hook ) {
         if ( $hook !== 'settings_page_sharepoint-connect' ) {
             return;
@@ -407,6 +433,7 @@ class SharePoint_Connect {
             'name'          => $name,
             'date_of_birth' => $date_of_birth,
             'email'         => $email,
+            'reference'     => $entry_id,
         );
 
         // Ajoute les clés Doc ID et Doc Type si elles sont définies
@@ -463,8 +490,17 @@ class SharePoint_Connect {
             // Par exemple, enregistrer une note dans l'entrée
             // update_post_meta( $entry_id, 'spc_response', $response );
 
-            // Vérifie si la suppression est activée
-            if ( $this->settings['delete_on_success'] ) {
+            // Avec un secret de webhook, la suppression attend la fin de l'upload vers SharePoint
+            if ( $this->settings['delete_on_success'] && ! empty( $this->settings['webhook_secret'] ) ) {
+                $attachment_ids = array();
+                foreach ( $files_and_docs as $file_doc ) {
+                    if ( isset( $file_doc['attachment_id'] ) ) {
+                        $attachment_ids[] = $file_doc['attachment_id'];
+                    }
+                }
+                update_option( 'spc_pending_entry_' . $entry_id, $attachment_ids, false );
+                error_log( "SharePoint Connect: Entrée ID $entry_id en attente de la confirmation de l'upload." );
+            } elseif ( $this->settings['delete_on_success'] ) {
                 // Supprimer les fichiers associés
                 foreach ( $files_and_docs as $file_doc ) {
                     if ( isset( $file_doc['attachment_id'] ) ) {
@@ -489,6 +525,73 @@ class SharePoint_Connect {
     }
 
 
+    /**
+     * Enregistre la route REST appelée par SharePoint Connect à la fin des uploads
+     */
+    public function register_webhook_route() {
+        register_rest_route( 'sharepoint-connect/v1', '/webhook', array(
+            'methods'             => 'POST',
+            'callback'            => array( $this, 'handle_webhook' ),
+            'permission_callback' => array( $this, 'verify_webhook_signature' ),
+        ) );
+    }
+
+    /**
+     * Vérifie la signature HMAC-SHA256 de "<timestamp>.<corps>" et la fraîcheur du timestamp
+     */
+    public function verify_webhook_signature( $request ) {
+        $secret = $this->settings['webhook_secret'];
+        if ( empty( $secret ) ) {
+            return false;
+        }
+
+        $timestamp = $request->get_header( 'x-webhook-timestamp' );
+        $signature = $request->get_header( 'x-webhook-signature' );
+        if ( empty( $timestamp ) || empty( $signature ) || abs( time() - (int) $timestamp ) > 300 ) {
+            return false;
+        }
+
+        $expected = 'sha256=' . hash_hmac( 'sha256', $timestamp . '.' . $request->get_body(), $secret );
+        return hash_equals( $expected, $signature );
+    }
+
+    /**
+     * Traite un lot d'événements de fin d'upload : supprime les entrées confirmées
+     */
+    public function handle_webhook( $request ) {
+        $payload = json_decode( $request->get_body(), true );
+        $events  = isset( $payload['events'] ) && is_array( $payload['events'] ) ? $payload['events'] : array();
+
+        foreach ( $events as $event ) {
+            if ( empty( $event['reference'] ) ) {
+                continue;
+            }
+            $entry_id = (int) $event['reference'];
+
+            if ( $event['type'] !== 'upload.succeeded' ) {
+                error_log( "SharePoint Connect: Échec de l'upload pour l'entrée ID $entry_id: {$event['error']}" );
+                continue;
+            }
+
+            $attachment_ids = get_option( 'spc_pending_entry_' . $entry_id, null );
+            if ( $attachment_ids === null ) {
+                continue; // Entrée inconnue ou déjà traitée (webhook rejoué)
+            }
+
+            foreach ( $attachment_ids as $attachment_id ) {
+                wp_delete_attachment( $attachment_id, true );
+                error_log( "SharePoint Connect: Fichier attaché ID $attachment_id supprimé." );
+            }
+            if ( class_exists( 'FrmEntry' ) ) {
+                FrmEntry::destroy( $entry_id );
+                error_log( "SharePoint Connect: Entrée ID $entry_id supprimée après confirmation de l'upload." );
+            }
+            delete_option( 'spc_pending_entry_' . $entry_id );
+        }
+
+        return new WP_REST_Response( array( 'received' => count( $events ) ), 200 );
+    }
+
     /**
      * Résout le chemin du fichier en fonction de l'ID
      */
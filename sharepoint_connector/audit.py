@@ -0,0 +1,352 @@
+# File: sharepoint_connector/audit.py
+
+"""
+Journal d'audit structuré des dossiers reçus, des uploads et des notifications.
+
+Chaque événement est ajouté en une écriture à un fichier JSON Lines du jour
+(AUDIT_DIRECTORY/events-AAAA-MM-JJ.jsonl), partagé par l'API, les workers et
+les commandes. Les journées terminées sont compactées dans une base SQLite par
+mois (audit-AAAA-MM.sqlite3), indexée par email et par date, et le fichier du
+jour est alors supprimé. Le compactage tourne dans un thread de l'API (toutes
+les AUDIT_COMPACTION_INTERVAL secondes) ou à la demande :
+
+    python -m sharepoint_connector.audit compact
+    python -m sharepoint_connector.audit query --email jean@example.com --since 2025-01-01 --until 2025-03-31
+    python -m sharepoint_connector.audit query --since 2025-03-01 --event upload_failed --json
+
+Les requêtes n'ouvrent que les bases des mois demandés, plus les fichiers du
+jour pas encore compactés.
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+from sharepoint_connector.config import AUDIT_LOG, AUDIT_DIRECTORY, AUDIT_COMPACTION_INTERVAL
+from app.utils import logger
+
+EVENT_DOSSIER_RECEIVED = "dossier_received"
+EVENT_UPLOAD_SUCCEEDED = "upload_succeeded"
+EVENT_UPLOAD_FAILED = "upload_failed"
+EVENT_NOTIFICATION_SENT = "notification_sent"
+EVENT_NOTIFICATION_FAILED = "notification_failed"
+
+JOURNAL_PATTERN = re.compile(r"^events-(\d{4}-\d{2}-\d{2})\.jsonl$")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    day TEXT NOT NULL,
+    event TEXT NOT NULL,
+    email TEXT,
+    job_id TEXT,
+    upload_dir TEXT,
+    bytes INTEGER,
+    detail TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_events_email_day ON events (email, day);
+CREATE INDEX IF NOT EXISTS idx_events_day ON events (day);
+CREATE TABLE IF NOT EXISTS event_files (
+    event_id INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER,
+    sha256 BLOB
+);
+CREATE INDEX IF NOT EXISTS idx_event_files_event ON event_files (event_id);
+CREATE TABLE IF NOT EXISTS compacted_days (
+    day TEXT PRIMARY KEY,
+    events INTEGER NOT NULL,
+    compacted_at REAL NOT NULL
+);
+"""
+
+_write_lock = threading.Lock()
+
+
+def _day(ts: float) -> str:
+    return time.strftime("%Y-%m-%d", time.localtime(ts))
+
+
+def _journal_path(directory: str, day: str) -> str:
+    return os.path.join(directory, f"events-{day}.jsonl")
+
+
+def _archive_path(directory: str, month: str) -> str:
+    return os.path.join(directory, f"audit-{month}.sqlite3")
+
+
+def record_event(
+    event: str,
+    email: Optional[str] = None,
+    upload_dir: Optional[str] = None,
+    job_id: Optional[str] = None,
+    size: Optional[int] = None,
+    files: Optional[List[Tuple[str, int, str]]] = None,
+    detail: Optional[str] = None,
+    directory: Optional[str] = None
+) -> None:
+    """
+    Ajoute un événement au journal d'audit du jour.
+
+    Une erreur d'écriture est journalisée sans être propagée : l'audit ne doit
+    pas faire échouer un upload.
+
+    Args:
+        files (List[Tuple[str, int, str]], optional): (chemin relatif, taille, sha256) des fichiers concernés.
+    """
+    if AUDIT_LOG != "on":
+        return
+    directory = directory or AUDIT_DIRECTORY
+    ts = time.time()
+    record = {
+        "ts": ts, "event": event, "email": email, "job_id": job_id,
+        "upload_dir": upload_dir, "bytes": size, "detail": detail,
+        "files": [list(file) for file in files or []]
+    }
+    line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+    try:
+        with _write_lock:
+            os.makedirs(directory, exist_ok=True)
+            # Une seule écriture en mode ajout : les lignes des différents processus ne se mélangent pas
+            fd = os.open(_journal_path(directory, _day(ts)), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o640)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+    except OSError as e:
+        logger.error(f"Impossible d'écrire l'événement d'audit {event} ({email}): {e}")
+
+
+def _read_journal(path: str) -> Iterator[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, start=1):
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # Ligne tronquée (arrêt brutal pendant une écriture)
+                logger.warning(f"Ligne {number} illisible dans le journal d'audit {path}, ignorée.")
+
+
+def _digest_to_blob(sha256: Optional[str]):
+    # Empreintes stockées en binaire : deux fois moins de place que l'hexadécimal
+    try:
+        return bytes.fromhex(sha256)
+    except (TypeError, ValueError):
+        return sha256
+
+
+def _blob_to_digest(value) -> Optional[str]:
+    return value.hex() if isinstance(value, bytes) else value
+
+
+@contextmanager
+def _open_archive(path: str):
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    try:
+        conn.executescript(SCHEMA)
+        yield conn
+    finally:
+        conn.close()
+
+
+def compact_day(day: str, directory: Optional[str] = None) -> int:
+    """
+    Compacte le journal d'une journée dans la base du mois, puis le supprime.
+
+    Returns:
+        int: Nombre d'événements compactés (0 si la journée l'était déjà).
+    """
+    directory = directory or AUDIT_DIRECTORY
+    journal = _journal_path(directory, day)
+    count = 0
+    with _open_archive(_archive_path(directory, day[:7])) as conn:
+        # Déjà compactée si le journal n'a pas pu être supprimé la dernière fois
+        if not conn.execute("SELECT 1 FROM compacted_days WHERE day = ?", (day,)).fetchone():
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for record in _read_journal(journal):
+                    cursor = conn.execute(
+                        "INSERT INTO events (ts, day, event, email, job_id, upload_dir, bytes, detail) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (record["ts"], day, record["event"], record.get("email"), record.get("job_id"),
+                         record.get("upload_dir"), record.get("bytes"), record.get("detail"))
+                    )
+                    conn.executemany(
+                        "INSERT INTO event_files (event_id, path, size, sha256) VALUES (?, ?, ?, ?)",
+                        [(cursor.lastrowid, path, size, _digest_to_blob(sha256)) for path, size, sha256 in record.get("files") or []]
+                    )
+                    count += 1
+                # Dans la même transaction : une journée n'est jamais compactée deux fois
+                conn.execute(
+                    "INSERT INTO compacted_days (day, events, compacted_at) VALUES (?, ?, ?)",
+                    (day, count, time.time())
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+    os.remove(journal)
+    logger.info(f"Journal d'audit du {day} compacté: {count} événement(s).")
+    return count
+
+
+def compact_pending(directory: Optional[str] = None, today: Optional[str] = None) -> int:
+    """
+    Compacte les journaux des journées terminées.
+
+    Returns:
+        int: Nombre de journées compactées.
+    """
+    directory = directory or AUDIT_DIRECTORY
+    today = today or _day(time.time())
+    days = sorted(
+        match.group(1)
+        for match in map(JOURNAL_PATTERN.match, os.listdir(directory) if os.path.isdir(directory) else [])
+        if match and match.group(1) < today
+    )
+    for day in days:
+        compact_day(day, directory)
+    return len(days)
+
+
+def start_audit_compaction(interval: int = AUDIT_COMPACTION_INTERVAL) -> threading.Event:
+    """
+    Démarre le compactage des journaux d'audit dans un thread, toutes les `interval` secondes.
+
+    Returns:
+        threading.Event: Événement à positionner pour arrêter le thread.
+    """
+    stop_event = threading.Event()
+
+    def _run():
+        while not stop_event.is_set():
+            try:
+                compact_pending()
+            except Exception as e:
+                logger.error(f"Erreur lors du compactage du journal d'audit: {e}")
+            stop_event.wait(interval)
+
+    threading.Thread(target=_run, name="audit-compaction", daemon=True).start()
+    return stop_event
+
+
+def _matches(record: Dict, email: Optional[str], event: Optional[str]) -> bool:
+    return (email is None or record.get("email") == email) and (event is None or record.get("event") == event)
+
+
+def query_events(
+    email: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    event: Optional[str] = None,
+    directory: Optional[str] = None
+) -> List[Dict]:
+    """
+    Recherche des événements d'audit, par ordre chronologique.
+
+    Args:
+        since (str, optional): Premier jour inclus (AAAA-MM-JJ).
+        until (str, optional): Dernier jour inclus (AAAA-MM-JJ).
+
+    Returns:
+        List[Dict]: Événements, avec la liste de leurs fichiers (chemin, taille, sha256).
+    """
+    directory = directory or AUDIT_DIRECTORY
+    since, until = since or "0000-00-00", until or "9999-99-99"
+    events = []
+
+    for path in sorted(glob.glob(os.path.join(directory, "audit-*.sqlite3"))):
+        month = os.path.basename(path)[len("audit-"):-len(".sqlite3")]
+        if not since[:7] <= month <= until[:7]:
+            continue
+        clauses, params = ["day BETWEEN ? AND ?"], [since, until]
+        if email is not None:
+            clauses.append("email = ?")
+            params.append(email)
+        if event is not None:
+            clauses.append("event = ?")
+            params.append(event)
+        with _open_archive(path) as conn:
+            rows = [dict(row) for row in conn.execute(
+                f"SELECT * FROM events WHERE {' AND '.join(clauses)} ORDER BY ts", params
+            )]
+            files: Dict[int, List] = {}
+            for start in range(0, len(rows), 500):
+                ids = [row["id"] for row in rows[start:start + 500]]
+                for file in conn.execute(
+                    f"SELECT event_id, path, size, sha256 FROM event_files WHERE event_id IN ({','.join('?' * len(ids))})", ids
+                ):
+                    files.setdefault(file["event_id"], []).append([file["path"], file["size"], _blob_to_digest(file["sha256"])])
+        for row in rows:
+            row["files"] = files.get(row.pop("id"), [])
+        events += rows
+
+    # Journées pas encore compactées
+    for name in sorted(os.listdir(directory) if os.path.isdir(directory) else []):
+        match = JOURNAL_PATTERN.match(name)
+        if not match or not since <= match.group(1) <= until:
+            continue
+        for record in _read_journal(os.path.join(directory, name)):
+            if _matches(record, email, event):
+                events.append({**record, "day": match.group(1)})
+
+    events.sort(key=lambda record: record["ts"])
+    return events
+
+
+def _print_event(record: Dict) -> None:
+    when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(record["ts"]))
+    columns = [when, record["event"], record.get("email") or "-"]
+    if record.get("job_id"):
+        columns.append(f"job={record['job_id']}")
+    if record.get("bytes") is not None:
+        columns.append(f"{record['bytes']} octets")
+    if record.get("detail"):
+        columns.append(record["detail"])
+    print("  ".join(columns))
+    for path, size, sha256 in record.get("files") or []:
+        print(f"    {path} ({size} octets, sha256 {sha256})")
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="Journal d'audit des dossiers reçus, des uploads et des notifications.")
+    parser.add_argument("--directory", default=AUDIT_DIRECTORY)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("compact", help="Compacte les journaux des journées terminées.")
+    query = commands.add_parser("query", help="Recherche des événements.")
+    query.add_argument("--email")
+    query.add_argument("--since", help="Premier jour inclus (AAAA-MM-JJ).")
+    query.add_argument("--until", help="Dernier jour inclus (AAAA-MM-JJ).")
+    query.add_argument("--event", choices=[
+        EVENT_DOSSIER_RECEIVED, EVENT_UPLOAD_SUCCEEDED, EVENT_UPLOAD_FAILED,
+        EVENT_NOTIFICATION_SENT, EVENT_NOTIFICATION_FAILED
+    ])
+    query.add_argument("--json", action="store_true", help="Un événement JSON par ligne.")
+    args = parser.parse_args(argv)
+
+    if args.command == "compact":
+        print(f"{compact_pending(args.directory)} journée(s) compactée(s).")
+        return
+
+    start = time.perf_counter()
+    events = query_events(args.email, args.since, args.until, args.event, args.directory)
+    elapsed = (time.perf_counter() - start) * 1000
+    for record in events:
+        if args.json:
+            print(json.dumps(record, ensure_ascii=False))
+        else:
+            _print_event(record)
+    print(f"{len(events)} événement(s) en {elapsed:.1f} ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,17 @@
-import msal
 import requests
-from cryptography.hazmat.primitives.serialization import pkcs12
-from cryptography.hazmat.primitives import serialization
 import os
-from sharepoint_connector.config import CLIENT_ID, TENANT, PFX_PATH,PFX_ABSOLUTE_PATH,CERT_PASSWORD, SCOPE, AUTHORITY, SITE_URL
+import threading
+import time
+from typing import Optional
+from sharepoint_connector.config import CLIENT_ID, TENANT, PFX_PATH,PFX_ABSOLUTE_PATH,CERT_PASSWORD, SCOPE, AUTHORITY, SITE_URL, SHAREPOINT_CONTEXT_TTL
 dossier_courant = os.getcwd()
 
 def authenticate():
+    # msal et cryptography ne sont chargés qu'à la première authentification
+    import msal
+    from cryptography.hazmat.primitives.serialization import pkcs12
+    from cryptography.hazmat.primitives import serialization
+
     # Charger le certificat PFX
     with open(PFX_ABSOLUTE_PATH, "rb") as f:
         pfx_data = f.read()
@@ -49,3 +54,50 @@ def get_form_digest(site_url, headers):
     response = requests.post(contextinfo_endpoint, headers=headers)
     response.raise_for_status()
     return response.json()["d"]["GetContextWebInformation"]["FormDigestValue"]
+
+class SharePointContext:
+    """
+    En-têtes d'authentification, form digest et dossiers déjà créés, partagés
+    entre les uploads d'un même processus pour éviter de refaire l'authentification,
+    la demande de digest et la création des dossiers à chaque dossier uploadé.
+    """
+    def __init__(self, headers, form_digest):
+        self.headers = headers
+        self.form_digest = form_digest
+        self.created_at = time.monotonic()
+        self._known_folders = set()
+        self._lock = threading.Lock()
+
+    def is_stale(self, ttl):
+        return time.monotonic() - self.created_at > ttl
+
+    def has_folder(self, folder):
+        with self._lock:
+            return folder in self._known_folders
+
+    def remember_folder(self, folder):
+        with self._lock:
+            self._known_folders.add(folder)
+
+_context: Optional[SharePointContext] = None
+_context_lock = threading.Lock()
+
+def get_sharepoint_context(ttl=SHAREPOINT_CONTEXT_TTL):
+    """
+    Retourne le contexte SharePoint du processus, renouvelé après `ttl` secondes.
+    """
+    global _context
+    with _context_lock:
+        if _context is None or _context.is_stale(ttl):
+            access_token = authenticate()
+            headers = get_headers(access_token)
+            _context = SharePointContext(headers, get_form_digest(SITE_URL, headers))
+        return _context
+
+def invalidate_sharepoint_context():
+    """
+    Oublie le contexte courant (jeton expiré, dossier supprimé côté SharePoint...).
+    """
+    global _context
+    with _context_lock:
+        _context = None
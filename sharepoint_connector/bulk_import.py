@@ -0,0 +1,231 @@
+# File: sharepoint_connector/bulk_import.py
+
+"""
+Import en masse de dossiers de participants (archives numérisées).
+
+    python -m sharepoint_connector.bulk_import manifeste.csv --source scans/ --report rapport.jsonl
+    python -m sharepoint_connector.bulk_import manifeste.jsonl --source scans.zip --enqueue
+
+Le manifeste (CSV, JSON ou JSON Lines) contient une ligne par fichier avec les
+colonnes name, date_of_birth, email, file et, optionnellement, description. Les
+lignes d'un même dossier doivent être consécutives : le manifeste est lu en un
+seul passage, sans être chargé entièrement en mémoire (sauf au format JSON).
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import shutil
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+from sharepoint_connector.job_queue import init_job_queue, enqueue_upload_job, KIND_BULK
+from sharepoint_connector.spool import init_spool, register_dossier
+from sharepoint_connector.remote_index import init_remote_index
+from sharepoint_connector.audit import record_event, EVENT_DOSSIER_RECEIVED
+from sharepoint_connector.integrity import copy_and_hash
+from sharepoint_connector.sharepoint_uploader import upload_files_to_sharepoint
+from sharepoint_connector.config import ALLOWED_EXTENSIONS, UPLOAD_DIRECTORY
+from app.utils import create_upload_directory, create_identification_file, build_file_save_path, logger, configure_logging
+
+
+def read_manifest(manifest_path: str) -> Iterator[Dict]:
+    """
+    Lit le manifeste ligne par ligne (CSV, JSON Lines) ou en une fois (JSON).
+    """
+    extension = os.path.splitext(manifest_path)[1].lower()
+    with open(manifest_path, "r", encoding="utf-8-sig", newline="") as f:
+        if extension == ".csv":
+            yield from csv.DictReader(f)
+        elif extension == ".jsonl":
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        elif extension == ".json":
+            yield from json.load(f)
+        else:
+            raise ValueError(f"Format de manifeste non supporté: {manifest_path}")
+
+
+def group_dossiers(rows: Iterator[Dict]) -> Iterator[Tuple[Tuple[str, str, str], List[Dict]]]:
+    """
+    Regroupe les lignes consécutives d'un même participant (nom, date de naissance, email).
+    """
+    key = lambda row: (row["name"].strip(), row["date_of_birth"].strip(), row["email"].strip())
+    for participant, group in itertools.groupby(rows, key=key):
+        yield participant, list(group)
+
+
+class FileSource:
+    """
+    Source des fichiers référencés par le manifeste : un répertoire ou une archive ZIP.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._zip = zipfile.ZipFile(path) if zipfile.is_zipfile(path) else None
+
+    def open(self, relative_path: str) -> BinaryIO:
+        if self._zip is not None:
+            return self._zip.open(relative_path.replace("\\", "/"))
+        base = os.path.abspath(self.path)
+        full_path = os.path.abspath(os.path.join(base, relative_path))
+        if os.path.commonpath([base, full_path]) != base:
+            raise ValueError(f"Chemin hors de la source: {relative_path}")
+        return open(full_path, "rb")
+
+    def close(self) -> None:
+        if self._zip is not None:
+            self._zip.close()
+
+
+class ReportWriter:
+    """
+    Rapport d'import écrit au fil de l'eau (une ligne JSON par événement).
+    """
+
+    def __init__(self, report_path: str):
+        self._file = open(report_path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def write(self, event: str, **fields) -> None:
+        with self._lock:
+            self._file.write(json.dumps({"event": event, "at": time.time(), **fields}, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def ingest_dossier(upload_directory: str, participant: Tuple[str, str, str], rows: List[Dict], source: FileSource) -> Tuple[str, int]:
+    """
+    Crée le dossier `{email}-{uuid}` d'un participant et y copie ses fichiers en streaming.
+
+    Returns:
+        Tuple[str, int]: Dossier créé et taille totale des fichiers copiés.
+    """
+    name, date_of_birth, email = participant
+    for row in rows:
+        file_extension = os.path.splitext(row["file"])[1].lower()
+        if file_extension not in ALLOWED_EXTENSIONS:
+            raise ValueError(f"File type not allowed for file: {row['file']}. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}")
+
+    upload_dir = create_upload_directory(upload_directory, email)
+    try:
+        create_identification_file(upload_dir, name, date_of_birth, email)
+        total_bytes = 0
+        files = []
+        for row in rows:
+            file_save_path = build_file_save_path(upload_dir, os.path.basename(row["file"]), row.get("description") or None)
+            with source.open(row["file"]) as src, open(file_save_path, "wb") as dst:
+                size, sha256 = copy_and_hash(src, dst)
+            total_bytes += size
+            files.append((os.path.relpath(file_save_path, upload_dir).replace("\\", "/"), size, sha256))
+    except Exception:
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        raise
+    register_dossier(upload_dir, email, total_bytes, files=files)
+    record_event(EVENT_DOSSIER_RECEIVED, email, upload_dir, size=total_bytes, files=files, detail="import en masse")
+    return upload_dir, total_bytes
+
+
+def run_import(
+    manifest_path: str,
+    source_path: str,
+    upload_directory: str,
+    report_path: str,
+    enqueue: bool = False,
+    threads: int = 4
+) -> Dict:
+    """
+    Importe tous les dossiers du manifeste et planifie leur upload vers SharePoint.
+
+    Par défaut, les uploads sont faits par ce processus avec `threads` uploads
+    simultanés, qui partagent l'authentification et les dossiers déjà créés
+    (voir `get_sharepoint_context`). Avec `enqueue`, les dossiers sont confiés
+    aux workers via la file d'attente, en priorité basse (KIND_BULK).
+
+    Returns:
+        Dict: Résumé de l'import.
+    """
+    init_job_queue()
+    init_spool()
+    init_remote_index()
+    os.makedirs(upload_directory, exist_ok=True)
+
+    summary = {"dossiers": 0, "files": 0, "bytes": 0, "ingest_failed": 0, "queued": 0, "uploaded": 0, "upload_failed": 0}
+    summary_lock = threading.Lock()
+    report = ReportWriter(report_path)
+    source = FileSource(source_path)
+    pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="bulk-upload") if not enqueue else None
+    # Borne le nombre de dossiers ingérés en attente d'upload
+    slots = threading.BoundedSemaphore(threads * 2)
+
+    def _upload(upload_dir: str, email: str) -> None:
+        try:
+            success = upload_files_to_sharepoint(upload_dir, email)
+        except Exception as e:
+            logger.error(f"Erreur inattendue lors de l'upload de {upload_dir}: {e}")
+            success = False
+        finally:
+            slots.release()
+        with summary_lock:
+            summary["uploaded" if success else "upload_failed"] += 1
+        report.write("uploaded" if success else "upload_failed", folder=upload_dir, email=email)
+
+    try:
+        report.write("started", manifest=manifest_path, source=source_path)
+        for participant, rows in group_dossiers(read_manifest(manifest_path)):
+            email = participant[2]
+            try:
+                upload_dir, total_bytes = ingest_dossier(upload_directory, participant, rows, source)
+            except Exception as e:
+                logger.error(f"Échec de l'import du dossier de {email}: {e}")
+                summary["ingest_failed"] += 1
+                report.write("ingest_failed", email=email, files=[row["file"] for row in rows], error=str(e))
+                continue
+
+            summary["dossiers"] += 1
+            summary["files"] += len(rows)
+            summary["bytes"] += total_bytes
+            report.write("ingested", folder=upload_dir, email=email, files=len(rows), bytes=total_bytes)
+
+            if enqueue:
+                job_id = enqueue_upload_job(upload_dir, email, kind=KIND_BULK)
+                summary["queued"] += 1
+                report.write("queued", folder=upload_dir, email=email, job_id=job_id)
+            else:
+                slots.acquire()
+                pool.submit(_upload, upload_dir, email)
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True)
+        source.close()
+        report.write("summary", **summary)
+        report.close()
+
+    logger.info(f"Import en masse terminé: {summary}")
+    return summary
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="Import en masse de dossiers de participants.")
+    parser.add_argument("manifest", help="Manifeste CSV, JSON ou JSON Lines.")
+    parser.add_argument("--source", required=True, help="Répertoire ou archive ZIP contenant les fichiers.")
+    parser.add_argument("--report", default="bulk_import_report.jsonl", help="Fichier de rapport (JSON Lines).")
+    parser.add_argument("--upload-directory", default=UPLOAD_DIRECTORY)
+    parser.add_argument("--enqueue", action="store_true", help="Confier les uploads aux workers au lieu de les faire ici.")
+    parser.add_argument("--threads", type=int, default=4, help="Nombre d'uploads simultanés (sans --enqueue).")
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    summary = run_import(args.manifest, args.source, args.upload_directory, args.report, args.enqueue, args.threads)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
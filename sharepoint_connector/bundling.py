@@ -0,0 +1,177 @@
+# File: sharepoint_connector/bundling.py
+
+"""
+Regroupement des petits fichiers d'un dossier dans une archive ZIP unique.
+
+Chaque fichier envoyé à SharePoint coûte une requête `Files/add`. En mode
+UPLOAD_BUNDLE_MODE=zip, les fichiers plus petits que UPLOAD_BUNDLE_THRESHOLD_KB
+sont envoyés dans une seule archive, construite au fil de l'upload (sans copie
+temporaire), accompagnée d'un index texte. L'archive porte l'identifiant du
+dossier (`documents_regroupes_<id>.zip`) : les soumissions d'un même participant,
+archivées dans le même dossier distant, ne s'écrasent pas.
+
+Pour mesurer le gain sur les dossiers du spool :
+
+    python -m sharepoint_connector.bundling uploaded_files --threshold-kb 1024
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import zipfile
+from typing import Iterator, List, Optional, Tuple
+from sharepoint_connector.config import UPLOAD_BUNDLE_THRESHOLD_KB, UPLOAD_BUNDLE_MIN_FILES
+from app.utils import IDENTIFICATION_FILE, DOSSIER_METADATA_FILE
+
+BUNDLE_NAME = "documents_regroupes.zip"
+BUNDLE_INDEX_NAME = "documents_regroupes.txt"
+# Fichier toujours envoyé tel quel pour rester lisible dans SharePoint, et métadonnées locales
+EXCLUDED_FILES = {IDENTIFICATION_FILE, DOSSIER_METADATA_FILE}
+# Formats déjà compressés : les recompresser ne fait que coûter du CPU
+STORED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".pdf", ".docx", ".xlsx", ".zip"}
+CHUNK_SIZE = 1024 * 1024
+# Suffixe uuid des dossiers `{email}-{uuid}` (voir create_upload_directory)
+DOSSIER_ID_PATTERN = re.compile(r"([0-9a-f]{8})-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$")
+
+
+def bundle_names(local_directory: str) -> Tuple[str, str]:
+    """
+    Retourne les noms de l'archive et de son index pour un dossier : ils sont
+    propres à la soumission, et identiques d'une tentative à l'autre.
+
+    Returns:
+        Tuple[str, str]: (nom de l'archive, nom de l'index).
+    """
+    dossier = os.path.basename(os.path.normpath(local_directory))
+    match = DOSSIER_ID_PATTERN.search(dossier)
+    dossier_id = match.group(1) if match else hashlib.sha256(dossier.encode("utf-8")).hexdigest()[:8]
+    name, extension = os.path.splitext(BUNDLE_NAME)
+    index_name, index_extension = os.path.splitext(BUNDLE_INDEX_NAME)
+    return f"{name}_{dossier_id}{extension}", f"{index_name}_{dossier_id}{index_extension}"
+
+
+def plan_bundle(
+    local_directory: str,
+    threshold_kb: int = UPLOAD_BUNDLE_THRESHOLD_KB,
+    min_files: int = UPLOAD_BUNDLE_MIN_FILES
+) -> List[Tuple[str, str, int]]:
+    """
+    Sélectionne les fichiers du dossier à regrouper dans l'archive.
+
+    Returns:
+        List[Tuple[str, str, int]]: (chemin relatif, chemin local, taille) des fichiers
+        à regrouper, ou une liste vide s'ils sont moins de `min_files`.
+    """
+    threshold = threshold_kb * 1024
+    selected = []
+    for root, dirs, files in os.walk(local_directory):
+        for filename in sorted(files):
+            path = os.path.join(root, filename)
+            relative_path = os.path.relpath(path, local_directory).replace("\\", "/")
+            size = os.path.getsize(path)
+            if relative_path not in EXCLUDED_FILES and size < threshold:
+                selected.append((relative_path, path, size))
+    return selected if len(selected) >= max(min_files, 2) else []
+
+
+class _ChunkBuffer:
+    # Flux en écriture seule : zipfile y écrit l'archive, le générateur la vide au fur et à mesure
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> Iterator[bytes]:
+        chunks, self._chunks = self._chunks, []
+        yield from chunks
+
+
+def iter_zip(files: List[Tuple[str, str, int]]) -> Iterator[bytes]:
+    """
+    Produit une archive ZIP des fichiers par morceaux, sans la matérialiser sur disque.
+    """
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for relative_path, path, size in files:
+            info = zipfile.ZipInfo.from_file(path, arcname=relative_path)
+            if os.path.splitext(path)[1].lower() in STORED_EXTENSIONS:
+                info.compress_type = zipfile.ZIP_STORED
+            else:
+                info.compress_type = zipfile.ZIP_DEFLATED
+            with open(path, "rb") as src, archive.open(info, "w") as dst:
+                while True:
+                    chunk = src.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+                    yield from buffer.drain()
+    yield from buffer.drain()
+
+
+def build_index(files: List[Tuple[str, str, int]], bundle_name: str = BUNDLE_NAME) -> bytes:
+    """
+    Construit l'index texte listant le contenu de l'archive.
+    """
+    lines = [f"Documents regroupés dans {bundle_name} :", ""]
+    lines += [f"{relative_path} ({size} octets)" for relative_path, path, size in files]
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def count_upload_requests(
+    local_directory: str,
+    threshold_kb: int = UPLOAD_BUNDLE_THRESHOLD_KB,
+    min_files: int = UPLOAD_BUNDLE_MIN_FILES
+) -> Tuple[int, int]:
+    """
+    Compte les requêtes SharePoint (créations de dossiers et uploads) nécessaires pour
+    un dossier, sans et avec regroupement. Le cache des dossiers déjà créés est ignoré.
+
+    Returns:
+        Tuple[int, int]: Nombre de requêtes sans et avec regroupement.
+    """
+    bundled = {relative_path for relative_path, path, size in plan_bundle(local_directory, threshold_kb, min_files)}
+    without_bundle = with_bundle = 1  # dossier racine
+    for root, dirs, files in os.walk(local_directory):
+        rel_path = os.path.relpath(root, local_directory)
+        remaining = [
+            filename for filename in files
+            if os.path.normpath(os.path.join(rel_path, filename)).replace("\\", "/") not in bundled
+        ]
+        if rel_path != ".":
+            without_bundle += 1
+            with_bundle += 1 if remaining or not files else 0
+        without_bundle += len(files)
+        with_bundle += len(remaining)
+    if bundled:
+        with_bundle += 2  # archive et index
+    return without_bundle, with_bundle
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="Mesure le gain du regroupement des petits fichiers.")
+    parser.add_argument("upload_directory", nargs="?", default=os.getenv("UPLOAD_DIRECTORY") or "uploaded_files")
+    parser.add_argument("--threshold-kb", type=int, default=UPLOAD_BUNDLE_THRESHOLD_KB)
+    parser.add_argument("--min-files", type=int, default=UPLOAD_BUNDLE_MIN_FILES)
+    args = parser.parse_args(argv)
+
+    report = {"dossiers": 0, "requests_without_bundle": 0, "requests_with_bundle": 0}
+    for entry in os.scandir(args.upload_directory):
+        if entry.is_dir():
+            without_bundle, with_bundle = count_upload_requests(entry.path, args.threshold_kb, args.min_files)
+            report["dossiers"] += 1
+            report["requests_without_bundle"] += without_bundle
+            report["requests_with_bundle"] += with_bundle
+    if report["requests_without_bundle"]:
+        report["reduction"] = round(1 - report["requests_with_bundle"] / report["requests_without_bundle"], 3)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
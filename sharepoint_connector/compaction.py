@@ -0,0 +1,164 @@
+# File: sharepoint_connector/compaction.py
+
+"""
+Compaction des images et des PDF d'un dossier avant leur upload vers SharePoint.
+
+Avec COMPACTION_MODE=on, les photos sont réduites à COMPACTION_MAX_IMAGE_SIDE
+pixels et recompressées, et les PDF sont recompressés et linéarisés. Le travail
+est fait dans un pool de processus, hors des threads d'upload. Un fichier n'est
+remplacé que si le gain dépasse COMPACTION_MIN_SAVING_PERCENT ; sinon l'original
+est conservé.
+
+Dépendances optionnelles : Pillow (images) et pikepdf (PDF). Sans elles, les
+fichiers concernés sont envoyés tels quels.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Tuple
+from sharepoint_connector.config import (
+    COMPACTION_PROCESSES, COMPACTION_MAX_IMAGE_SIDE, COMPACTION_JPEG_QUALITY, COMPACTION_MIN_SAVING_PERCENT
+)
+from sharepoint_connector.integrity import hash_file
+from sharepoint_connector.spool import record_file_digest
+from app.utils import logger, configure_logging, is_logging_configured
+
+IMAGE_FORMATS = {".jpg": "JPEG", ".jpeg": "JPEG", ".png": "PNG"}
+PDF_EXTENSIONS = {".pdf"}
+TEMP_SUFFIX = ".compact"
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _compact_image(src: str, dst: str, image_format: str, max_side: int, quality: int) -> bool:
+    from PIL import Image, ImageOps
+
+    with Image.open(src) as image:
+        if getattr(image, "is_animated", False):
+            return False
+        # Applique l'orientation EXIF des photos de téléphone avant de supprimer les métadonnées
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_side, max_side))
+        if image_format == "JPEG":
+            image.convert("RGB").save(dst, "JPEG", quality=quality, optimize=True, progressive=True)
+        else:
+            image.save(dst, "PNG", optimize=True)
+    return True
+
+
+def _compact_pdf(src: str, dst: str) -> bool:
+    import pikepdf
+
+    with pikepdf.open(src) as pdf:
+        pdf.save(
+            dst,
+            linearize=True,
+            compress_streams=True,
+            recompress_flate=True,
+            object_stream_mode=pikepdf.ObjectStreamMode.generate
+        )
+    return True
+
+
+def compact_file(
+    path: str,
+    max_side: int = COMPACTION_MAX_IMAGE_SIDE,
+    quality: int = COMPACTION_JPEG_QUALITY,
+    min_saving_percent: int = COMPACTION_MIN_SAVING_PERCENT
+) -> Tuple[int, int]:
+    """
+    Compacte un fichier sur place, si le gain est suffisant.
+
+    Returns:
+        Tuple[int, int]: Taille d'origine et taille finale du fichier.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    original_size = os.path.getsize(path)
+    temp_path = path + TEMP_SUFFIX
+    try:
+        if extension in IMAGE_FORMATS:
+            compacted = _compact_image(path, temp_path, IMAGE_FORMATS[extension], max_side, quality)
+        elif extension in PDF_EXTENSIONS:
+            compacted = _compact_pdf(path, temp_path)
+        else:
+            compacted = False
+        if not compacted:
+            return original_size, original_size
+
+        new_size = os.path.getsize(temp_path)
+        if new_size > original_size * (100 - min_saving_percent) / 100:
+            return original_size, original_size
+        os.replace(temp_path, path)
+        return original_size, new_size
+    except ImportError as e:
+        logger.warning(f"Compaction de '{path}' impossible, dépendance manquante: {e}")
+        return original_size, original_size
+    except Exception as e:
+        logger.warning(f"Compaction de '{path}' impossible, fichier original conservé: {e}")
+        return original_size, original_size
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # 'spawn' : les processus de l'API et des workers ont des threads, fork n'est pas sûr.
+            # Les processus fils écrivent dans le fichier de log seulement si le parent le fait.
+            _pool = ProcessPoolExecutor(
+                max_workers=COMPACTION_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=configure_logging if is_logging_configured() else None
+            )
+        return _pool
+
+
+def _reset_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def compact_dossier(local_directory: str, db_path: Optional[str] = None) -> int:
+    """
+    Compacte les images et les PDF d'un dossier dans le pool de processus.
+
+    Une erreur de compaction ne fait jamais échouer l'upload : le fichier concerné
+    est simplement envoyé tel quel.
+
+    Returns:
+        int: Nombre d'octets économisés.
+    """
+    paths = [
+        os.path.join(root, filename)
+        for root, dirs, files in os.walk(local_directory)
+        for filename in files
+        if os.path.splitext(filename)[1].lower() in IMAGE_FORMATS.keys() | PDF_EXTENSIONS
+    ]
+    if not paths:
+        return 0
+
+    bytes_saved = 0
+    try:
+        futures = [_get_pool().submit(compact_file, path) for path in paths]
+        for path, future in zip(paths, futures):
+            original_size, new_size = future.result()
+            if new_size != original_size:
+                # Le fichier a été remplacé : son empreinte de réception est mise à jour pour la vérification
+                relative_path = os.path.relpath(path, local_directory).replace("\\", "/")
+                record_file_digest(local_directory, relative_path, *hash_file(path), db_path=db_path)
+            bytes_saved += original_size - new_size
+    except BrokenProcessPool as e:
+        # Un processus du pool est mort (image trop volumineuse, mémoire...) : le pool est recréé au prochain appel
+        logger.error(f"Pool de compaction interrompu pendant le traitement de '{local_directory}': {e}")
+        _reset_pool()
+    logger.info(f"Compaction de '{local_directory}': {len(paths)} fichier(s) traité(s), {bytes_saved} octets économisés.")
+    return bytes_saved
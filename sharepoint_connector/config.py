@@ -1,22 +1,191 @@
+# File: sharepoint_connector/config.py
+
+"""
+Configuration de l'application, regroupée dans un objet `Settings` typé.
+
+Chaque champ est lu dans la variable d'environnement du même nom en majuscules
+(ou celle indiquée par `env`), après chargement du fichier .env du projet (ou
+de ENV_FILE). L'import de ce module ne lit rien : la configuration est chargée
+au premier appel de `get_settings()`, une seule fois par processus.
+
+Les noms en majuscules restent importables pour compatibilité, mais
+`from sharepoint_connector.config import RETRY_COUNT` appelle `get_settings()`
+au moment de l'instruction : un module qui l'écrit à son niveau charge donc la
+configuration dès qu'il est lui-même importé, et garde les valeurs de ce moment
+(les tests les remplacent avec `mocker.patch`). Pour ne la lire qu'à l'usage,
+appeler `get_settings()` dans la fonction.
+
+    from sharepoint_connector.config import get_settings, RETRY_COUNT
+    assert get_settings().retry_count == RETRY_COUNT
+"""
+
 import os
-from dotenv import load_dotenv
-from dotenv import find_dotenv
-
-load_dotenv()
-env_path = find_dotenv()
-load_dotenv(override=True)
-# Print the path
-print(f"The path to the .env file is: {env_path}")
-CLIENT_ID = os.getenv("CLIENT_ID")
-TENANT = os.getenv("TENANT")
-PFX_PATH = os.getenv("PFX_PATH")
-PFX_ABSOLUTE_PATH = os.path.abspath(PFX_PATH)
-print(PFX_PATH)
-CERT_PASSWORD = os.getenv("CERT_PASSWORD")
-SITE_URL = os.getenv("SITE_URL")
-TARGET_FOLDER_RELATIVE_URL =os.getenv("TARGET_FOLDER_RELATIVE_URL")
-SCOPE = os.getenv("SCOPE")
-SCOPE = [SCOPE]
-AUTHORITY = os.getenv("AUTHORITY")
-RETRY_COUNT = int(os.getenv("RETRY_COUNT", 3))
-RETRY_DELAY = int(os.getenv("RETRY_DELAY", 5))  # seconds
+from dataclasses import dataclass, field, fields
+from functools import lru_cache
+from typing import List, Mapping, Optional
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _parse_list(value: str) -> List[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def _parse_extensions(value: str) -> List[str]:
+    return [extension.lower() for extension in _parse_list(value)]
+
+
+@dataclass(frozen=True)
+class Settings:
+    # SharePoint
+    client_id: Optional[str] = None
+    tenant: Optional[str] = None
+    pfx_path: Optional[str] = None
+    cert_password: Optional[str] = None
+    site_url: Optional[str] = None
+    target_folder_relative_url: Optional[str] = None
+    scope: List[str] = field(default_factory=list)
+    authority: Optional[str] = None
+    retry_count: int = 3
+    retry_delay: int = 5  # seconds
+    sharepoint_context_ttl: int = 1200  # seconds (le form digest expire après 30 min)
+    http_pool_size: int = 16  # connexions conservées par hôte
+    upload_chunk_size_mb: int = 10  # taille des morceaux des sessions d'upload
+    download_timeout: float = 60  # seconds
+
+    # API
+    api_security_token: Optional[str] = None
+    api_security_tokens: List[str] = field(default_factory=list)  # tokens supplémentaires (rotation)
+    upload_directory: str = "uploaded_files"
+    allowed_extensions: List[str] = field(
+        default_factory=lambda: [".pdf", ".docx", ".xlsx", ".jpg", ".jpeg", ".png", ".gif"],
+        metadata={"env": "ALLOWED_EXTENSIONS_STR", "parse": _parse_extensions}
+    )
+    upload_max_file_mb: int = 100
+    upload_max_dossier_mb: int = 500
+    upload_validation: str = "on"  # "on" ou "off" (contrôle du contenu des fichiers reçus)
+    resumable_sessions_directory: str = "upload_sessions"  # hors de UPLOAD_DIRECTORY
+    resumable_session_ttl_hours: float = 24
+    admission_max_inflight_ingests: int = 16  # 0 = pas de limite
+    admission_max_pending_jobs: int = 500  # soumissions en file (relances et imports en masse exclus)
+    admission_min_free_disk_mb: int = 1024
+    admission_retry_after: int = 30  # seconds
+
+    # File d'attente et workers
+    upload_lease_ttl: int = 300  # seconds
+    upload_lease_heartbeat: int = 60  # seconds
+    job_database_path: str = "jobs.sqlite3"
+    upload_worker_mode: str = "embedded"  # "embedded" ou "external"
+    worker_processes: int = 2
+    worker_threads: int = 4
+    worker_poll_interval: float = 2  # seconds
+    job_priority_submission: int = 0
+    job_priority_retry: int = 10
+    job_priority_bulk: int = 20
+    job_aging_interval: float = 60  # seconds d'attente pour gagner un niveau de priorité (0 = pas de vieillissement)
+    job_max_running_retries: int = 2
+
+    # Spool local
+    spool_quota_mb: int = 0  # 0 = pas de quota
+    spool_max_age_days: int = 0  # suppression des dossiers jamais uploadés (0 = jamais)
+    spool_gc_interval: int = 300  # seconds
+    spool_gc_batch_size: int = 50
+
+    # Webhooks
+    webhook_urls: List[str] = field(default_factory=list)
+    webhook_secret: str = ""
+    webhook_max_attempts: int = 10
+    webhook_batch_size: int = 50
+    webhook_interval: float = 5  # seconds
+    webhook_timeout: float = 10  # seconds
+    webhook_retention_days: float = 7  # 0 = conservation illimitée de l'outbox
+
+    # Traitements avant et après l'upload
+    upload_bundle_mode: str = "off"  # "off" ou "zip"
+    upload_bundle_threshold_kb: int = 1024
+    upload_bundle_min_files: int = 3
+    compaction_mode: str = "off"  # "off" ou "on"
+    compaction_processes: int = 2
+    compaction_max_image_side: int = 2480  # pixels (A4 à 300 dpi)
+    compaction_jpeg_quality: int = 85
+    compaction_min_saving_percent: int = 10
+    verify_uploads: str = "on"  # "on" ou "off"
+    verify_batch_size: int = 100  # fichiers par requête $batch
+    incremental_sync: str = "on"  # "on" ou "off" (voir remote_index.py)
+
+    # Journaux applicatifs (app.log, attaché par app.utils.configure_logging)
+    log_directory: str = os.path.join(PROJECT_ROOT, "logs")
+
+    # Journal d'audit (voir audit.py)
+    audit_log: str = "on"  # "on" ou "off"
+    audit_directory: str = os.path.join(PROJECT_ROOT, "logs", "audit")
+    audit_compaction_interval: int = 3600  # seconds
+
+    # Destinations d'archivage (voir storage.py)
+    storage_backends: List[str] = field(default_factory=lambda: ["sharepoint"])  # "sharepoint", "local"
+    local_storage_directory: str = "archives_locales"
+
+    @property
+    def pfx_absolute_path(self) -> Optional[str]:
+        return os.path.abspath(self.pfx_path) if self.pfx_path else None
+
+    @property
+    def active_api_tokens(self) -> List[str]:
+        tokens = [self.api_security_token] if self.api_security_token else []
+        return tokens + [token for token in self.api_security_tokens if token not in tokens]
+
+    @classmethod
+    def from_env(cls, environ: Mapping[str, str] = os.environ) -> "Settings":
+        """
+        Construit la configuration à partir des variables d'environnement.
+        Une variable absente ou vide garde la valeur par défaut.
+
+        Raises:
+            ValueError: Si une valeur numérique est invalide.
+        """
+        values = {}
+        for settings_field in fields(cls):
+            env_name = settings_field.metadata.get("env", settings_field.name.upper())
+            raw = environ.get(env_name)
+            if not raw:
+                continue
+            try:
+                if "parse" in settings_field.metadata:
+                    values[settings_field.name] = settings_field.metadata["parse"](raw)
+                elif settings_field.type is int:
+                    values[settings_field.name] = int(raw)
+                elif settings_field.type is float:
+                    values[settings_field.name] = float(raw)
+                elif settings_field.type == List[str]:
+                    values[settings_field.name] = _parse_list(raw)
+                else:
+                    values[settings_field.name] = raw
+            except ValueError as e:
+                raise ValueError(f"Valeur invalide pour {env_name}: {raw!r}") from e
+        return cls(**values)
+
+
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    """
+    Retourne la configuration du processus, chargée au premier appel.
+
+    Comme auparavant, les valeurs du fichier .env ont priorité sur celles de
+    l'environnement.
+    """
+    from dotenv import load_dotenv
+
+    env_file = os.getenv("ENV_FILE") or os.path.join(PROJECT_ROOT, ".env")
+    if os.path.isfile(env_file):
+        load_dotenv(env_file, override=True)
+    return Settings.from_env()
+
+
+def __getattr__(name: str):
+    # Compatibilité : `from sharepoint_connector.config import RETRY_COUNT`.
+    # Charge la configuration (voir get_settings) lors de l'import du nom.
+    if name.isupper():
+        settings = get_settings()
+        if hasattr(settings, name.lower()):
+            return getattr(settings, name.lower())
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
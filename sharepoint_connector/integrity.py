@@ -0,0 +1,131 @@
+# File: sharepoint_connector/integrity.py
+
+"""
+Vérification de l'intégrité des dossiers uploadés, avant leur suppression locale.
+
+À la réception, la taille et l'empreinte SHA-256 de chaque fichier sont calculées
+au fil de l'écriture et enregistrées dans l'index du spool. Après l'upload :
+
+- chaque fichier local doit encore correspondre à son empreinte de réception ;
+- la taille de chaque fichier sur chaque destination (voir storage.py) doit être
+  celle envoyée, et son ETag celui retourné à l'envoi. Ces métadonnées sont lues
+  par lots (requêtes $batch pour SharePoint), sans retélécharger les fichiers.
+"""
+
+import hashlib
+import os
+from typing import BinaryIO, Dict, List, Optional, Tuple
+from sharepoint_connector.config import VERIFY_BATCH_SIZE
+from sharepoint_connector.spool import get_file_digests
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path: str) -> Tuple[int, str]:
+    """
+    Calcule la taille et l'empreinte SHA-256 d'un fichier, par morceaux.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            size += len(chunk)
+    return size, digest.hexdigest()
+
+
+def copy_and_hash(src: BinaryIO, dst: BinaryIO) -> Tuple[int, str]:
+    """
+    Copie un flux dans un autre en calculant sa taille et son empreinte SHA-256.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = src.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        dst.write(chunk)
+        digest.update(chunk)
+        size += len(chunk)
+    return size, digest.hexdigest()
+
+
+def hash_dossier(upload_dir: str) -> List[Tuple[str, int, str]]:
+    """
+    Calcule (chemin relatif, taille, sha256) de tous les fichiers d'un dossier.
+    """
+    files = []
+    for root, dirs, filenames in os.walk(upload_dir):
+        for filename in filenames:
+            path = os.path.join(root, filename)
+            files.append((os.path.relpath(path, upload_dir).replace("\\", "/"), *hash_file(path)))
+    return files
+
+
+def response_etag(response) -> Optional[str]:
+    """
+    Extrait l'ETag de la réponse JSON d'un `Files/add`, s'il est présent.
+    """
+    try:
+        return response.json()["d"]["ETag"]
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def verify_local_files(local_directory: str) -> List[str]:
+    """
+    Vérifie que chaque fichier du dossier correspond encore à son empreinte de réception.
+
+    Returns:
+        List[str]: Anomalies détectées.
+    """
+    errors = []
+    for path, (size, sha256) in sorted(get_file_digests(local_directory).items()):
+        local_path = os.path.join(local_directory, path)
+        if not os.path.isfile(local_path):
+            errors.append(f"{path}: fichier local introuvable")
+        elif hash_file(local_path) != (size, sha256):
+            errors.append(f"{path}: le fichier local ne correspond plus à celui reçu")
+    return errors
+
+
+def read_files_metadata(backend, server_urls: List[str]) -> List[Optional[Dict]]:
+    """
+    Lit la taille et l'ETag de fichiers d'une destination, par lots de VERIFY_BATCH_SIZE.
+
+    Returns:
+        List[Optional[Dict]]: {"Length", "ETag"} par fichier, ou None s'il est introuvable.
+    """
+    metadata = []
+    for start in range(0, len(server_urls), VERIFY_BATCH_SIZE):
+        batch = server_urls[start:start + VERIFY_BATCH_SIZE]
+        batch_metadata = backend.get_files_metadata(batch)
+        metadata += batch_metadata + [None] * (len(batch) - len(batch_metadata))
+    return metadata
+
+
+def verify_uploaded(backend, uploaded: List[Dict]) -> List[str]:
+    """
+    Vérifie la taille et l'ETag des fichiers envoyés vers une destination.
+
+    Args:
+        backend (StorageBackend): Destination des fichiers (voir storage.py).
+        uploaded (List[Dict]): Fichiers envoyés : {"server_url", "size", "etag"}.
+
+    Returns:
+        List[str]: Anomalies détectées.
+    """
+    errors = []
+    metadata = read_files_metadata(backend, [file["server_url"] for file in uploaded])
+    for file, server_file in zip(uploaded, metadata):
+        if server_file is None:
+            errors.append(f"{file['server_url']}: introuvable sur {backend.name}")
+        elif server_file["Length"] != file["size"]:
+            errors.append(f"{file['server_url']}: {server_file['Length']} octets sur {backend.name}, {file['size']} envoyés")
+        elif file["etag"] and server_file["ETag"] != file["etag"]:
+            errors.append(f"{file['server_url']}: ETag {server_file['ETag']} différent de {file['etag']}")
+    return errors
+
@@ -0,0 +1,146 @@
+# File: sharepoint_connector/job_lock.py
+
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Optional
+from sharepoint_connector.config import UPLOAD_LEASE_TTL, UPLOAD_LEASE_HEARTBEAT
+from app.utils import logger
+
+LOCK_SUFFIX = ".lock"
+
+
+def lock_path_for(directory: str) -> str:
+    """
+    Retourne le chemin du fichier de verrou associé à un répertoire d'upload.
+
+    Le verrou est placé à côté du répertoire (et non dedans) pour ne pas être
+    uploadé vers SharePoint ni supprimé par `shutil.rmtree`.
+    """
+    return os.path.normpath(directory) + LOCK_SUFFIX
+
+
+def is_directory_locked(directory: str, ttl: int = UPLOAD_LEASE_TTL) -> bool:
+    """
+    Indique si un répertoire d'upload est actuellement pris en charge par un worker.
+
+    Un bail dont le heartbeat est plus ancien que `ttl` est considéré comme abandonné.
+    """
+    try:
+        mtime = os.path.getmtime(lock_path_for(directory))
+    except FileNotFoundError:
+        return False
+    return time.time() - mtime <= ttl
+
+
+class DirectoryLease:
+    """
+    Bail exclusif sur un répertoire d'upload, partagé entre processus et workers.
+
+    Le bail est matérialisé par un fichier `<répertoire>.lock` créé de manière atomique
+    (O_CREAT | O_EXCL). Un thread de heartbeat rafraîchit sa date de modification ;
+    un bail non rafraîchi depuis plus de `ttl` secondes est considéré comme abandonné
+    et peut être repris par un autre worker.
+    """
+
+    def __init__(self, directory: str, ttl: int = UPLOAD_LEASE_TTL, heartbeat_interval: int = UPLOAD_LEASE_HEARTBEAT):
+        self.directory = os.path.normpath(directory)
+        self.lock_path = lock_path_for(directory)
+        self.ttl = ttl
+        self.heartbeat_interval = heartbeat_interval
+        self.token = uuid.uuid4().hex
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def acquire(self) -> bool:
+        """
+        Tente de prendre le bail. Retourne True si le bail est obtenu, False sinon.
+        """
+        if not self._try_create():
+            if not self._is_expired():
+                return False
+            logger.warning(f"Bail expiré détecté sur '{self.directory}'. Reprise du dossier.")
+            self._break_stale()
+            if not self._try_create():
+                return False
+
+        self._thread = threading.Thread(target=self._heartbeat, name=f"lease-{self.token[:8]}", daemon=True)
+        self._thread.start()
+        logger.info(f"Bail obtenu sur le dossier '{self.directory}'.")
+        return True
+
+    def is_held(self) -> bool:
+        """
+        Vérifie que le fichier de verrou appartient toujours à ce bail.
+        """
+        try:
+            with open(self.lock_path, "r", encoding="utf-8") as f:
+                return json.load(f).get("token") == self.token
+        except (OSError, ValueError):
+            return False
+
+    def release(self) -> None:
+        """
+        Arrête le heartbeat et supprime le fichier de verrou s'il nous appartient encore.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.is_held():
+            try:
+                os.remove(self.lock_path)
+                logger.info(f"Bail libéré sur le dossier '{self.directory}'.")
+            except FileNotFoundError:
+                pass
+
+    def _try_create(self) -> bool:
+        try:
+            fd = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({
+                "token": self.token,
+                "host": socket.gethostname(),
+                "pid": os.getpid(),
+                "acquired_at": time.time()
+            }, f)
+        return True
+
+    def _is_expired(self) -> bool:
+        try:
+            return time.time() - os.path.getmtime(self.lock_path) > self.ttl
+        except FileNotFoundError:
+            return True
+
+    def _break_stale(self) -> None:
+        # On renomme le verrou vers un nom unique : un seul worker peut réussir ce rename.
+        tombstone = f"{self.lock_path}.{self.token}.stale"
+        try:
+            os.rename(self.lock_path, tombstone)
+        except FileNotFoundError:
+            return
+        try:
+            # Le bail a été rafraîchi entre la vérification et le rename : on le restaure.
+            if time.time() - os.path.getmtime(tombstone) <= self.ttl and not os.path.exists(self.lock_path):
+                os.rename(tombstone, self.lock_path)
+            else:
+                os.remove(tombstone)
+        except OSError as e:
+            logger.error(f"Erreur lors de la reprise du verrou '{self.lock_path}': {e}")
+
+    def _heartbeat(self) -> None:
+        while not self._stop.wait(self.heartbeat_interval):
+            if not self.is_held():
+                self.lost = True
+                logger.error(f"Bail perdu sur le dossier '{self.directory}' (repris par un autre worker).")
+                return
+            try:
+                os.utime(self.lock_path, None)
+            except OSError as e:
+                logger.warning(f"Échec du heartbeat du bail '{self.lock_path}': {e}")
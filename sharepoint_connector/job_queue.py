@@ -0,0 +1,435 @@
+# File: sharepoint_connector/job_queue.py
+
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+from sharepoint_connector.config import (
+    JOB_DATABASE_PATH, UPLOAD_LEASE_TTL, JOB_PRIORITY_SUBMISSION, JOB_PRIORITY_RETRY,
+    JOB_AGING_INTERVAL, JOB_MAX_RUNNING_RETRIES, JOB_PRIORITY_BULK
+)
+from sharepoint_connector.job_lock import is_directory_locked
+from app.utils import logger
+
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_SUCCEEDED = "succeeded"
+STATUS_FAILED = "failed"
+
+KIND_SUBMISSION = "submission"
+KIND_RETRY = "retry"
+KIND_BULK = "bulk"
+
+PRIORITIES = {
+    KIND_SUBMISSION: JOB_PRIORITY_SUBMISSION,
+    KIND_RETRY: JOB_PRIORITY_RETRY,
+    KIND_BULK: JOB_PRIORITY_BULK,
+}
+
+# Priorité effective : plus elle est basse, plus le job passe tôt. Chaque
+# JOB_AGING_INTERVAL secondes d'attente fait gagner un niveau, pour qu'une
+# relance ne soit jamais affamée par un flux continu de nouvelles soumissions.
+# Avec JOB_AGING_INTERVAL <= 0, la priorité ne change pas avec l'attente.
+EFFECTIVE_PRIORITY = "(CASE WHEN :aging > 0 THEN priority - (:now - enqueued_at) / :aging ELSE priority END)"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS upload_jobs (
+    id TEXT PRIMARY KEY,
+    upload_dir TEXT NOT NULL,
+    email TEXT NOT NULL,
+    kind TEXT NOT NULL DEFAULT 'submission',
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    enqueued_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    worker TEXT,
+    sharepoint_link TEXT,
+    error TEXT,
+    reference TEXT,
+    bytes_saved INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_upload_jobs_status ON upload_jobs (status, enqueued_at);
+CREATE INDEX IF NOT EXISTS idx_upload_jobs_dir ON upload_jobs (upload_dir, status);
+CREATE TABLE IF NOT EXISTS job_files (
+    job_id TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    bytes_sent INTEGER NOT NULL DEFAULT 0,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (job_id, path)
+);
+"""
+
+FILE_PENDING = "pending"
+FILE_UPLOADING = "uploading"
+FILE_UPLOADED = "uploaded"
+FILE_FAILED = "failed"
+FILE_SKIPPED = "skipped"  # déjà archivé par une soumission précédente (voir remote_index.py)
+
+MIGRATIONS = {
+    "kind": "ALTER TABLE upload_jobs ADD COLUMN kind TEXT NOT NULL DEFAULT 'submission'",
+    "priority": "ALTER TABLE upload_jobs ADD COLUMN priority INTEGER NOT NULL DEFAULT 0",
+    "sharepoint_link": "ALTER TABLE upload_jobs ADD COLUMN sharepoint_link TEXT",
+    "error": "ALTER TABLE upload_jobs ADD COLUMN error TEXT",
+    "reference": "ALTER TABLE upload_jobs ADD COLUMN reference TEXT",
+    "bytes_saved": "ALTER TABLE upload_jobs ADD COLUMN bytes_saved INTEGER NOT NULL DEFAULT 0",
+}
+
+
+@contextmanager
+def _connect(db_path: Optional[str] = None):
+    """
+    Ouvre une connexion SQLite en mode autocommit, partageable entre processus (WAL).
+    """
+    conn = sqlite3.connect(db_path or JOB_DATABASE_PATH, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        yield conn
+    finally:
+        conn.close()
+
+
+def init_job_queue(db_path: Optional[str] = None) -> None:
+    """
+    Crée la base de la file d'attente des jobs d'upload si elle n'existe pas.
+    """
+    with _connect(db_path) as conn:
+        conn.executescript(SCHEMA)
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(upload_jobs)")}
+        for column, statement in MIGRATIONS.items():
+            if column not in columns:
+                conn.execute(statement)
+    logger.info(f"File d'attente des uploads initialisée: {db_path or JOB_DATABASE_PATH}")
+
+
+def enqueue_upload_job(
+    upload_dir: str,
+    email: str,
+    kind: str = KIND_SUBMISSION,
+    reference: Optional[str] = None,
+    db_path: Optional[str] = None
+) -> str:
+    """
+    Ajoute un job d'upload vers SharePoint dans la file d'attente.
+
+    Les nouvelles soumissions (KIND_SUBMISSION) passent avant les relances (KIND_RETRY).
+    `reference` est un identifiant fourni par l'appelant (ex. l'ID de l'entrée
+    WordPress), renvoyé tel quel dans le statut et les webhooks du job.
+
+    Si un job en attente ou en cours existe déjà pour ce dossier, son identifiant
+    est retourné au lieu d'en créer un nouveau.
+
+    Returns:
+        str: Identifiant du job.
+    """
+    upload_dir = os.path.normpath(upload_dir)
+    with _connect(db_path) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id FROM upload_jobs WHERE upload_dir = ? AND status IN (?, ?)",
+                (upload_dir, STATUS_PENDING, STATUS_RUNNING)
+            ).fetchone()
+            if row:
+                conn.execute("COMMIT")
+                logger.info(f"Job {row['id']} déjà en file pour le dossier {upload_dir}.")
+                return row["id"]
+            if reference is None:
+                # Une relance hérite de la référence du job précédent du même dossier
+                previous = conn.execute(
+                    "SELECT reference FROM upload_jobs WHERE upload_dir = ? ORDER BY enqueued_at DESC LIMIT 1",
+                    (upload_dir,)
+                ).fetchone()
+                reference = previous["reference"] if previous else None
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO upload_jobs (id, upload_dir, email, kind, priority, status, enqueued_at, reference) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, upload_dir, email, kind, PRIORITIES[kind], STATUS_PENDING, time.time(), reference)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    logger.info(f"Job {job_id} ajouté à la file pour le dossier {upload_dir}.")
+    return job_id
+
+
+def claim_next_job(worker_id: str, db_path: Optional[str] = None) -> Optional[Dict]:
+    """
+    Réserve le prochain job en attente pour un worker, par priorité effective.
+
+    Au plus JOB_MAX_RUNNING_RETRIES jobs de fond (relances, imports en masse)
+    s'exécutent en même temps ; au-delà, seules les nouvelles soumissions
+    peuvent être réservées.
+
+    Returns:
+        Optional[Dict]: Le job réservé, ou None si aucun job n'est éligible.
+    """
+    with _connect(db_path) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            running_background = conn.execute(
+                "SELECT COUNT(*) FROM upload_jobs WHERE status = ? AND kind != ?",
+                (STATUS_RUNNING, KIND_SUBMISSION)
+            ).fetchone()[0]
+            row = conn.execute(
+                "SELECT * FROM upload_jobs WHERE status = :status AND (kind = :submission OR :allow_background) "
+                f"ORDER BY {EFFECTIVE_PRIORITY}, enqueued_at LIMIT 1",
+                {
+                    "status": STATUS_PENDING,
+                    "submission": KIND_SUBMISSION,
+                    "allow_background": running_background < JOB_MAX_RUNNING_RETRIES,
+                    "now": time.time(),
+                    "aging": JOB_AGING_INTERVAL
+                }
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE upload_jobs SET status = ?, started_at = ?, worker = ? WHERE id = ?",
+                (STATUS_RUNNING, time.time(), worker_id, row["id"])
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    return dict(row)
+
+
+def complete_job(
+    job_id: str,
+    success: bool,
+    db_path: Optional[str] = None,
+    on_complete: Optional[Callable[[sqlite3.Connection, Dict], None]] = None
+) -> None:
+    """
+    Marque un job comme terminé (succès ou échec).
+
+    `on_complete(conn, statut_du_job)` est appelé dans la même transaction, par
+    exemple pour ajouter les webhooks de fin du job à l'outbox : le job n'est
+    terminé que si ses événements sont enregistrés.
+    """
+    status = STATUS_SUCCEEDED if success else STATUS_FAILED
+    with _connect(db_path) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "UPDATE upload_jobs SET status = ?, finished_at = ? WHERE id = ?",
+                (status, time.time(), job_id)
+            )
+            if on_complete is not None:
+                job = _job_status(conn, job_id)
+                if job is not None:
+                    on_complete(conn, job)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    logger.info(f"Job {job_id} terminé avec le statut '{status}'.")
+
+
+class JobProgress:
+    """
+    Enregistre l'avancement d'un job d'upload (état de chaque fichier, octets
+    envoyés, tentatives, lien SharePoint final) pour l'API de statut.
+
+    Sans `job_id` (upload lancé hors de la file d'attente), toutes les méthodes
+    sont sans effet.
+    """
+
+    def __init__(self, job_id: Optional[str], db_path: Optional[str] = None):
+        self.job_id = job_id
+        self.db_path = db_path
+
+    def set_files(self, files: List[Tuple[str, int]]) -> None:
+        """
+        Déclare les fichiers à uploader, sous forme de (chemin relatif, taille).
+        """
+        if not self.job_id:
+            return
+        with _connect(self.db_path) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM job_files WHERE job_id = ?", (self.job_id,))
+            conn.executemany(
+                "INSERT INTO job_files (job_id, path, size, state) VALUES (?, ?, ?, ?)",
+                [(self.job_id, path, size, FILE_PENDING) for path, size in files]
+            )
+            conn.execute("COMMIT")
+
+    def set_file_state(self, path: str, state: str, bytes_sent: Optional[int] = None) -> None:
+        if not self.job_id:
+            return
+        with _connect(self.db_path) as conn:
+            conn.execute(
+                "UPDATE job_files SET state = ?, bytes_sent = COALESCE(?, bytes_sent) WHERE job_id = ? AND path = ?",
+                (state, bytes_sent, self.job_id, path)
+            )
+
+    def add_attempt(self, path: str) -> None:
+        if not self.job_id:
+            return
+        with _connect(self.db_path) as conn:
+            conn.execute(
+                "UPDATE job_files SET attempts = attempts + 1 WHERE job_id = ? AND path = ?",
+                (self.job_id, path)
+            )
+
+    def set_bytes_saved(self, bytes_saved: int) -> None:
+        """
+        Enregistre les octets économisés par la compaction des fichiers (voir compaction.py).
+        """
+        if not self.job_id:
+            return
+        with _connect(self.db_path) as conn:
+            conn.execute("UPDATE upload_jobs SET bytes_saved = ? WHERE id = ?", (bytes_saved, self.job_id))
+
+    def finish(self, sharepoint_link: Optional[str] = None, error: Optional[str] = None) -> None:
+        if not self.job_id:
+            return
+        with _connect(self.db_path) as conn:
+            conn.execute(
+                "UPDATE upload_jobs SET sharepoint_link = ?, error = ? WHERE id = ?",
+                (sharepoint_link, error, self.job_id)
+            )
+
+
+def get_job_status(job_id: str, db_path: Optional[str] = None) -> Optional[Dict]:
+    """
+    Retourne l'état d'un job et de ses fichiers, ou None si le job est inconnu.
+    """
+    with _connect(db_path) as conn:
+        return _job_status(conn, job_id)
+
+
+def _job_status(conn: sqlite3.Connection, job_id: str) -> Optional[Dict]:
+    job = conn.execute(
+        "SELECT id, upload_dir, email, kind, status, enqueued_at, started_at, finished_at, "
+        "sharepoint_link, error, reference, bytes_saved FROM upload_jobs WHERE id = ?",
+        (job_id,)
+    ).fetchone()
+    if job is None:
+        return None
+    files = [dict(row) for row in conn.execute(
+        "SELECT path, size, bytes_sent, state, attempts FROM job_files WHERE job_id = ? ORDER BY path",
+        (job_id,)
+    )]
+    status = dict(job)
+    status["files"] = files
+    status["files_uploaded"] = sum(1 for file in files if file["state"] == FILE_UPLOADED)
+    status["files_skipped"] = sum(1 for file in files if file["state"] == FILE_SKIPPED)
+    status["bytes_total"] = sum(file["size"] for file in files)
+    status["bytes_sent"] = sum(file["bytes_sent"] for file in files)
+    status["retries"] = sum(max(0, file["attempts"] - 1) for file in files)
+    return status
+
+
+def pending_job_count(db_path: Optional[str] = None, kind: Optional[str] = None) -> int:
+    """
+    Retourne le nombre de jobs en attente ou en cours, tous types confondus ou
+    seulement ceux de type `kind`.
+    """
+    query = "SELECT COUNT(*) FROM upload_jobs WHERE status IN (?, ?)"
+    params: tuple = (STATUS_PENDING, STATUS_RUNNING)
+    if kind is not None:
+        query += " AND kind = ?"
+        params += (kind,)
+    with _connect(db_path) as conn:
+        row = conn.execute(query, params).fetchone()
+    return row[0]
+
+
+def requeue_stale_jobs(db_path: Optional[str] = None) -> int:
+    """
+    Remet en attente les jobs 'running' dont le worker a disparu.
+
+    Un job est considéré comme abandonné s'il a démarré depuis plus de
+    UPLOAD_LEASE_TTL secondes et que son dossier n'est plus verrouillé.
+
+    Returns:
+        int: Nombre de jobs remis en attente.
+    """
+    cutoff = time.time() - UPLOAD_LEASE_TTL
+    requeued = 0
+    with _connect(db_path) as conn:
+        rows = conn.execute(
+            "SELECT id, upload_dir FROM upload_jobs WHERE status = ? AND started_at < ?",
+            (STATUS_RUNNING, cutoff)
+        ).fetchall()
+        for row in rows:
+            if is_directory_locked(row["upload_dir"]):
+                continue
+            conn.execute(
+                "UPDATE upload_jobs SET status = ?, started_at = NULL, worker = NULL WHERE id = ? AND status = ?",
+                (STATUS_PENDING, row["id"], STATUS_RUNNING)
+            )
+            requeued += 1
+            logger.warning(f"Job {row['id']} abandonné remis en attente ({row['upload_dir']}).")
+    return requeued
+
+
+def queue_snapshot(limit: int = 100, db_path: Optional[str] = None) -> List[Dict]:
+    """
+    Retourne les jobs en attente dans l'ordre où ils seront réservés,
+    avec leur position et leur temps d'attente courant.
+    """
+    now = time.time()
+    with _connect(db_path) as conn:
+        rows = conn.execute(
+            "SELECT id, upload_dir, email, kind, priority, enqueued_at FROM upload_jobs WHERE status = :status "
+            f"ORDER BY {EFFECTIVE_PRIORITY}, enqueued_at LIMIT :limit",
+            {"status": STATUS_PENDING, "now": now, "aging": JOB_AGING_INTERVAL, "limit": limit}
+        ).fetchall()
+    return [
+        {
+            "position": position,
+            "job_id": row["id"],
+            "folder": row["upload_dir"],
+            "email": row["email"],
+            "kind": row["kind"],
+            "priority": row["priority"],
+            "waiting_seconds": round(now - row["enqueued_at"], 1)
+        }
+        for position, row in enumerate(rows, start=1)
+    ]
+
+
+def queue_stats(window: float = 3600, db_path: Optional[str] = None) -> Dict[str, Dict]:
+    """
+    Calcule, par type de job, le nombre de jobs en attente / en cours et les
+    temps d'attente (entre la mise en file et le démarrage) observés sur la
+    fenêtre `window` (en secondes).
+    """
+    now = time.time()
+    stats = {}
+    with _connect(db_path) as conn:
+        for kind in PRIORITIES:
+            counts = dict(conn.execute(
+                "SELECT status, COUNT(*) FROM upload_jobs WHERE kind = ? AND status IN (?, ?) GROUP BY status",
+                (kind, STATUS_PENDING, STATUS_RUNNING)
+            ).fetchall())
+            oldest = conn.execute(
+                "SELECT MIN(enqueued_at) FROM upload_jobs WHERE kind = ? AND status = ?",
+                (kind, STATUS_PENDING)
+            ).fetchone()[0]
+            waits = sorted(
+                row[0] for row in conn.execute(
+                    "SELECT started_at - enqueued_at FROM upload_jobs WHERE kind = ? AND started_at >= ?",
+                    (kind, now - window)
+                )
+            )
+            stats[kind] = {
+                "pending": counts.get(STATUS_PENDING, 0),
+                "running": counts.get(STATUS_RUNNING, 0),
+                "oldest_pending_seconds": round(now - oldest, 1) if oldest else 0.0,
+                "started_in_window": len(waits),
+                "avg_wait_seconds": round(sum(waits) / len(waits), 1) if waits else 0.0,
+                "p95_wait_seconds": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 1) if waits else 0.0
+            }
+    return stats
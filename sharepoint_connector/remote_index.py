@@ -0,0 +1,201 @@
+# File: sharepoint_connector/remote_index.py
+
+"""
+Index des fichiers déjà archivés, par destination et par participant.
+
+Chaque soumission d'un même participant crée un nouveau dossier local
+`{email}-{uuid}`, mais toutes sont archivées dans le même dossier distant
+/<TARGET_FOLDER_RELATIVE_URL>/<email>. L'index garde, pour chaque fichier
+envoyé, son chemin distant, sa taille, son empreinte SHA-256 et son ETag, ainsi
+que les dossiers distants déjà créés. Avec INCREMENTAL_SYNC=on, l'upload d'une
+nouvelle soumission :
+
+- n'envoie pas un fichier dont le contenu est déjà archivé dans le même dossier
+  distant (son existence est confirmée par une seule lecture groupée des
+  métadonnées) ;
+- ne recrée pas les dossiers distants déjà connus ;
+- choisit un nom libre (`releve_20240101120000_2.pdf`) plutôt que d'écraser un
+  fichier archivé de même nom et de contenu différent. Le nom est réservé dans
+  l'index avant l'envoi (sha256 vide), dans une transaction : deux jobs du même
+  participant exécutés en même temps ne peuvent pas choisir le même nom.
+
+Seuls les fichiers envoyés depuis la mise en place de l'index y figurent.
+"""
+
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+from sharepoint_connector.job_queue import _connect
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS remote_files (
+    backend TEXT NOT NULL,
+    email TEXT NOT NULL,
+    server_url TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    etag TEXT,
+    uploaded_at REAL NOT NULL,
+    PRIMARY KEY (backend, server_url)
+);
+CREATE INDEX IF NOT EXISTS idx_remote_files_email ON remote_files (backend, email);
+CREATE TABLE IF NOT EXISTS remote_folders (
+    backend TEXT NOT NULL,
+    email TEXT NOT NULL,
+    folder TEXT NOT NULL,
+    PRIMARY KEY (backend, folder)
+);
+"""
+
+
+def init_remote_index(db_path: Optional[str] = None) -> None:
+    """
+    Crée l'index des fichiers archivés s'il n'existe pas.
+    """
+    with _connect(db_path) as conn:
+        conn.executescript(SCHEMA)
+
+
+def _split(server_url: str) -> Tuple[str, str]:
+    folder, _, filename = server_url.rpartition("/")
+    return folder, filename
+
+
+class ParticipantIndex:
+    """
+    Fichiers et dossiers déjà archivés d'un participant sur une destination,
+    chargés en une requête au début de l'upload et mis à jour au fil des envois.
+    """
+
+    def __init__(self, backend: str, email: str, db_path: Optional[str] = None):
+        self.backend = backend
+        self.email = email
+        self.db_path = db_path
+        # server_url -> (taille, sha256), et (dossier, taille, sha256) -> server_url
+        self.files: Dict[str, Tuple[int, str]] = {}
+        self._by_content: Dict[Tuple[str, int, str], str] = {}
+        # Noms réservés par ce job et pas encore enregistrés
+        self._reserved: List[str] = []
+        with _connect(db_path) as conn:
+            for row in conn.execute(
+                "SELECT server_url, size, sha256 FROM remote_files WHERE backend = ? AND email = ?",
+                (backend, email)
+            ):
+                self._add(row["server_url"], row["size"], row["sha256"])
+            self.folders = {
+                row["folder"] for row in conn.execute(
+                    "SELECT folder FROM remote_folders WHERE backend = ? AND email = ?", (backend, email)
+                )
+            }
+
+    def _add(self, server_url: str, size: int, sha256: str) -> None:
+        self._remove(server_url)
+        self.files[server_url] = (size, sha256)
+        self._by_content.setdefault((_split(server_url)[0], size, sha256), server_url)
+
+    def _remove(self, server_url: str) -> None:
+        known = self.files.pop(server_url, None)
+        if known is not None and self._by_content.get((_split(server_url)[0], *known)) == server_url:
+            del self._by_content[(_split(server_url)[0], *known)]
+
+    def find(self, folder: str, size: int, sha256: str) -> Optional[str]:
+        """
+        Retourne le chemin distant d'un fichier de même contenu dans `folder`, s'il est archivé.
+        """
+        return self._by_content.get((folder.rstrip("/"), size, sha256))
+
+    def reserve_name(self, folder: str, filename: str) -> str:
+        """
+        Réserve `filename`, ou `nom_2.ext`, `nom_3.ext`... si ce nom est déjà pris
+        (ou réservé par un autre job) dans `folder`.
+
+        Returns:
+            str: Nom réservé, à enregistrer par `record_files` ou à libérer par `release`.
+        """
+        folder = folder.rstrip("/")
+        name, extension = os.path.splitext(filename)
+        candidate, counter = filename, 1
+        with _connect(self.db_path) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                while conn.execute(
+                    "SELECT 1 FROM remote_files WHERE backend = ? AND server_url = ?",
+                    (self.backend, f"{folder}/{candidate}")
+                ).fetchone():
+                    counter += 1
+                    candidate = f"{name}_{counter}{extension}"
+                conn.execute(
+                    "INSERT INTO remote_files (backend, email, server_url, size, sha256, etag, uploaded_at) "
+                    "VALUES (?, ?, ?, 0, '', NULL, ?)",
+                    (self.backend, self.email, f"{folder}/{candidate}", time.time())
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        self._reserved.append(f"{folder}/{candidate}")
+        return candidate
+
+    def release(self) -> None:
+        """
+        Libère les noms réservés par ce job qui n'ont pas été enregistrés (upload échoué).
+        """
+        if not self._reserved:
+            return
+        with _connect(self.db_path) as conn:
+            conn.executemany(
+                "DELETE FROM remote_files WHERE backend = ? AND server_url = ? AND sha256 = ''",
+                [(self.backend, server_url) for server_url in self._reserved]
+            )
+        self._reserved = []
+
+    def has_folder(self, folder: str) -> bool:
+        return folder.rstrip("/") in self.folders
+
+    def record_folder(self, folder: str) -> None:
+        folder = folder.rstrip("/")
+        self.folders.add(folder)
+        with _connect(self.db_path) as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO remote_folders (backend, email, folder) VALUES (?, ?, ?)",
+                (self.backend, self.email, folder)
+            )
+
+    def record_files(self, files: List[Dict]) -> None:
+        """
+        Enregistre des fichiers envoyés ({"server_url", "size", "sha256", "etag"}).
+        """
+        for file in files:
+            self._add(file["server_url"], file["size"], file["sha256"])
+        recorded = {file["server_url"] for file in files}
+        self._reserved = [server_url for server_url in self._reserved if server_url not in recorded]
+        with _connect(self.db_path) as conn:
+            conn.executemany(
+                "INSERT INTO remote_files (backend, email, server_url, size, sha256, etag, uploaded_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (backend, server_url) DO UPDATE SET "
+                "size = excluded.size, sha256 = excluded.sha256, etag = excluded.etag, uploaded_at = excluded.uploaded_at",
+                [
+                    (self.backend, self.email, file["server_url"], file["size"], file["sha256"], file.get("etag"), time.time())
+                    for file in files
+                ]
+            )
+
+    def forget(self, server_urls: List[str]) -> None:
+        """
+        Oublie des fichiers introuvables ou modifiés sur la destination.
+        """
+        for server_url in server_urls:
+            self._remove(server_url)
+        with _connect(self.db_path) as conn:
+            conn.executemany(
+                "DELETE FROM remote_files WHERE backend = ? AND server_url = ?",
+                [(self.backend, server_url) for server_url in server_urls]
+            )
+
+    def forget_folders(self) -> None:
+        """
+        Oublie les dossiers connus du participant (après une erreur d'upload, ils seront vérifiés à nouveau).
+        """
+        self.folders.clear()
+        with _connect(self.db_path) as conn:
+            conn.execute("DELETE FROM remote_folders WHERE backend = ? AND email = ?", (self.backend, self.email))
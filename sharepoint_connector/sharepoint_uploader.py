@@ -1,73 +1,80 @@
 # File: sharepoint_connector/sharepoint_uploader.py
 
-from sharepoint_connector.auth import authenticate, get_headers, get_form_digest
-from sharepoint_connector.sharepoint_utils import create_folder, upload_file_local
-from sharepoint_connector.config import SITE_URL, TARGET_FOLDER_RELATIVE_URL
+from concurrent.futures import ThreadPoolExecutor
+from sharepoint_connector.config import (
+    TARGET_FOLDER_RELATIVE_URL, UPLOAD_BUNDLE_MODE, COMPACTION_MODE, VERIFY_UPLOADS, INCREMENTAL_SYNC
+)
+from sharepoint_connector.compaction import compact_dossier
+from sharepoint_connector.integrity import verify_local_files, verify_uploaded, read_files_metadata, hash_file
+from sharepoint_connector.bundling import plan_bundle, iter_zip, build_index, bundle_names
+from sharepoint_connector.job_lock import DirectoryLease
+from sharepoint_connector.spool import mark_dossier_uploaded, forget_dossier, get_file_digests
+from sharepoint_connector.job_queue import JobProgress, FILE_UPLOADING, FILE_UPLOADED, FILE_FAILED, FILE_SKIPPED
+from sharepoint_connector.remote_index import ParticipantIndex
+from sharepoint_connector.audit import (
+    record_event, EVENT_UPLOAD_SUCCEEDED, EVENT_UPLOAD_FAILED, EVENT_NOTIFICATION_SENT, EVENT_NOTIFICATION_FAILED
+)
+from sharepoint_connector.storage import StorageBackend, SharePointBackend, get_storage_backends
 import os
-from typing import List
-from app.utils import send_email, get_user_name, logger  # Import du logger
-from dotenv import load_dotenv
+from typing import Dict, List, Optional, Tuple
+from app.utils import send_email, get_user_name, logger, DOSSIER_METADATA_FILE, IDENTIFICATION_FILE  # Import du logger
 from datetime import datetime
 import shutil  # Import pour supprimer les dossiers
 
-load_dotenv()  # Charger les variables d'environnement
-
-def upload_files_to_sharepoint(local_directory: str, email: str) -> bool:
+def upload_files_to_sharepoint(
+    local_directory: str,
+    email: str,
+    job_id: Optional[str] = None,
+    backends: Optional[List[StorageBackend]] = None
+) -> bool:
     """
     Uploads all files and folders from a local directory to a SharePoint folder associated with the user's email.
 
     Sends email notifications based on the success or failure of the operation.
+    An exclusive lease is taken on the local directory first, so that the same
+    directory is never uploaded by two workers at the same time.
+    When a job_id is given, per-file progress is recorded for the job status API.
+    With COMPACTION_MODE=on, images and PDFs are compacted first.
+    With UPLOAD_BUNDLE_MODE=zip, small files are sent together in a single archive.
+    The files are sent to every configured storage backend (STORAGE_BACKENDS, see
+    storage.py) concurrently; the first one provides the link sent in notifications.
+    With INCREMENTAL_SYNC=on, files already archived by a previous submission of the
+    same participant are not sent again (see remote_index.py).
+    The local directory is only deleted once the upload has been verified (see integrity.py).
 
     Returns:
         bool: True if the upload was successful, False otherwise.
     """
+    lease = DirectoryLease(local_directory)
+    if not lease.acquire():
+        logger.info(f"Dossier '{local_directory}' déjà pris en charge par un autre worker. Upload ignoré.")
+        return False
+
+    if not os.path.isdir(local_directory):
+        # Un autre worker a terminé l'upload et supprimé le dossier avant notre prise de bail
+        logger.info(f"Dossier '{local_directory}' déjà traité. Upload ignoré.")
+        lease.release()
+        return False
+
+    progress = JobProgress(job_id)
+    backends = backends or []
     try:
-        # Authentication
-        access_token = authenticate()
-        headers = get_headers(access_token)
-        form_digest = get_form_digest(SITE_URL, headers)
+        backends = backends or get_storage_backends()
+        if COMPACTION_MODE == "on":
+            progress.set_bytes_saved(compact_dossier(local_directory))
+        progress.set_files(list_local_files(local_directory))
 
-        # Créer le dossier cible dans SharePoint
         target_folder = f"/{TARGET_FOLDER_RELATIVE_URL}/{email}"  # Ne plus remplacer '@' par '_'
-        create_resp = create_folder(SITE_URL, target_folder, headers, form_digest)
-        if create_resp.ok:
-            logger.info(f"Dossier SharePoint '{target_folder}' créé ou déjà existant.")
-        else:
-            if "already exists" in create_resp.text.lower():
-                logger.info(f"Dossier SharePoint '{target_folder}' existe déjà.")
-            else:
-                logger.error(f"Erreur lors de la création du dossier SharePoint '{target_folder}': {create_resp.text}")
-                raise Exception(f"Erreur de création de dossier SharePoint: {create_resp.text}")
-        
-        # Parcourir le répertoire local récursivement
-        for root, dirs, files in os.walk(local_directory):
-            # Calculer le chemin relatif depuis local_directory
-            rel_path = os.path.relpath(root, local_directory)
-            if rel_path == ".":
-                rel_path = ""
-            # Correspondant dossier SharePoint
-            sharepoint_folder = os.path.join(target_folder, rel_path).replace("\\", "/")
-            if rel_path != "":
-                # Créer le dossier SharePoint s'il n'est pas le dossier racine
-                create_resp = create_folder(SITE_URL, sharepoint_folder, headers, form_digest)
-                if create_resp.ok:
-                    logger.info(f"Dossier SharePoint '{sharepoint_folder}' créé ou déjà existant.")
-                else:
-                    if "already exists" in create_resp.text.lower():
-                        logger.info(f"Dossier SharePoint '{sharepoint_folder}' existe déjà.")
-                    else:
-                        logger.error(f"Erreur lors de la création du dossier SharePoint '{sharepoint_folder}': {create_resp.text}")
-                        raise Exception(f"Erreur de création de dossier SharePoint: {create_resp.text}")
-            
-            # Upload des fichiers dans le dossier actuel
-            for filename in files:
-                local_file_path = os.path.join(root, filename)
-                upload_local_resp = upload_file_local(SITE_URL, sharepoint_folder, local_file_path, headers, form_digest)
-                if upload_local_resp.ok:
-                    logger.info(f"Fichier '{filename}' uploadé avec succès sur SharePoint dans '{sharepoint_folder}'.")
-                else:
-                    logger.error(f"Erreur lors de l'upload du fichier '{filename}' sur SharePoint dans '{sharepoint_folder}': {upload_local_resp.text}")
-                    raise Exception(f"Erreur d'upload de fichier SharePoint: {upload_local_resp.text}")
+        # Petits fichiers regroupés dans une archive (voir bundling.py)
+        bundle = plan_bundle(local_directory) if UPLOAD_BUNDLE_MODE == "zip" else []
+        upload_to_backends(backends, local_directory, target_folder, bundle, progress, email=email)
+
+        # Vérifier que la copie locale n'a pas changé avant de pouvoir la supprimer
+        if VERIFY_UPLOADS == "on":
+            errors = verify_local_files(local_directory)
+            if errors:
+                logger.error(f"Vérification de l'upload de '{local_directory}' échouée: {errors}")
+                raise Exception(f"Vérification de l'upload échouée: {'; '.join(errors)}")
         
         # Extraire le nom de l'utilisateur depuis le fichier d'identification
         user_name = get_user_name(local_directory)
@@ -75,45 +82,312 @@ def upload_files_to_sharepoint(local_directory: str, email: str) -> bool:
             logger.warning("Nom de l'utilisateur non trouvé. Utilisation de l'adresse e-mail comme identifiant.")
             user_name = email.split('@')[0]  # Fallback si le nom n'est pas trouvé
 
-        # Chemin du dossier SharePoint pour les e-mails (dossier racine cible)
-        sharepoint_folder_email = target_folder
-
-        # Construire le lien SharePoint
-        sharepoint_link = construct_sharepoint_link(sharepoint_folder_email)
+        # Lien du dossier sur la destination principale (dossier racine cible)
+        sharepoint_link = backends[0].folder_link(target_folder)
+        progress.finish(sharepoint_link=sharepoint_link)
+        record_event(EVENT_UPLOAD_SUCCEEDED, email, local_directory, job_id, detail=sharepoint_link)
 
         # Si tous les uploads ont réussi
         envoyer_notifications_success(email, user_name, sharepoint_link)
 
-        # Supprimer le dossier temporaire sur le disque
+        mark_dossier_uploaded(local_directory)
+
+        # Supprimer le dossier temporaire sur le disque, sauf si le bail a été repris entre-temps
+        if lease.lost:
+            logger.warning(f"Bail perdu sur '{local_directory}'. Le dossier temporaire est conservé.")
+            return True
         try:
             shutil.rmtree(local_directory)
+            forget_dossier(local_directory)
             logger.info(f"Dossier temporaire '{local_directory}' supprimé avec succès.")
         except Exception as e:
+            # Le dossier reste marqué comme uploadé : le nettoyage du spool le supprimera
             logger.error(f"Erreur lors de la suppression du dossier temporaire '{local_directory}': {e}")
 
         return True
     except Exception as e:
         logger.error(f"Une erreur est survenue lors de l'upload: {e}")
+        for backend in backends:
+            backend.reset()
+        progress.finish(error=str(e))
+        record_event(EVENT_UPLOAD_FAILED, email, local_directory, job_id, detail=str(e))
         envoyer_notifications_failure(e, email)
         return False
+    finally:
+        lease.release()
+
+def upload_to_backends(
+    backends: List[StorageBackend],
+    local_directory: str,
+    target_folder: str,
+    bundle: List[tuple],
+    progress: JobProgress,
+    email: Optional[str] = None
+) -> None:
+    """
+    Uploads a local directory to several storage backends concurrently.
+
+    Per-file progress is recorded for the first backend only.
+
+    Raises:
+        Exception: The first error met, once every backend has finished.
+    """
+    if len(backends) == 1:
+        upload_to_backend(backends[0], local_directory, target_folder, bundle, progress, email=email)
+        return
+    with ThreadPoolExecutor(max_workers=len(backends), thread_name_prefix="storage") as pool:
+        futures = [
+            pool.submit(
+                upload_to_backend, backend, local_directory, target_folder, bundle,
+                progress if i == 0 else JobProgress(None), email=email
+            )
+            for i, backend in enumerate(backends)
+        ]
+    errors = []
+    for backend, future in zip(backends, futures):
+        try:
+            future.result()
+        except Exception as e:
+            logger.error(f"Upload de '{local_directory}' vers '{backend.name}' échoué: {e}")
+            errors.append(e)
+    if errors:
+        raise errors[0]
+
+def upload_to_backend(
+    backend: StorageBackend,
+    local_directory: str,
+    target_folder: str,
+    bundle: List[tuple],
+    progress: JobProgress,
+    email: Optional[str] = None
+) -> List[dict]:
+    """
+    Uploads a local directory to one storage backend, then verifies the uploaded files.
+
+    With INCREMENTAL_SYNC=on and the participant's email, the files already archived
+    in the same folder are skipped, known folders are not created again and the names
+    already taken by other files are not overwritten (see remote_index.py).
+
+    Returns:
+        List[dict]: The uploaded files ({"server_url", "size", "etag"}).
+
+    Raises:
+        Exception: If the backend refuses a folder or a file, or if verification fails.
+    """
+    index = ParticipantIndex(backend.key, email) if email and INCREMENTAL_SYNC == "on" else None
+    bundled = {relative_path for relative_path, path, size in bundle}
+    # Les métadonnées structurées du dossier restent locales
+    skipped = bundled | {DOSSIER_METADATA_FILE}
+    uploaded = []
+    digests = {}
+    current_file = None
+
+    try:
+        ensure_folder(backend, index, target_folder)
+        # Parcourir le répertoire local récursivement
+        files = []
+        for root, dirs, filenames in os.walk(local_directory):
+            # Calculer le chemin relatif depuis local_directory
+            rel_path = os.path.relpath(root, local_directory)
+            if rel_path == ".":
+                rel_path = ""
+            # Dossier correspondant sur la destination
+            target_subfolder = os.path.join(target_folder, rel_path).replace("\\", "/")
+            remaining = []
+            for filename in filenames:
+                path = os.path.join(root, filename)
+                relative_path = os.path.relpath(path, local_directory).replace("\\", "/")
+                if relative_path not in skipped:
+                    remaining.append((relative_path, path))
+            if rel_path != "" and (remaining or not filenames):
+                # Créer le sous-dossier s'il n'est pas le dossier racine
+                ensure_folder(backend, index, target_subfolder)
+            files += [(relative_path, path, target_subfolder) for relative_path, path in remaining]
+
+        archived = {}
+        if index is not None:
+            digests = get_dossier_digests(local_directory, [relative_path for relative_path, path, folder in files])
+            archived = find_archived(backend, index, [
+                (relative_path, target_subfolder, *digests[relative_path])
+                for relative_path, path, target_subfolder in files
+            ])
+
+        # Upload des fichiers
+        for relative_path, local_file_path, target_subfolder in files:
+            filename = os.path.basename(local_file_path)
+            if relative_path in archived:
+                progress.set_file_state(relative_path, FILE_SKIPPED)
+                logger.info(f"Fichier '{filename}' déjà archivé sur '{backend.name}' ({archived[relative_path]}). Upload ignoré.")
+                continue
+            if index is not None and relative_path != IDENTIFICATION_FILE:
+                # La fiche d'identification est remplacée ; les documents ne sont jamais écrasés
+                filename = index.reserve_name(target_subfolder, filename)
+            current_file = relative_path
+            progress.set_file_state(current_file, FILE_UPLOADING)
+            uploaded_file = backend.put_file(
+                target_subfolder, local_file_path,
+                on_attempt=lambda attempt, path=current_file: progress.add_attempt(path),
+                filename=filename
+            )
+            uploaded_file["relative_path"] = relative_path
+            uploaded.append(uploaded_file)
+            progress.set_file_state(current_file, FILE_UPLOADED, bytes_sent=uploaded_file["size"])
+            current_file = None
+            logger.info(f"Fichier '{filename}' uploadé avec succès sur '{backend.name}' dans '{target_subfolder}'.")
+
+        if bundle:
+            uploaded += upload_bundle(backend, target_folder, bundle, progress, bundle_names(local_directory), index=index)
+
+        if VERIFY_UPLOADS == "on":
+            errors = verify_uploaded(backend, uploaded)
+            if errors:
+                logger.error(f"Vérification de l'upload de '{local_directory}' vers '{backend.name}' échouée: {errors}")
+                raise Exception(f"Vérification de l'upload échouée: {'; '.join(errors)}")
+    except Exception:
+        if current_file is not None:
+            progress.set_file_state(current_file, FILE_FAILED)
+        if index is not None:
+            # Noms libérés pour la prochaine tentative ; un dossier supprimé sur la destination sera recréé
+            index.release()
+            index.forget_folders()
+        raise
+
+    if index is not None:
+        # Enregistrés une fois vérifiés : un fichier non confirmé sera renvoyé
+        index.record_files([
+            {**file, "sha256": digests[file["relative_path"]][1] if "relative_path" in file else ""}
+            for file in uploaded
+        ])
+    return uploaded
+
+def ensure_folder(backend: StorageBackend, index: Optional[ParticipantIndex], folder: str) -> None:
+    """
+    Creates a folder on a backend, unless the participant index already knows it.
+    """
+    if index is not None and index.has_folder(folder):
+        return
+    backend.ensure_folder(folder)
+    if index is not None:
+        index.record_folder(folder)
+
+def get_dossier_digests(local_directory: str, relative_paths: List[str]) -> Dict[str, Tuple[int, str]]:
+    """
+    Returns the size and SHA-256 of the given files, as recorded on reception, or hashed now.
+    """
+    digests = get_file_digests(local_directory)
+    return {
+        relative_path: digests.get(relative_path) or hash_file(os.path.join(local_directory, relative_path))
+        for relative_path in relative_paths
+    }
+
+def find_archived(backend: StorageBackend, index: ParticipantIndex, files: List[Tuple[str, str, int, str]]) -> Dict[str, str]:
+    """
+    Finds the files already archived on the backend with the same content, in the same folder.
+
+    The index entries are confirmed with a batched metadata read; entries whose file
+    is missing or has another size on the backend are forgotten.
+
+    Args:
+        files (List[Tuple[str, str, int, str]]): (relative path, target folder, size, sha256).
+
+    Returns:
+        Dict[str, str]: Server-relative URL of the archived copy, by relative path.
+    """
+    candidates = {}
+    for relative_path, target_folder, size, sha256 in files:
+        server_url = index.find(target_folder, size, sha256)
+        if server_url is not None:
+            candidates[relative_path] = (server_url, size)
+    if not candidates:
+        return {}
+
+    archived, stale = {}, []
+    metadata = read_files_metadata(backend, [server_url for server_url, size in candidates.values()])
+    for (relative_path, (server_url, size)), server_file in zip(candidates.items(), metadata):
+        if server_file is not None and server_file["Length"] == size:
+            archived[relative_path] = server_url
+        else:
+            stale.append(server_url)
+    if stale:
+        logger.info(f"{len(stale)} fichier(s) de l'index absents ou modifiés sur '{backend.name}': ils seront renvoyés.")
+        index.forget(stale)
+    return archived
+
+def list_local_files(local_directory: str) -> List[tuple]:
+    """
+    Lists the files of a local upload directory as (relative path, size) pairs.
+    """
+    return [
+        (os.path.relpath(os.path.join(root, filename), local_directory).replace("\\", "/"),
+         os.path.getsize(os.path.join(root, filename)))
+        for root, dirs, files in os.walk(local_directory)
+        for filename in files
+        if os.path.join(root, filename) != os.path.join(local_directory, DOSSIER_METADATA_FILE)
+    ]
+
+def upload_bundle(
+    backend: StorageBackend,
+    target_folder: str,
+    bundle: List[tuple],
+    progress: JobProgress,
+    names: Tuple[str, str],
+    index: Optional[ParticipantIndex] = None
+) -> List[dict]:
+    """
+    Uploads the bundled small files as one ZIP archive, streamed while it is built, plus its index.
+
+    The archive and index names are specific to the submission (see `bundle_names`),
+    so the archive of a previous submission is never overwritten. With a participant
+    index, the archive name is also reserved before the upload.
+
+    Returns:
+        List[dict]: The uploaded archive and index, for verification.
+
+    Raises:
+        Exception: If the backend refuses the archive or its index.
+    """
+    def _on_attempt(attempt):
+        for relative_path, path, size in bundle:
+            progress.add_attempt(relative_path)
+
+    for relative_path, path, size in bundle:
+        progress.set_file_state(relative_path, FILE_UPLOADING)
+    bundle_name, bundle_index_name = names
+    if index is not None:
+        reserved_name = index.reserve_name(target_folder, bundle_name)
+        if reserved_name != bundle_name:
+            # Nom déjà pris (archive envoyée avant cet index) : l'index suit le nom de l'archive
+            bundle_index_name = os.path.splitext(reserved_name)[0] + os.path.splitext(bundle_index_name)[1]
+            bundle_name = reserved_name
+    try:
+        bundle_index = build_index(bundle, bundle_name)
+        uploaded = [
+            backend.put_content(target_folder, bundle_name, lambda: iter_zip(bundle), on_attempt=_on_attempt),
+            backend.put_content(target_folder, bundle_index_name, lambda: bundle_index)
+        ]
+    except Exception:
+        for relative_path, path, size in bundle:
+            progress.set_file_state(relative_path, FILE_FAILED)
+        raise
+    for relative_path, path, size in bundle:
+        progress.set_file_state(relative_path, FILE_UPLOADED, bytes_sent=size)
+    logger.info(f"{len(bundle)} petits fichiers uploadés dans l'archive '{bundle_name}' sur '{backend.name}' dans '{target_folder}'.")
+    return uploaded
 
 def construct_sharepoint_link(sharepoint_folder_relative_path: str) -> str:
     """
     Constructs the full SharePoint URL for a given relative folder path.
 
+    Kept for callers of the former helper: the link now comes from
+    `SharePointBackend.folder_link`, like the link of any other backend.
+
     Args:
         sharepoint_folder_relative_path (str): The server-relative URL of the SharePoint folder.
 
     Returns:
         str: The full URL to access the SharePoint folder.
     """
-    # Ensure there's no leading slash to prevent double slashes in URL
-    if sharepoint_folder_relative_path.startswith("/"):
-        sharepoint_folder_relative_path = sharepoint_folder_relative_path[1:]
-    
-    # Construct the full URL
-    sharepoint_link = f"{SITE_URL}/{sharepoint_folder_relative_path}"
-    return sharepoint_link
+    return SharePointBackend().folder_link(sharepoint_folder_relative_path)
 
 def envoyer_notifications_success(user_email: str, user_name: str, sharepoint_link: str):
     """
@@ -159,8 +433,10 @@ def envoyer_notifications_success(user_email: str, user_name: str, sharepoint_li
                 recipients=[user_email]
             )
             logger.info(f"Email de confirmation envoyé à l'utilisateur: {user_email}")
+            record_event(EVENT_NOTIFICATION_SENT, user_email, detail=f"{template_user} -> {user_email}")
         except Exception as e:
             logger.error(f"Erreur lors de l'envoi de l'email de confirmation à {user_email}: {e}")
+            record_event(EVENT_NOTIFICATION_FAILED, user_email, detail=f"{template_user} -> {user_email}: {e}")
         
         try:
             # Envoyer à l'équipe de Régime Retraite
@@ -171,8 +447,10 @@ def envoyer_notifications_success(user_email: str, user_name: str, sharepoint_li
                 recipients=[regime_email]
             )
             logger.info(f"Email informatif envoyé à l'équipe de Régime Retraite: {regime_email}")
+            record_event(EVENT_NOTIFICATION_SENT, user_email, detail=f"{template_regime} -> {regime_email}")
         except Exception as e:
             logger.error(f"Erreur lors de l'envoi de l'email informatif à {regime_email}: {e}")
+            record_event(EVENT_NOTIFICATION_FAILED, user_email, detail=f"{template_regime} -> {regime_email}: {e}")
     else:
         logger.warning("REGIME_RETRAITE_EMAIL n'est pas défini dans les variables d'environnement.")
 
@@ -209,7 +487,9 @@ def envoyer_notifications_failure(error: Exception, user_email: str):
                 recipients=support_emails
             )
             logger.info(f"Email de notification d'échec envoyé à: {support_emails}")
+            record_event(EVENT_NOTIFICATION_SENT, user_email, detail=f"{template_support} -> {', '.join(support_emails)}")
         except Exception as e:
             logger.error(f"Erreur lors de l'envoi de l'email de notification d'échec à {support_emails}: {e}")
+            record_event(EVENT_NOTIFICATION_FAILED, user_email, detail=f"{template_support} -> {', '.join(support_emails)}: {e}")
     else:
         logger.warning("SUPPORT_EMAILS n'est pas défini correctement dans les variables d'environnement.")
@@ -1,11 +1,48 @@
 # File: sharepoint_connector/sharepoint_utils.py
 
+import json
 import os
+import re
 import requests
 import time
-from sharepoint_connector.config import RETRY_COUNT, RETRY_DELAY
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+from urllib.parse import quote, unquote, urlparse
+from requests.adapters import HTTPAdapter
+from sharepoint_connector.config import RETRY_COUNT, RETRY_DELAY, HTTP_POOL_SIZE, UPLOAD_CHUNK_SIZE_MB, DOWNLOAD_TIMEOUT
 from app.utils import logger
 
+# Pool de connexions partagé par tous les appels SharePoint (et les téléchargements de upload_file_from_url)
+http_session = requests.Session()
+http_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE))
+http_session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE))
+
+def with_retries(description, action, on_attempt=None):
+    """
+    Runs `action` with the connector's retry policy (RETRY_COUNT retries, RETRY_DELAY seconds apart).
+    """
+    for attempt in range(RETRY_COUNT + 1):
+        if on_attempt is not None:
+            on_attempt(attempt + 1)
+        try:
+            return action()
+        except (requests.exceptions.RequestException, IOError) as e:
+            if attempt < RETRY_COUNT:
+                logger.warning(
+                    f"Attempt {attempt+1}/{RETRY_COUNT+1} failed to {description}. "
+                    f"Retrying in {RETRY_DELAY}s. Error: {str(e)}"
+                )
+                time.sleep(RETRY_DELAY)
+            else:
+                logger.error(f"All attempts failed to {description}")
+                raise
+
+def _post(url, headers, **kwargs):
+    response = http_session.post(url, headers=headers, **kwargs)
+    response.raise_for_status()
+    return response
+
 def create_folder(site_url, target_folder_relative_url, headers, form_digest_value):
     post_headers = headers.copy()
     post_headers.update({
@@ -18,64 +55,221 @@ def create_folder(site_url, target_folder_relative_url, headers, form_digest_val
         "ServerRelativeUrl": target_folder_relative_url
     }
 
-    for attempt in range(RETRY_COUNT + 1):
-        try:
-            response = requests.post(folder_endpoint, headers=post_headers, json=payload)
-            response.raise_for_status()
-            return response
-        except requests.exceptions.RequestException as e:
-            if attempt < RETRY_COUNT:
-                logger.warning(
-                    f"Attempt {attempt+1}/{RETRY_COUNT+1} failed to create folder {target_folder_relative_url}. "
-                    f"Retrying in {RETRY_DELAY}s. Error: {str(e)}"
-                )
-                time.sleep(RETRY_DELAY)
-            else:
-                logger.error(f"All attempts failed to create folder {target_folder_relative_url}")
-                raise
+    return with_retries(
+        f"create folder {target_folder_relative_url}",
+        lambda: _post(folder_endpoint, post_headers, json=payload)
+    )
+
+def upload_file_local(site_url, target_folder_relative_url, local_file_path, headers, form_digest_value, on_attempt=None, filename=None):
+    """
+    Uploads a local file, under its own name or under `filename`.
+    """
+    def _read_file():
+        with open(local_file_path, "rb") as f:
+            return f.read()
+
+    return upload_file_content(
+        site_url, target_folder_relative_url, filename or os.path.basename(local_file_path), _read_file,
+        headers, form_digest_value, on_attempt=on_attempt
+    )
 
-def upload_file_local(site_url, target_folder_relative_url, local_file_path, headers, form_digest_value):
+def upload_file_content(site_url, target_folder_relative_url, filename, content_factory, headers, form_digest_value, on_attempt=None):
+    """
+    Uploads a file whose body is produced by `content_factory` (bytes or an iterator of chunks).
+
+    The factory is called again for each attempt, so that a streamed body can be replayed.
+    """
     post_headers = headers.copy()
     post_headers.update({
         "Content-Type": "application/octet-stream",
         "X-RequestDigest": form_digest_value
     })
-    filename = os.path.basename(local_file_path)
     upload_endpoint = (
         f"{site_url}/_api/web/GetFolderByServerRelativeUrl('{target_folder_relative_url}')"
         f"/Files/add(url='{filename}',overwrite=true)"
     )
 
-    for attempt in range(RETRY_COUNT + 1):
-        try:
-            with open(local_file_path, "rb") as f:
-                file_content = f.read()
-            response = requests.post(upload_endpoint, headers=post_headers, data=file_content)
-            response.raise_for_status()
-            return response
-        except (requests.exceptions.RequestException, IOError) as e:
-            if attempt < RETRY_COUNT:
-                logger.warning(
-                    f"Attempt {attempt+1}/{RETRY_COUNT+1} failed to upload {filename}. "
-                    f"Retrying in {RETRY_DELAY}s. Error: {str(e)}"
-                )
-                time.sleep(RETRY_DELAY)
-            else:
-                logger.error(f"All attempts failed to upload {filename}")
+    return with_retries(
+        f"upload {filename}",
+        lambda: _post(upload_endpoint, post_headers, data=content_factory()),
+        on_attempt=on_attempt
+    )
+
+def get_files_metadata(site_url, server_relative_urls, headers, form_digest_value):
+    """
+    Reads the Length and ETag of several files in a single OData $batch request.
+
+    Returns:
+        list: One dict ({"Length": int, "ETag": str}) per requested file, in order,
+        or None for a file SharePoint could not return (e.g. 404).
+    """
+    boundary = f"batch_{uuid.uuid4()}"
+    parts = []
+    for server_relative_url in server_relative_urls:
+        escaped_url = quote(server_relative_url.replace("'", "''"), safe="/")
+        parts.append(
+            f"--{boundary}\r\n"
+            "Content-Type: application/http\r\n"
+            "Content-Transfer-Encoding: binary\r\n\r\n"
+            f"GET {site_url}/_api/web/GetFileByServerRelativeUrl('{escaped_url}')?$select=Length,ETag HTTP/1.1\r\n"
+            "Accept: application/json;odata=verbose\r\n\r\n"
+        )
+    body = "".join(parts) + f"--{boundary}--\r\n"
+    post_headers = headers.copy()
+    post_headers.update({
+        "Content-Type": f"multipart/mixed; boundary={boundary}",
+        "X-RequestDigest": form_digest_value
+    })
+
+    response = with_retries(
+        "read files metadata",
+        lambda: _post(f"{site_url}/_api/$batch", post_headers, data=body.encode("utf-8"))
+    )
+
+    response_boundary = re.search(r"boundary=([^;\s]+)", response.headers.get("Content-Type", "")).group(1)
+    results = []
+    for part in response.text.split(f"--{response_boundary}")[1:]:
+        status_line = re.search(r"HTTP/1\.1 (\d{3})", part)
+        if status_line is None:
+            continue  # fin du multipart
+        if status_line.group(1) != "200":
+            results.append(None)
+            continue
+        payload = json.loads(part[part.index("{"):part.rindex("}") + 1])
+        metadata = payload.get("d", payload)
+        results.append({"Length": int(metadata["Length"]), "ETag": metadata.get("ETag")})
+    return results
+
+class _UrlSource:
+    """
+    Reads a remote file in fixed-size chunks, resuming with a Range request after a network error.
+    """
+
+    def __init__(self, file_url, chunk_size):
+        self.file_url = file_url
+        self.chunk_size = chunk_size
+        self.offset = 0
+        self._chunks = None
+
+    def _open(self):
+        range_headers = {"Range": f"bytes={self.offset}-"} if self.offset else {}
+        response = http_session.get(self.file_url, headers=range_headers, stream=True, timeout=DOWNLOAD_TIMEOUT)
+        response.raise_for_status()
+        if self.offset and response.status_code != 206:
+            response.close()
+            raise IOError(f"Resume not supported by {self.file_url}")
+        self._chunks = self._iter_chunks(response)
+
+    def _iter_chunks(self, response):
+        with response:
+            buffer = bytearray()
+            for data in response.iter_content(chunk_size=64 * 1024):
+                buffer += data
+                while len(buffer) >= self.chunk_size:
+                    yield bytes(buffer[:self.chunk_size])
+                    del buffer[:self.chunk_size]
+            yield bytes(buffer)
+
+    def read_chunk(self):
+        """
+        Returns the next chunk: `chunk_size` bytes, fewer for the last one, b"" at the end.
+        """
+        def _read():
+            try:
+                if self._chunks is None:
+                    self._open()
+                return next(self._chunks, b"")
+            except Exception:
+                self._chunks = None  # rouvert à self.offset à la prochaine tentative
                 raise
-def upload_file_from_url(site_url, target_folder_relative_url, file_url, headers, form_digest_value):
+
+        chunk = with_retries(f"download {self.file_url}", _read)
+        self.offset += len(chunk)
+        return chunk
+
+def upload_file_from_url(site_url, target_folder_relative_url, file_url, headers, form_digest_value, chunk_size=None):
+    """
+    Streams a remote file to SharePoint with bounded memory (see `upload_file_chunks`).
+
+    Returns:
+        requests.Response: The response to the last SharePoint request.
+    """
+    chunk_size = chunk_size or UPLOAD_CHUNK_SIZE_MB * 1024 * 1024
+    filename = unquote(os.path.basename(urlparse(file_url).path))
+    source = _UrlSource(file_url, chunk_size)
+    return upload_file_chunks(
+        site_url, target_folder_relative_url, filename, source.read_chunk, headers, form_digest_value, chunk_size
+    )
+
+def upload_file_chunks(site_url, target_folder_relative_url, filename, read_chunk, headers, form_digest_value, chunk_size=None, on_attempt=None):
+    """
+    Uploads a file read chunk by chunk, holding at most two chunks in memory.
+
+    `read_chunk` returns the next `chunk_size` bytes (fewer for the last chunk, b"" at the end).
+    Files that fit in one chunk are sent with a single `Files/add`. Larger files use
+    an upload session (StartUpload / ContinueUpload / FinishUpload), one chunk per request.
+    Every request follows the connector's retry policy.
+
+    Returns:
+        requests.Response: The response to the last SharePoint request.
+    """
+    chunk_size = chunk_size or UPLOAD_CHUNK_SIZE_MB * 1024 * 1024
+    chunk = read_chunk()
+    next_chunk = read_chunk() if len(chunk) == chunk_size else b""
+    if not next_chunk:
+        return upload_file_content(
+            site_url, target_folder_relative_url, filename, lambda: chunk, headers, form_digest_value, on_attempt=on_attempt
+        )
+
+    # Le fichier est créé vide, puis rempli morceau par morceau
+    upload_file_content(
+        site_url, target_folder_relative_url, filename, lambda: b"", headers, form_digest_value, on_attempt=on_attempt
+    )
     post_headers = headers.copy()
     post_headers.update({
         "Content-Type": "application/octet-stream",
         "X-RequestDigest": form_digest_value
     })
-    filename = os.path.basename(file_url)
-    upload_endpoint = (
-        f"{site_url}/_api/web/GetFolderByServerRelativeUrl('{target_folder_relative_url}')"
-        f"/Files/add(url='{filename}',overwrite=true)"
-    )
-    file_response = requests.get(file_url)
-    file_response.raise_for_status()
-    file_content = file_response.content
-    response = requests.post(upload_endpoint, headers=post_headers, data=file_content)
-    return response
+    server_relative_url = f"{target_folder_relative_url.rstrip('/')}/{filename}".replace("'", "''")
+    file_endpoint = f"{site_url}/_api/web/GetFileByServerRelativeUrl('{server_relative_url}')"
+    upload_id = uuid.uuid4()
+    offset = 0
+    method = f"StartUpload(uploadId=guid'{upload_id}')"
+    try:
+        while next_chunk:
+            data = chunk
+            with_retries(f"upload {filename} at offset {offset}", lambda: _post(f"{file_endpoint}/{method}", post_headers, data=data))
+            offset += len(chunk)
+            chunk, next_chunk = next_chunk, read_chunk() if len(next_chunk) == chunk_size else b""
+            method = f"ContinueUpload(uploadId=guid'{upload_id}',fileOffset={offset})"
+        return with_retries(
+            f"finish upload of {filename}",
+            lambda: _post(f"{file_endpoint}/FinishUpload(uploadId=guid'{upload_id}',fileOffset={offset})", post_headers, data=chunk)
+        )
+    except Exception:
+        try:
+            http_session.post(f"{file_endpoint}/CancelUpload(uploadId=guid'{upload_id}')", headers=post_headers)
+        except requests.exceptions.RequestException:
+            pass
+        raise
+
+def upload_files_from_urls(site_url, target_folder_relative_url, file_urls, headers, form_digest_value, max_workers=4) -> Dict:
+    """
+    Transfers several remote files concurrently (see `upload_file_from_url`).
+
+    Returns:
+        Dict: For each URL, the SharePoint response or the exception that stopped its transfer.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="url-upload") as pool:
+        futures = {
+            file_url: pool.submit(upload_file_from_url, site_url, target_folder_relative_url, file_url, headers, form_digest_value)
+            for file_url in file_urls
+        }
+    results = {}
+    for file_url, future in futures.items():
+        try:
+            results[file_url] = future.result()
+        except Exception as e:
+            logger.error(f"Transfert de {file_url} vers SharePoint échoué: {e}")
+            results[file_url] = e
+    return results
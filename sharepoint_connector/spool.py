@@ -0,0 +1,267 @@
+# File: sharepoint_connector/spool.py
+
+import os
+import shutil
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from sharepoint_connector.config import (
+    SPOOL_QUOTA_MB, SPOOL_MAX_AGE_DAYS, SPOOL_GC_INTERVAL, SPOOL_GC_BATCH_SIZE
+)
+from sharepoint_connector.job_lock import is_directory_locked
+from sharepoint_connector.job_queue import _connect, STATUS_PENDING, STATUS_RUNNING
+from app.utils import get_user_email, logger
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS spool_dossiers (
+    upload_dir TEXT PRIMARY KEY,
+    email TEXT,
+    bytes INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    uploaded_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_spool_dossiers_uploaded ON spool_dossiers (uploaded_at, created_at);
+CREATE TABLE IF NOT EXISTS spool_files (
+    upload_dir TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    PRIMARY KEY (upload_dir, path)
+);
+"""
+
+
+def init_spool(db_path: Optional[str] = None) -> None:
+    """
+    Crée l'index du spool local (dossiers présents dans UPLOAD_DIRECTORY).
+    """
+    with _connect(db_path) as conn:
+        conn.executescript(SCHEMA)
+
+
+def directory_size(path: str) -> int:
+    """
+    Calcule la taille totale (en octets) des fichiers d'un répertoire.
+    """
+    total = 0
+    for root, _, files in os.walk(path):
+        for filename in files:
+            try:
+                total += os.path.getsize(os.path.join(root, filename))
+            except OSError:
+                pass
+    return total
+
+
+def register_dossier(
+    upload_dir: str,
+    email: Optional[str],
+    size: int,
+    files: Optional[List[Tuple[str, int, str]]] = None,
+    db_path: Optional[str] = None
+) -> None:
+    """
+    Enregistre (ou met à jour) un dossier et sa taille dans l'index du spool.
+
+    Args:
+        files (List[Tuple[str, int, str]], optional): (chemin relatif, taille, sha256) des
+            fichiers calculés à la réception, vérifiés après l'upload (voir integrity.py).
+    """
+    with _connect(db_path) as conn:
+        conn.execute(
+            "INSERT INTO spool_dossiers (upload_dir, email, bytes, created_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (upload_dir) DO UPDATE SET bytes = excluded.bytes",
+            (os.path.normpath(upload_dir), email, size, time.time())
+        )
+    for path, file_size, sha256 in files or []:
+        record_file_digest(upload_dir, path, file_size, sha256, db_path=db_path)
+
+
+def record_file_digest(upload_dir: str, path: str, size: int, sha256: str, db_path: Optional[str] = None) -> None:
+    """
+    Enregistre (ou remplace) la taille et l'empreinte d'un fichier d'un dossier du spool.
+    """
+    with _connect(db_path) as conn:
+        conn.execute(
+            "INSERT INTO spool_files (upload_dir, path, size, sha256) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (upload_dir, path) DO UPDATE SET size = excluded.size, sha256 = excluded.sha256",
+            (os.path.normpath(upload_dir), path, size, sha256)
+        )
+
+
+def get_file_digests(upload_dir: str, db_path: Optional[str] = None) -> Dict[str, Tuple[int, str]]:
+    """
+    Retourne la taille et l'empreinte enregistrées de chaque fichier d'un dossier, par chemin relatif.
+    """
+    with _connect(db_path) as conn:
+        rows = conn.execute(
+            "SELECT path, size, sha256 FROM spool_files WHERE upload_dir = ?",
+            (os.path.normpath(upload_dir),)
+        ).fetchall()
+    return {row["path"]: (row["size"], row["sha256"]) for row in rows}
+
+
+def mark_dossier_uploaded(upload_dir: str, db_path: Optional[str] = None) -> None:
+    """
+    Marque un dossier comme confirmé sur SharePoint : il peut être supprimé localement.
+    """
+    with _connect(db_path) as conn:
+        conn.execute(
+            "UPDATE spool_dossiers SET uploaded_at = ? WHERE upload_dir = ?",
+            (time.time(), os.path.normpath(upload_dir))
+        )
+
+
+def forget_dossier(upload_dir: str, db_path: Optional[str] = None) -> None:
+    """
+    Retire un dossier supprimé de l'index du spool.
+    """
+    with _connect(db_path) as conn:
+        conn.execute("DELETE FROM spool_dossiers WHERE upload_dir = ?", (os.path.normpath(upload_dir),))
+        conn.execute("DELETE FROM spool_files WHERE upload_dir = ?", (os.path.normpath(upload_dir),))
+
+
+def list_pending_dossiers(db_path: Optional[str] = None) -> List[Dict]:
+    """
+    Retourne les dossiers du spool qui n'ont pas encore été confirmés sur SharePoint.
+    """
+    with _connect(db_path) as conn:
+        rows = conn.execute(
+            "SELECT upload_dir, email, bytes, created_at FROM spool_dossiers "
+            "WHERE uploaded_at IS NULL ORDER BY created_at"
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def spool_bytes(db_path: Optional[str] = None) -> int:
+    """
+    Retourne le volume total (en octets) occupé par le spool.
+    """
+    with _connect(db_path) as conn:
+        return conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM spool_dossiers").fetchone()[0]
+
+
+def spool_usage(upload_directory: str, db_path: Optional[str] = None) -> Dict:
+    """
+    Résume l'occupation du spool : nombre de dossiers, octets, quota et disque libre.
+    """
+    with _connect(db_path) as conn:
+        row = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(bytes), 0), COUNT(uploaded_at), MIN(created_at) FROM spool_dossiers"
+        ).fetchone()
+    quota = SPOOL_QUOTA_MB * 1024 * 1024
+    usage = {
+        "dossiers": row[0],
+        "bytes": row[1],
+        "uploaded_awaiting_removal": row[2],
+        "oldest_dossier_age_seconds": round(time.time() - row[3], 1) if row[3] else 0.0,
+        "quota_bytes": quota or None,
+        "quota_used_ratio": round(row[1] / quota, 4) if quota else None,
+    }
+    if os.path.isdir(upload_directory):
+        usage["free_disk_bytes"] = shutil.disk_usage(upload_directory).free
+    return usage
+
+
+def reconcile_spool(upload_directory: str, db_path: Optional[str] = None) -> int:
+    """
+    Ajoute à l'index les dossiers présents sur disque mais inconnus (créés avant
+    l'introduction de l'index, ou par une autre instance), et retire ceux qui
+    n'existent plus.
+
+    Returns:
+        int: Nombre de dossiers ajoutés.
+    """
+    if not os.path.isdir(upload_directory):
+        return 0
+    with _connect(db_path) as conn:
+        known = {row[0] for row in conn.execute("SELECT upload_dir FROM spool_dossiers")}
+
+    added = 0
+    on_disk = set()
+    for entry in os.scandir(upload_directory):
+        if not entry.is_dir():
+            continue
+        path = os.path.normpath(entry.path)
+        on_disk.add(path)
+        if path in known:
+            continue
+        register_dossier(path, get_user_email(path), directory_size(path), db_path=db_path)
+        added += 1
+
+    for path in known - on_disk:
+        if os.path.normpath(os.path.dirname(path)) == os.path.normpath(upload_directory):
+            forget_dossier(path, db_path=db_path)
+
+    if added:
+        logger.info(f"{added} dossier(s) existant(s) ajouté(s) à l'index du spool.")
+    return added
+
+
+def collect_garbage(batch_size: int = SPOOL_GC_BATCH_SIZE, db_path: Optional[str] = None) -> int:
+    """
+    Supprime un lot de dossiers confirmés sur SharePoint ou expirés.
+
+    Les dossiers en cours d'upload (bail actif) ou dont un job d'upload est en
+    attente ou en cours sont ignorés. Un dossier expiré n'a jamais atteint
+    SharePoint : l'expiration est désactivée par défaut (SPOOL_MAX_AGE_DAYS=0) et
+    chaque suppression est journalisée en warning.
+
+    Returns:
+        int: Nombre de dossiers supprimés.
+    """
+    expired_before = time.time() - SPOOL_MAX_AGE_DAYS * 86400 if SPOOL_MAX_AGE_DAYS else 0
+    with _connect(db_path) as conn:
+        rows = conn.execute(
+            "SELECT upload_dir, email, bytes, uploaded_at FROM spool_dossiers "
+            "WHERE (uploaded_at IS NOT NULL OR created_at < ?) AND NOT EXISTS ("
+            "SELECT 1 FROM upload_jobs WHERE upload_jobs.upload_dir = spool_dossiers.upload_dir AND status IN (?, ?)"
+            ") ORDER BY created_at LIMIT ?",
+            (expired_before, STATUS_PENDING, STATUS_RUNNING, batch_size)
+        ).fetchall()
+
+    removed = 0
+    for row in rows:
+        upload_dir = row["upload_dir"]
+        if is_directory_locked(upload_dir):
+            continue
+        if row["uploaded_at"] is None:
+            logger.warning(f"Dossier expiré jamais uploadé supprimé du spool: {upload_dir} ({row['email']}).")
+        try:
+            if os.path.isdir(upload_dir):
+                shutil.rmtree(upload_dir)
+        except OSError as e:
+            logger.error(f"Erreur lors de la suppression du dossier '{upload_dir}' du spool: {e}")
+            continue
+        forget_dossier(upload_dir, db_path=db_path)
+        removed += 1
+        logger.info(f"Dossier '{upload_dir}' supprimé du spool ({row['bytes']} octets libérés).")
+    return removed
+
+
+def start_spool_gc(upload_directory: str, interval: int = SPOOL_GC_INTERVAL) -> threading.Event:
+    """
+    Démarre le ramasse-miettes du spool dans un thread : réconciliation initiale,
+    puis un lot de suppressions toutes les `interval` secondes.
+
+    Returns:
+        threading.Event: Événement à positionner pour arrêter le thread.
+    """
+    stop_event = threading.Event()
+
+    def _run():
+        try:
+            reconcile_spool(upload_directory)
+        except Exception as e:
+            logger.error(f"Erreur lors de la réconciliation du spool: {e}")
+        while not stop_event.is_set():
+            try:
+                # On enchaîne les lots tant qu'il reste des dossiers à supprimer
+                while collect_garbage() and not stop_event.is_set():
+                    pass
+            except Exception as e:
+                logger.error(f"Erreur lors du nettoyage du spool: {e}")
+            stop_event.wait(interval)
+
+    threading.Thread(target=_run, name="spool-gc", daemon=True).start()
+    return stop_event
@@ -0,0 +1,286 @@
+# File: sharepoint_connector/storage.py
+
+"""
+Destinations d'archivage des dossiers uploadés.
+
+Un dossier peut être envoyé vers plusieurs destinations à la fois (STORAGE_BACKENDS,
+séparées par des virgules) :
+
+- "sharepoint" : la bibliothèque SharePoint du site (SITE_URL) ;
+- "local" : un répertoire local (LOCAL_STORAGE_DIRECTORY), qui reproduit
+  l'arborescence SharePoint. Il permet de faire tourner toute la chaîne sans
+  tenant SharePoint (recette, mesures de performance) ou d'en garder une copie.
+
+Toutes les destinations utilisent des chemins "serveur" de la forme
+/<TARGET_FOLDER_RELATIVE_URL>/<email>/<sous-dossier>/<fichier>.
+"""
+
+import os
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from sharepoint_connector.auth import get_sharepoint_context, invalidate_sharepoint_context
+from sharepoint_connector.config import SITE_URL, STORAGE_BACKENDS, LOCAL_STORAGE_DIRECTORY, UPLOAD_CHUNK_SIZE_MB
+from sharepoint_connector.integrity import response_etag
+from sharepoint_connector.sharepoint_utils import (
+    create_folder, upload_file_local, upload_file_content, upload_file_chunks, get_files_metadata
+)
+from app.utils import logger
+
+
+class StorageBackend(ABC):
+    """
+    Interface commune des destinations d'archivage. Une destination qui n'implémente
+    pas toutes les méthodes abstraites ne peut pas être instanciée.
+
+    Les fichiers envoyés sont décrits par un dict {"server_url", "size", "etag"},
+    relu ensuite par `get_files_metadata` pour la vérification (voir integrity.py).
+    """
+    name = "storage"
+
+    @property
+    def key(self) -> str:
+        """
+        Identifiant de la destination dans l'index des fichiers archivés (voir remote_index.py).
+        """
+        return self.name
+
+    @abstractmethod
+    def ensure_folder(self, folder: str) -> None:
+        """
+        Crée `folder` et ses dossiers parents s'ils n'existent pas.
+        """
+
+    @abstractmethod
+    def put_file(self, folder: str, local_path: str, on_attempt: Optional[Callable] = None, filename: Optional[str] = None) -> Dict:
+        """
+        Envoie un fichier local, par morceaux s'il est volumineux, sous son nom ou sous `filename`.
+        """
+
+    @abstractmethod
+    def put_content(self, folder: str, filename: str, content_factory: Callable, on_attempt: Optional[Callable] = None) -> Dict:
+        """
+        Envoie un contenu produit par `content_factory` (bytes ou itérateur de morceaux),
+        rappelée à chaque tentative.
+        """
+
+    @abstractmethod
+    def get_files_metadata(self, server_urls: List[str]) -> List[Optional[Dict]]:
+        """
+        Lit en une fois la taille et l'ETag de plusieurs fichiers envoyés.
+
+        Returns:
+            List[Optional[Dict]]: {"Length": int, "ETag": str} par fichier, ou None s'il est introuvable.
+        """
+
+    @abstractmethod
+    def folder_link(self, folder: str) -> str:
+        """
+        Retourne le lien à communiquer au participant pour `folder`.
+        """
+
+    def reset(self) -> None:
+        """
+        Oublie l'état partagé de la destination après une erreur.
+        """
+
+    @staticmethod
+    def _counting(content_factory: Callable, size: List[int]) -> Callable:
+        # Compte les octets réellement envoyés lors de la dernière tentative
+        def _factory():
+            size[0] = 0
+            content = content_factory()
+            if isinstance(content, bytes):
+                size[0] = len(content)
+                return content
+
+            def _chunks():
+                for chunk in content:
+                    size[0] += len(chunk)
+                    yield chunk
+            return _chunks()
+        return _factory
+
+
+class SharePointBackend(StorageBackend):
+    """
+    Bibliothèque SharePoint, avec le contexte d'authentification partagé du processus.
+    """
+    name = "sharepoint"
+
+    def __init__(self, site_url: str = SITE_URL, context=None, chunk_size: Optional[int] = None):
+        self.site_url = site_url
+        self._context = context
+        self.chunk_size = chunk_size or UPLOAD_CHUNK_SIZE_MB * 1024 * 1024
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}:{self.site_url}"
+
+    @property
+    def context(self):
+        if self._context is None:
+            self._context = get_sharepoint_context()
+        return self._context
+
+    def ensure_folder(self, folder: str) -> None:
+        """
+        Raises:
+            Exception: Si SharePoint refuse de créer le dossier.
+        """
+        context = self.context
+        if context.has_folder(folder):
+            return
+        create_resp = create_folder(self.site_url, folder, context.headers, context.form_digest)
+        if create_resp.ok:
+            logger.info(f"Dossier SharePoint '{folder}' créé ou déjà existant.")
+        elif "already exists" in create_resp.text.lower():
+            logger.info(f"Dossier SharePoint '{folder}' existe déjà.")
+        else:
+            logger.error(f"Erreur lors de la création du dossier SharePoint '{folder}': {create_resp.text}")
+            raise Exception(f"Erreur de création de dossier SharePoint: {create_resp.text}")
+        context.remember_folder(folder)
+
+    def put_file(self, folder: str, local_path: str, on_attempt: Optional[Callable] = None, filename: Optional[str] = None) -> Dict:
+        context = self.context
+        filename = filename or os.path.basename(local_path)
+        size = os.path.getsize(local_path)
+        if size <= self.chunk_size:
+            response = upload_file_local(
+                self.site_url, folder, local_path, context.headers, context.form_digest,
+                on_attempt=on_attempt, filename=filename
+            )
+        else:
+            # Session d'upload : le fichier n'est jamais chargé entièrement en mémoire
+            with open(local_path, "rb") as f:
+                response = upload_file_chunks(
+                    self.site_url, folder, filename, lambda: f.read(self.chunk_size),
+                    context.headers, context.form_digest, self.chunk_size, on_attempt=on_attempt
+                )
+        return self._uploaded(response, folder, filename, size)
+
+    def put_content(self, folder: str, filename: str, content_factory: Callable, on_attempt: Optional[Callable] = None) -> Dict:
+        context = self.context
+        size = [0]
+        response = upload_file_content(
+            self.site_url, folder, filename, self._counting(content_factory, size),
+            context.headers, context.form_digest, on_attempt=on_attempt
+        )
+        return self._uploaded(response, folder, filename, size[0])
+
+    def _uploaded(self, response, folder: str, filename: str, size: int) -> Dict:
+        if not response.ok:
+            logger.error(f"Erreur lors de l'upload du fichier '{filename}' sur SharePoint dans '{folder}': {response.text}")
+            raise Exception(f"Erreur d'upload de fichier SharePoint: {response.text}")
+        return {"server_url": f"{folder.rstrip('/')}/{filename}", "size": size, "etag": response_etag(response)}
+
+    def get_files_metadata(self, server_urls: List[str]) -> List[Optional[Dict]]:
+        context = self.context
+        return get_files_metadata(self.site_url, server_urls, context.headers, context.form_digest)
+
+    def folder_link(self, folder: str) -> str:
+        return f"{self.site_url}/{folder.lstrip('/')}"
+
+    def reset(self) -> None:
+        self._context = None
+        invalidate_sharepoint_context()
+
+
+class LocalDirectoryBackend(StorageBackend):
+    """
+    Répertoire local reproduisant l'arborescence SharePoint. L'ETag d'un fichier
+    est dérivé de sa taille et de sa date de modification.
+    """
+    name = "local"
+
+    def __init__(self, root: str = LOCAL_STORAGE_DIRECTORY):
+        self.root = os.path.abspath(root)
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}:{self.root}"
+
+    def _path(self, server_url: str) -> str:
+        path = os.path.normpath(os.path.join(self.root, *server_url.strip("/").split("/")))
+        if os.path.commonpath([self.root, path]) != self.root:
+            raise ValueError(f"Chemin hors du répertoire d'archivage: {server_url}")
+        return path
+
+    @staticmethod
+    def _etag(stat_result: os.stat_result) -> str:
+        return f"\"{stat_result.st_size}-{stat_result.st_mtime_ns}\""
+
+    def ensure_folder(self, folder: str) -> None:
+        os.makedirs(self._path(folder), exist_ok=True)
+
+    def put_file(self, folder: str, local_path: str, on_attempt: Optional[Callable] = None, filename: Optional[str] = None) -> Dict:
+        filename = filename or os.path.basename(local_path)
+
+        def _chunks():
+            with open(local_path, "rb") as f:
+                while True:
+                    chunk = f.read(1024 * 1024)
+                    if not chunk:
+                        return
+                    yield chunk
+        return self.put_content(folder, filename, _chunks, on_attempt=on_attempt)
+
+    def put_content(self, folder: str, filename: str, content_factory: Callable, on_attempt: Optional[Callable] = None) -> Dict:
+        if on_attempt is not None:
+            on_attempt(1)
+        server_url = f"{folder.rstrip('/')}/{filename}"
+        path = self._path(server_url)
+        temp_path = path + ".part"
+        try:
+            content = content_factory()
+            with open(temp_path, "wb") as f:
+                if isinstance(content, bytes):
+                    f.write(content)
+                else:
+                    for chunk in content:
+                        f.write(chunk)
+        except BaseException:
+            # Pas de fichier partiel laissé dans l'archive
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        os.replace(temp_path, path)
+        stat_result = os.stat(path)
+        return {"server_url": server_url, "size": stat_result.st_size, "etag": self._etag(stat_result)}
+
+    def get_files_metadata(self, server_urls: List[str]) -> List[Optional[Dict]]:
+        results = []
+        for server_url in server_urls:
+            try:
+                stat_result = os.stat(self._path(server_url))
+            except (OSError, ValueError):
+                results.append(None)
+                continue
+            results.append({"Length": stat_result.st_size, "ETag": self._etag(stat_result)})
+        return results
+
+    def folder_link(self, folder: str) -> str:
+        return Path(self._path(folder)).as_uri()
+
+
+BACKENDS = {
+    SharePointBackend.name: SharePointBackend,
+    LocalDirectoryBackend.name: LocalDirectoryBackend
+}
+
+
+def get_storage_backends(names: Optional[List[str]] = None) -> List[StorageBackend]:
+    """
+    Crée les destinations configurées (STORAGE_BACKENDS). La première est la
+    destination principale : son lien est envoyé dans les notifications.
+
+    Raises:
+        ValueError: Si une destination est inconnue ou si aucune n'est configurée.
+    """
+    names = names or STORAGE_BACKENDS
+    if not names:
+        raise ValueError("Aucune destination d'archivage configurée (STORAGE_BACKENDS).")
+    unknown = [name for name in names if name not in BACKENDS]
+    if unknown:
+        raise ValueError(f"Destination(s) d'archivage inconnue(s): {', '.join(unknown)}")
+    return [BACKENDS[name]() for name in names]
@@ -0,0 +1,222 @@
+# File: sharepoint_connector/webhooks.py
+
+import hashlib
+import hmac
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+import requests
+from sharepoint_connector.config import (
+    WEBHOOK_URLS, WEBHOOK_SECRET, WEBHOOK_MAX_ATTEMPTS, WEBHOOK_BATCH_SIZE, WEBHOOK_INTERVAL, WEBHOOK_TIMEOUT,
+    WEBHOOK_RETENTION_DAYS
+)
+from sharepoint_connector.job_queue import _connect, get_job_status, STATUS_SUCCEEDED
+from app.utils import logger
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS webhook_outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    event_id TEXT NOT NULL,
+    url TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    delivered_at REAL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_webhook_outbox_due ON webhook_outbox (delivered_at, next_attempt_at);
+"""
+
+SIGNATURE_HEADER = "X-Webhook-Signature"
+TIMESTAMP_HEADER = "X-Webhook-Timestamp"
+MAX_BACKOFF = 3600  # seconds
+PURGE_INTERVAL = 3600  # seconds
+
+
+def init_webhooks(db_path: Optional[str] = None) -> None:
+    """
+    Crée la table d'outbox des webhooks si elle n'existe pas.
+    """
+    with _connect(db_path) as conn:
+        conn.executescript(SCHEMA)
+
+
+def sign_payload(body: bytes, timestamp: str, secret: Optional[str] = None) -> str:
+    """
+    Signe un corps de webhook : HMAC-SHA256 de "<timestamp>.<corps>" avec le secret partagé.
+    """
+    secret = WEBHOOK_SECRET if secret is None else secret
+    digest = hmac.new(secret.encode(), timestamp.encode() + b"." + body, hashlib.sha256).hexdigest()
+    return f"sha256={digest}"
+
+
+def enqueue_job_webhook(job_id: str, urls: Optional[List[str]] = None, db_path: Optional[str] = None) -> int:
+    """
+    Ajoute dans l'outbox l'événement de fin d'un job (succès ou échec), pour chaque URL configurée.
+
+    Returns:
+        int: Nombre d'envois programmés.
+    """
+    job = get_job_status(job_id, db_path=db_path)
+    if job is None:
+        return 0
+    with _connect(db_path) as conn:
+        return add_job_webhooks(conn, job, urls)
+
+
+def add_job_webhooks(conn: sqlite3.Connection, job: Dict, urls: Optional[List[str]] = None) -> int:
+    """
+    Ajoute l'événement de fin du job `job` (voir `get_job_status`) à l'outbox, sur la
+    connexion `conn` : à passer comme `on_complete` de `complete_job` pour que la
+    fin du job et ses webhooks soient enregistrés dans la même transaction.
+
+    Returns:
+        int: Nombre d'envois programmés.
+    """
+    urls = WEBHOOK_URLS if urls is None else urls
+    if not urls:
+        return 0
+
+    event = {
+        "id": uuid.uuid4().hex,
+        "type": "upload.succeeded" if job["status"] == STATUS_SUCCEEDED else "upload.failed",
+        "job_id": job["id"],
+        "reference": job["reference"],
+        "email": job["email"],
+        "kind": job["kind"],
+        "sharepoint_link": job["sharepoint_link"],
+        "error": job["error"],
+        "files_uploaded": job["files_uploaded"],
+        "finished_at": job["finished_at"]
+    }
+    now = time.time()
+    conn.executemany(
+        "INSERT INTO webhook_outbox (event_id, url, payload, created_at, next_attempt_at) VALUES (?, ?, ?, ?, ?)",
+        [(event["id"], url, json.dumps(event, ensure_ascii=False), now, now) for url in urls]
+    )
+    logger.info(f"Webhook '{event['type']}' programmé pour le job {job['id']} ({len(urls)} destinataire(s)).")
+    return len(urls)
+
+
+def purge_webhook_outbox(retention_days: float = WEBHOOK_RETENTION_DAYS, db_path: Optional[str] = None) -> int:
+    """
+    Supprime de l'outbox les événements livrés ou abandonnés (WEBHOOK_MAX_ATTEMPTS
+    atteint) depuis plus de `retention_days` jours. 0 = conservation illimitée.
+
+    Returns:
+        int: Nombre d'envois supprimés.
+    """
+    if retention_days <= 0:
+        return 0
+    cutoff = time.time() - retention_days * 86400
+    with _connect(db_path) as conn:
+        deleted = conn.execute(
+            "DELETE FROM webhook_outbox WHERE delivered_at < ? "
+            "OR (delivered_at IS NULL AND attempts >= ? AND next_attempt_at < ?)",
+            (cutoff, WEBHOOK_MAX_ATTEMPTS, cutoff)
+        ).rowcount
+    if deleted:
+        logger.info(f"{deleted} webhook(s) livré(s) ou abandonné(s) supprimé(s) de l'outbox.")
+    return deleted
+
+
+def _claim_due_events(batch_size: int, db_path: Optional[str]) -> List[Dict]:
+    # Les événements réservés sont repoussés le temps de l'envoi, pour qu'un autre
+    # processus ne les envoie pas en double.
+    now = time.time()
+    with _connect(db_path) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = [dict(row) for row in conn.execute(
+                "SELECT id, event_id, url, payload, attempts FROM webhook_outbox "
+                "WHERE delivered_at IS NULL AND attempts < ? AND next_attempt_at <= ? "
+                "ORDER BY next_attempt_at LIMIT ?",
+                (WEBHOOK_MAX_ATTEMPTS, now, batch_size)
+            )]
+            conn.executemany(
+                "UPDATE webhook_outbox SET next_attempt_at = ? WHERE id = ?",
+                [(now + WEBHOOK_TIMEOUT * 3, row["id"]) for row in rows]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    return rows
+
+
+def deliver_pending_webhooks(batch_size: int = WEBHOOK_BATCH_SIZE, db_path: Optional[str] = None) -> int:
+    """
+    Envoie les événements dus de l'outbox, regroupés en une requête par URL.
+
+    Chaque requête porte un corps {"events": [...]} signé (voir `sign_payload`).
+    En cas d'échec, l'envoi est reprogrammé avec un délai exponentiel.
+
+    Returns:
+        int: Nombre d'événements livrés.
+    """
+    rows = _claim_due_events(batch_size, db_path)
+    by_url: Dict[str, List[Dict]] = {}
+    for row in rows:
+        by_url.setdefault(row["url"], []).append(row)
+
+    delivered = 0
+    for url, url_rows in by_url.items():
+        body = json.dumps({"events": [json.loads(row["payload"]) for row in url_rows]}, ensure_ascii=False).encode("utf-8")
+        timestamp = str(int(time.time()))
+        headers = {"Content-Type": "application/json", TIMESTAMP_HEADER: timestamp}
+        if WEBHOOK_SECRET:
+            headers[SIGNATURE_HEADER] = sign_payload(body, timestamp)
+        try:
+            response = requests.post(url, data=body, headers=headers, timeout=WEBHOOK_TIMEOUT)
+            response.raise_for_status()
+            error = None
+        except requests.exceptions.RequestException as e:
+            error = str(e)
+
+        now = time.time()
+        with _connect(db_path) as conn:
+            if error is None:
+                conn.executemany(
+                    "UPDATE webhook_outbox SET delivered_at = ?, attempts = attempts + 1, last_error = NULL WHERE id = ?",
+                    [(now, row["id"]) for row in url_rows]
+                )
+                delivered += len(url_rows)
+                logger.info(f"{len(url_rows)} webhook(s) livré(s) à {url}.")
+            else:
+                conn.executemany(
+                    "UPDATE webhook_outbox SET attempts = attempts + 1, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                    [(now + min(MAX_BACKOFF, 2 ** row["attempts"] * WEBHOOK_INTERVAL), error, row["id"]) for row in url_rows]
+                )
+                logger.warning(f"Échec de l'envoi de {len(url_rows)} webhook(s) à {url}: {error}")
+    return delivered
+
+
+def start_webhook_dispatcher(interval: float = WEBHOOK_INTERVAL) -> threading.Event:
+    """
+    Démarre l'envoi périodique des webhooks de l'outbox dans un thread.
+
+    Returns:
+        threading.Event: Événement à positionner pour arrêter le thread.
+    """
+    stop_event = threading.Event()
+
+    def _run():
+        last_purge = 0.0
+        while not stop_event.is_set():
+            try:
+                # On vide l'outbox par lots tant qu'il reste des événements dus
+                while deliver_pending_webhooks() and not stop_event.is_set():
+                    pass
+                if time.time() - last_purge > PURGE_INTERVAL:
+                    purge_webhook_outbox()
+                    last_purge = time.time()
+            except Exception as e:
+                logger.error(f"Erreur lors de l'envoi des webhooks: {e}")
+            stop_event.wait(interval)
+
+    threading.Thread(target=_run, name="webhook-dispatcher", daemon=True).start()
+    return stop_event
@@ -0,0 +1,145 @@
+# File: sharepoint_connector/worker.py
+
+"""
+Worker d'upload SharePoint autonome.
+
+Consomme la file d'attente des jobs d'upload (voir job_queue.py) indépendamment
+du serveur API. Usage :
+
+    python -m sharepoint_connector.worker --processes 4 --threads 8
+"""
+
+import argparse
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+from sharepoint_connector.config import (
+    WORKER_PROCESSES, WORKER_THREADS, WORKER_POLL_INTERVAL, UPLOAD_LEASE_TTL
+)
+from sharepoint_connector.job_queue import init_job_queue, claim_next_job, complete_job, requeue_stale_jobs
+from sharepoint_connector.remote_index import init_remote_index
+from sharepoint_connector.sharepoint_uploader import upload_files_to_sharepoint
+from sharepoint_connector.webhooks import init_webhooks, add_job_webhooks
+from app.utils import logger, configure_logging
+
+
+def run_job(job: Dict) -> None:
+    """
+    Exécute un job d'upload et enregistre son résultat dans la file.
+    """
+    logger.info(f"Début du job {job['id']} pour le dossier {job['upload_dir']}.")
+    try:
+        success = upload_files_to_sharepoint(job["upload_dir"], job["email"], job_id=job["id"])
+    except Exception as e:
+        logger.error(f"Erreur inattendue dans le job {job['id']}: {e}")
+        success = False
+    # Les webhooks de fin sont ajoutés à l'outbox dans la transaction qui termine le job
+    complete_job(job["id"], success, on_complete=add_job_webhooks)
+
+
+def run_dispatcher(threads: int, poll_interval: float, stop_event: threading.Event) -> None:
+    """
+    Boucle de consommation de la file : réserve des jobs tant qu'un thread est libre.
+
+    Args:
+        threads (int): Nombre d'uploads simultanés dans ce processus.
+        poll_interval (float): Délai d'attente lorsque la file est vide.
+        stop_event (threading.Event): Arrête la boucle lorsqu'il est positionné.
+    """
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    slots = threading.BoundedSemaphore(threads)
+    last_requeue = 0.0
+
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="upload") as pool:
+        while not stop_event.is_set():
+            if not slots.acquire(timeout=poll_interval):
+                continue
+
+            try:
+                if time.time() - last_requeue > UPLOAD_LEASE_TTL:
+                    requeue_stale_jobs()
+                    last_requeue = time.time()
+                job = claim_next_job(worker_id)
+            except Exception as e:
+                logger.error(f"Erreur lors de la lecture de la file d'attente: {e}")
+                job = None
+
+            if job is None:
+                slots.release()
+                stop_event.wait(poll_interval)
+                continue
+
+            future = pool.submit(run_job, job)
+            future.add_done_callback(lambda _: slots.release())
+
+
+def start_embedded_dispatcher(threads: int = WORKER_THREADS, poll_interval: float = WORKER_POLL_INTERVAL) -> threading.Event:
+    """
+    Démarre un dispatcher dans un thread du processus courant (mode 'embedded' de l'API).
+
+    Returns:
+        threading.Event: Événement à positionner pour arrêter le dispatcher.
+    """
+    stop_event = threading.Event()
+    thread = threading.Thread(
+        target=run_dispatcher,
+        args=(threads, poll_interval, stop_event),
+        name="upload-dispatcher",
+        daemon=True
+    )
+    thread.start()
+    logger.info(f"Dispatcher d'upload intégré démarré ({threads} threads).")
+    return stop_event
+
+
+def _process_main(threads: int, poll_interval: float) -> None:
+    configure_logging()
+    stop_event = threading.Event()
+    try:
+        run_dispatcher(threads, poll_interval, stop_event)
+    except KeyboardInterrupt:
+        stop_event.set()
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="Worker d'upload SharePoint.")
+    parser.add_argument("--processes", type=int, default=WORKER_PROCESSES, help="Nombre de processus worker.")
+    parser.add_argument("--threads", type=int, default=WORKER_THREADS, help="Nombre d'uploads simultanés par processus.")
+    parser.add_argument("--poll-interval", type=float, default=WORKER_POLL_INTERVAL, help="Délai (s) entre deux lectures d'une file vide.")
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    init_job_queue()
+    init_remote_index()
+    init_webhooks()
+    requeue_stale_jobs()
+
+    processes = [
+        multiprocessing.Process(
+            target=_process_main,
+            args=(args.threads, args.poll_interval),
+            name=f"upload-worker-{i}"
+        )
+        for i in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    logger.info(f"Worker d'upload démarré: {args.processes} processus x {args.threads} threads.")
+
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        logger.info("Arrêt du worker d'upload demandé.")
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+from app.admission import AdmissionController
+
+def test_admission_limits(tmp_path):
+    pending = {"count": 0}
+    admission = AdmissionController(
+        upload_directory=str(tmp_path / "uploads"),
+        pending_jobs_counter=lambda: pending["count"],
+        max_inflight_ingests=1,
+        max_pending_jobs=5,
+        cache_ttl=0
+    )
+
+    assert admission.try_admit() is None
+    assert "uploads en cours" in admission.try_admit()
+    admission.release()
+
+    pending["count"] = 5
+    assert "en attente" in admission.try_admit()
+    pending["count"] = 0
+    assert admission.try_admit() is None
+
+def test_admission_free_disk(tmp_path):
+    admission = AdmissionController(
+        upload_directory=str(tmp_path / "missing" / "uploads"),
+        pending_jobs_counter=lambda: 0,
+        min_free_disk_bytes=2 ** 62,
+        cache_ttl=0
+    )
+    assert "Espace disque" in admission.try_admit()
+
+def test_admission_selected_checks(tmp_path):
+    admission = AdmissionController(
+        upload_directory=str(tmp_path),
+        pending_jobs_counter=lambda: 5,
+        max_pending_jobs=5,
+        min_free_disk_bytes=2 ** 62,
+        cache_ttl=0
+    )
+    # Un morceau de session reprenable ne crée pas de job, une finalisation n'écrit pas de nouvelles données
+    assert "Espace disque" in admission.try_admit(pending_jobs=False)
+    assert "en attente" in admission.try_admit(storage=False)
+    admission.max_pending_jobs = 0
+    assert admission.try_admit(storage=False) is None
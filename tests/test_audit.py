@@ -0,0 +1,32 @@
+import os
+import time
+from sharepoint_connector.audit import (
+    record_event, compact_pending, query_events, EVENT_DOSSIER_RECEIVED, EVENT_UPLOAD_SUCCEEDED
+)
+
+def test_record_compact_and_query(tmp_path, mocker):
+    directory = str(tmp_path)
+    day = time.strftime("%Y-%m-%d")
+    record_event(EVENT_DOSSIER_RECEIVED, "a@example.com", "uploads/a-1", "job-1", 8,
+                 [("Releves/releve.pdf", 8, "ab" * 32)], detail="formulaire", directory=directory)
+    record_event(EVENT_DOSSIER_RECEIVED, "b@example.com", "uploads/b-1", "job-2", 4, [], directory=directory)
+    record_event(EVENT_UPLOAD_SUCCEEDED, "a@example.com", "uploads/a-1", "job-1", directory=directory)
+    with open(tmp_path / f"events-{day}.jsonl", "a", encoding="utf-8") as f:
+        f.write('{"ts": 1, "event"')  # écriture interrompue
+
+    # La journée en cours est lue dans son journal
+    before = query_events(email="a@example.com", directory=directory)
+    assert [event["event"] for event in before] == [EVENT_DOSSIER_RECEIVED, EVENT_UPLOAD_SUCCEEDED]
+
+    # Le lendemain, elle est compactée dans la base du mois
+    assert compact_pending(directory, today="9999-12-31") == 1
+    assert compact_pending(directory, today="9999-12-31") == 0
+    assert not os.path.exists(tmp_path / f"events-{day}.jsonl")
+    assert os.path.exists(tmp_path / f"audit-{day[:7]}.sqlite3")
+
+    events = query_events(email="a@example.com", since=day, until=day, event=EVENT_DOSSIER_RECEIVED, directory=directory)
+    assert len(events) == 1
+    assert events[0]["job_id"] == "job-1"
+    assert events[0]["files"] == [["Releves/releve.pdf", 8, "ab" * 32]]
+    assert query_events(email="a@example.com", since="1990-01-01", until="1990-12-31", directory=directory) == []
+    assert len(query_events(directory=directory)) == 3
@@ -0,0 +1,39 @@
+import json
+import os
+import zipfile
+from sharepoint_connector.bulk_import import run_import
+from sharepoint_connector.job_queue import queue_snapshot, KIND_BULK
+
+def test_bulk_import_from_zip(tmp_path, mocker):
+    mocker.patch("sharepoint_connector.job_queue.JOB_DATABASE_PATH", str(tmp_path / "jobs.sqlite3"))
+    mocker.patch("sharepoint_connector.audit.AUDIT_DIRECTORY", str(tmp_path / "audit"))
+    archive = tmp_path / "scans.zip"
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("a/releve.pdf", b"%PDF-1.4 a")
+        zf.writestr("a/photo.jpg", b"jpeg")
+        zf.writestr("b/releve.pdf", b"%PDF-1.4 b")
+    manifest = tmp_path / "manifest.csv"
+    manifest.write_text(
+        "name,date_of_birth,email,file,description\n"
+        "Alice,1960-01-01,alice@example.com,a/releve.pdf,Releve\n"
+        "Alice,1960-01-01,alice@example.com,a/photo.jpg,\n"
+        "Bob,1955-05-05,bob@example.com,b/releve.pdf,\n"
+        "Carol,1950-02-02,carol@example.com,c/missing.pdf,\n",
+        encoding="utf-8"
+    )
+    report = tmp_path / "report.jsonl"
+
+    summary = run_import(str(manifest), str(archive), str(tmp_path / "uploads"), str(report), enqueue=True)
+
+    assert summary["dossiers"] == 2
+    assert summary["files"] == 3
+    assert summary["ingest_failed"] == 1
+    assert summary["queued"] == 2
+    assert {job["kind"] for job in queue_snapshot()} == {KIND_BULK}
+    # Le dossier en échec n'est pas laissé sur le disque
+    assert len(os.listdir(tmp_path / "uploads")) == 2
+
+    events = [json.loads(line)["event"] for line in report.read_text(encoding="utf-8").splitlines()]
+    assert events[0] == "started"
+    assert events[-1] == "summary"
+    assert events.count("queued") == 2
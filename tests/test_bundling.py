@@ -0,0 +1,34 @@
+import io
+import zipfile
+from sharepoint_connector.bundling import plan_bundle, iter_zip, build_index, count_upload_requests
+
+def _make_dossier(tmp_path):
+    dossier = tmp_path / "a@example.com-1"
+    (dossier / "Photos").mkdir(parents=True)
+    (dossier / "identification_client.txt").write_text("Nom: A\n")
+    for i in range(4):
+        (dossier / "Photos" / f"photo_{i}.jpg").write_bytes(bytes([i]) * 1000)
+    (dossier / "releve.pdf").write_bytes(b"%PDF" + b"x" * 5000)
+    return dossier
+
+def test_plan_and_stream_bundle(tmp_path):
+    dossier = _make_dossier(tmp_path)
+
+    bundle = plan_bundle(str(dossier), threshold_kb=2, min_files=3)
+    assert [relative_path for relative_path, path, size in bundle] == [f"Photos/photo_{i}.jpg" for i in range(4)]
+    assert plan_bundle(str(dossier), threshold_kb=2, min_files=5) == []
+
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(iter_zip(bundle))))
+    assert archive.read("Photos/photo_2.jpg") == bytes([2]) * 1000
+    assert "Photos/photo_3.jpg (1000 octets)" in build_index(bundle).decode("utf-8")
+
+def test_count_upload_requests(tmp_path):
+    dossier = _make_dossier(tmp_path)
+    # Racine + Photos + 6 fichiers, contre racine + identification + pdf + archive + index
+    assert count_upload_requests(str(dossier), threshold_kb=2, min_files=3) == (8, 5)
+
+def test_bundle_names_are_specific_to_the_dossier():
+    from sharepoint_connector.bundling import bundle_names
+    first = bundle_names("uploads/a@example.com-0f8fad5b-d9cb-469f-a165-70867728950e")
+    assert first == ("documents_regroupes_0f8fad5b.zip", "documents_regroupes_0f8fad5b.txt")
+    assert bundle_names("uploads/a@example.com-7c9e6679-7425-40de-944b-e07fc1f90ae7") != first
@@ -0,0 +1,42 @@
+import os
+import pytest
+from sharepoint_connector.compaction import compact_file, compact_dossier
+from sharepoint_connector.integrity import hash_file
+from sharepoint_connector.spool import init_spool, register_dossier, get_file_digests
+
+Image = pytest.importorskip("PIL.Image")
+
+def _photo(path, size):
+    # Dégradé : une photo "réaliste" bien compressible une fois réduite
+    image = Image.linear_gradient("L").resize(size).convert("RGB")
+    image.save(path, "JPEG", quality=100)
+
+def test_compact_large_photo_and_keep_small_gain(tmp_path):
+    photo = tmp_path / "photo.jpg"
+    _photo(photo, (4000, 3000))
+    original_size = os.path.getsize(photo)
+
+    assert compact_file(str(photo), max_side=1000, quality=80, min_saving_percent=10) == (original_size, os.path.getsize(photo))
+    assert os.path.getsize(photo) < original_size
+    with Image.open(photo) as image:
+        assert max(image.size) == 1000
+
+    # Un deuxième passage ne gagne presque rien : le fichier est conservé tel quel
+    size = os.path.getsize(photo)
+    assert compact_file(str(photo), max_side=1000, quality=80, min_saving_percent=50) == (size, size)
+    assert not os.path.exists(str(photo) + ".compact")
+
+def test_compact_dossier_skips_broken_files(tmp_path):
+    db_path = str(tmp_path / "jobs.sqlite3")
+    init_spool(db_path)
+    dossier = tmp_path / "a@example.com-1"
+    dossier.mkdir()
+    _photo(dossier / "photo.jpg", (4000, 3000))
+    (dossier / "scan.pdf").write_bytes(b"pas un pdf")
+    (dossier / "identification_client.txt").write_text("Nom: A\n")
+    register_dossier(str(dossier), "a@example.com", 0, files=[("photo.jpg", *hash_file(str(dossier / "photo.jpg")))], db_path=db_path)
+
+    assert compact_dossier(str(dossier), db_path=db_path) > 0
+    assert (dossier / "scan.pdf").read_bytes() == b"pas un pdf"
+    # L'empreinte de réception suit le fichier compacté
+    assert get_file_digests(str(dossier), db_path=db_path)["photo.jpg"] == hash_file(str(dossier / "photo.jpg"))
@@ -0,0 +1,22 @@
+import pytest
+from sharepoint_connector.config import Settings
+
+def test_settings_from_env():
+    settings = Settings.from_env({
+        "RETRY_COUNT": "7",
+        "WORKER_POLL_INTERVAL": "0.5",
+        "WEBHOOK_URLS": "https://a.example.com/hook, https://b.example.com/hook,",
+        "ALLOWED_EXTENSIONS_STR": ".PDF, .png",
+        "UPLOAD_DIRECTORY": ""
+    })
+
+    assert settings.retry_count == 7
+    assert settings.worker_poll_interval == 0.5
+    assert settings.webhook_urls == ["https://a.example.com/hook", "https://b.example.com/hook"]
+    assert settings.allowed_extensions == [".pdf", ".png"]
+    # Variable vide : valeur par défaut
+    assert settings.upload_directory == "uploaded_files"
+    assert settings.pfx_absolute_path is None
+
+    with pytest.raises(ValueError, match="RETRY_COUNT"):
+        Settings.from_env({"RETRY_COUNT": "trois"})
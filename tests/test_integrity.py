@@ -0,0 +1,48 @@
+import json
+from unittest.mock import Mock
+from sharepoint_connector.integrity import hash_dossier, verify_local_files, verify_uploaded
+from sharepoint_connector.spool import init_spool, register_dossier
+from sharepoint_connector.storage import SharePointBackend
+
+def _batch_response(parts):
+    # Réponse multipart d'un $batch SharePoint : un (statut, métadonnées) par fichier
+    body = ""
+    for status_code, metadata in parts:
+        body += (
+            "--batchresponse_1\r\nContent-Type: application/http\r\nContent-Transfer-Encoding: binary\r\n\r\n"
+            f"HTTP/1.1 {status_code} OK\r\nContent-Type: application/json;odata=verbose\r\n\r\n"
+            f"{json.dumps({'d': metadata}) if metadata else ''}\r\n"
+        )
+    body += "--batchresponse_1--\r\n"
+    return Mock(text=body, headers={"Content-Type": "multipart/mixed; boundary=batchresponse_1"})
+
+def test_verify_uploaded(tmp_path, mocker):
+    db_path = str(tmp_path / "jobs.sqlite3")
+    mocker.patch("sharepoint_connector.job_queue.JOB_DATABASE_PATH", db_path)
+    init_spool()
+    dossier = tmp_path / "a@example.com-1"
+    (dossier / "Releves").mkdir(parents=True)
+    (dossier / "Releves" / "releve.pdf").write_bytes(b"%PDF" * 100)
+    (dossier / "photo.jpg").write_bytes(b"jpg" * 10)
+    register_dossier(str(dossier), "a@example.com", 430, files=hash_dossier(str(dossier)))
+    backend = SharePointBackend(site_url="https://contoso.sharepoint.com", context=Mock(headers={}, form_digest="digest"))
+    uploaded = [
+        {"server_url": "/Archives/a@example.com/Releves/releve.pdf", "size": 400, "etag": "\"{A},1\""},
+        {"server_url": "/Archives/a@example.com/photo.jpg", "size": 30, "etag": None}
+    ]
+
+    post = mocker.patch("sharepoint_connector.sharepoint_utils.http_session.post", return_value=_batch_response([
+        (200, {"Length": "400", "ETag": "\"{A},1\""}),
+        (200, {"Length": "30", "ETag": "\"{B},1\""})
+    ]))
+    assert verify_local_files(str(dossier)) == []
+    assert verify_uploaded(backend, uploaded) == []
+    # Une seule requête $batch pour tous les fichiers
+    assert post.call_count == 1
+    assert post.call_args.args[0].endswith("/_api/$batch")
+
+    # Upload tronqué, fichier absent de SharePoint, fichier local modifié depuis la réception
+    post.return_value = _batch_response([(200, {"Length": "200", "ETag": "\"{A},1\""}), (404, None)])
+    (dossier / "photo.jpg").write_bytes(b"autre")
+    assert len(verify_uploaded(backend, uploaded)) == 2
+    assert len(verify_local_files(str(dossier))) == 1
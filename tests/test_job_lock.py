@@ -0,0 +1,40 @@
+import os
+import time
+from sharepoint_connector.job_lock import DirectoryLease, is_directory_locked, lock_path_for
+
+def test_lease_is_exclusive(tmp_path):
+    upload_dir = tmp_path / "user@example.com-1234"
+    upload_dir.mkdir()
+
+    first = DirectoryLease(str(upload_dir), ttl=60, heartbeat_interval=60)
+    second = DirectoryLease(str(upload_dir), ttl=60, heartbeat_interval=60)
+
+    assert first.acquire()
+    assert is_directory_locked(str(upload_dir))
+    assert not second.acquire()
+
+    first.release()
+    assert not os.path.exists(lock_path_for(str(upload_dir)))
+    assert second.acquire()
+    second.release()
+
+def test_expired_lease_is_taken_over(tmp_path):
+    upload_dir = tmp_path / "user@example.com-5678"
+    upload_dir.mkdir()
+
+    abandoned = DirectoryLease(str(upload_dir), ttl=60, heartbeat_interval=60)
+    assert abandoned.acquire()
+    abandoned._stop.set()  # Simule un worker mort : plus de heartbeat
+    old = time.time() - 120
+    os.utime(lock_path_for(str(upload_dir)), (old, old))
+
+    assert not is_directory_locked(str(upload_dir), ttl=60)
+    successor = DirectoryLease(str(upload_dir), ttl=60, heartbeat_interval=60)
+    assert successor.acquire()
+    assert successor.is_held()
+    assert not abandoned.is_held()
+
+    # Le worker abandonné ne doit pas supprimer le verrou du successeur
+    abandoned.release()
+    assert successor.is_held()
+    successor.release()
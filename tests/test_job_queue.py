@@ -0,0 +1,91 @@
+from sharepoint_connector.job_queue import (
+    init_job_queue, enqueue_upload_job, claim_next_job, complete_job, pending_job_count,
+    queue_snapshot, queue_stats, get_job_status, JobProgress, STATUS_SUCCEEDED, KIND_SUBMISSION, KIND_RETRY, FILE_UPLOADED
+)
+from sharepoint_connector.job_queue import _connect
+
+def test_enqueue_claim_complete(tmp_path):
+    db_path = str(tmp_path / "jobs.sqlite3")
+    init_job_queue(db_path)
+
+    first = enqueue_upload_job("uploads/a@example.com-1", "a@example.com", db_path=db_path)
+    second = enqueue_upload_job("uploads/b@example.com-2", "b@example.com", db_path=db_path)
+    # Un dossier déjà en file n'est pas ajouté une deuxième fois
+    assert enqueue_upload_job("uploads/a@example.com-1", "a@example.com", db_path=db_path) == first
+    assert pending_job_count(db_path) == 2
+
+    job = claim_next_job("worker-1", db_path=db_path)
+    assert job["id"] == first
+    assert claim_next_job("worker-2", db_path=db_path)["id"] == second
+    assert claim_next_job("worker-3", db_path=db_path) is None
+
+    complete_job(first, True, db_path=db_path)
+    assert pending_job_count(db_path) == 1
+    with _connect(db_path) as conn:
+        status = conn.execute("SELECT status FROM upload_jobs WHERE id = ?", (first,)).fetchone()[0]
+    assert status == STATUS_SUCCEEDED
+
+    enqueue_upload_job("uploads/c@example.com-3", "c@example.com", kind=KIND_RETRY, db_path=db_path)
+    assert pending_job_count(db_path) == 2
+    assert pending_job_count(db_path, kind=KIND_SUBMISSION) == 1
+
+def test_priority_aging_and_retry_cap(tmp_path, mocker):
+    db_path = str(tmp_path / "jobs.sqlite3")
+    init_job_queue(db_path)
+    mocker.patch("sharepoint_connector.job_queue.JOB_MAX_RUNNING_RETRIES", 1)
+    clock = mocker.patch("sharepoint_connector.job_queue.time.time", return_value=1000.0)
+
+    retry_1 = enqueue_upload_job("uploads/r1", "r1@example.com", kind=KIND_RETRY, db_path=db_path)
+    retry_2 = enqueue_upload_job("uploads/r2", "r2@example.com", kind=KIND_RETRY, db_path=db_path)
+    fresh = enqueue_upload_job("uploads/s1", "s1@example.com", db_path=db_path)
+
+    # Les nouvelles soumissions passent devant les relances plus anciennes
+    assert [job["job_id"] for job in queue_snapshot(db_path=db_path)] == [fresh, retry_1, retry_2]
+    assert claim_next_job("w", db_path=db_path)["id"] == fresh
+    assert claim_next_job("w", db_path=db_path)["id"] == retry_1
+    # Une seule relance à la fois
+    assert claim_next_job("w", db_path=db_path) is None
+
+    # Après une longue attente, la relance passe devant une soumission récente
+    complete_job(retry_1, True, db_path=db_path)
+    clock.return_value = 1000.0 + 3600
+    later = enqueue_upload_job("uploads/s2", "s2@example.com", db_path=db_path)
+    assert claim_next_job("w", db_path=db_path)["id"] == retry_2
+    assert claim_next_job("w", db_path=db_path)["id"] == later
+
+    stats = queue_stats(window=7200, db_path=db_path)
+    assert stats[KIND_RETRY]["started_in_window"] == 2
+    assert stats[KIND_RETRY]["p95_wait_seconds"] == 3600.0
+
+def test_priority_without_aging(tmp_path, mocker):
+    db_path = str(tmp_path / "jobs.sqlite3")
+    init_job_queue(db_path)
+    mocker.patch("sharepoint_connector.job_queue.JOB_AGING_INTERVAL", 0)
+    clock = mocker.patch("sharepoint_connector.job_queue.time.time", return_value=1000.0)
+
+    retry = enqueue_upload_job("uploads/r1", "r1@example.com", kind=KIND_RETRY, db_path=db_path)
+    clock.return_value = 1000.0 + 86400
+    fresh = enqueue_upload_job("uploads/s1", "s1@example.com", db_path=db_path)
+    # Sans vieillissement, l'ordre reste celui des priorités (et non une division par zéro)
+    assert [job["job_id"] for job in queue_snapshot(db_path=db_path)] == [fresh, retry]
+    assert claim_next_job("w", db_path=db_path)["id"] == fresh
+
+def test_job_progress_and_status(tmp_path):
+    db_path = str(tmp_path / "jobs.sqlite3")
+    init_job_queue(db_path)
+    job_id = enqueue_upload_job("uploads/a@example.com-1", "a@example.com", db_path=db_path)
+
+    progress = JobProgress(job_id, db_path=db_path)
+    progress.set_files([("identification_client.txt", 40), ("Releve/releve.pdf", 1000)])
+    progress.add_attempt("Releve/releve.pdf")
+    progress.add_attempt("Releve/releve.pdf")
+    progress.set_file_state("Releve/releve.pdf", FILE_UPLOADED, bytes_sent=1000)
+    progress.finish(sharepoint_link="https://contoso.sharepoint.com/Archives/a@example.com")
+
+    status = get_job_status(job_id, db_path=db_path)
+    assert status["files_uploaded"] == 1
+    assert status["bytes_total"] == 1040
+    assert status["bytes_sent"] == 1000
+    assert status["retries"] == 1
+    assert status["sharepoint_link"].endswith("a@example.com")
+    assert get_job_status("inconnu", db_path=db_path) is None
@@ -0,0 +1,39 @@
+import pytest
+from fastapi.testclient import TestClient
+from sharepoint_connector.job_queue import init_job_queue, enqueue_upload_job, claim_next_job, get_job_status, KIND_RETRY, KIND_BULK
+
+@pytest.fixture
+def client(tmp_path, mocker):
+    from app.main import app
+    mocker.patch("sharepoint_connector.job_queue.JOB_DATABASE_PATH", str(tmp_path / "jobs.sqlite3"))
+    mocker.patch("app.security.APITokenValidator.check")
+    init_job_queue()
+    # Sans `with` : le lifespan (logs, dispatchers) n'est pas démarré
+    return TestClient(app)
+
+def test_job_events_end_when_job_disappears(client, mocker):
+    job_id = enqueue_upload_job("uploads/a@example.com-1", "a@example.com")
+    claim_next_job("w")
+    running = get_job_status(job_id)
+    mocker.patch("app.main.get_job_status", side_effect=[running, running, None])
+
+    response = client.get(f"/jobs/{job_id}/events", params={"interval": 0})
+    assert response.status_code == 200
+    events = [block.split("\n")[0] for block in response.text.strip().split("\n\n")]
+    assert events == ["event: status", "event: error"]
+
+def test_admission_rejects_when_submissions_pending(client, mocker):
+    from app.main import admission
+    mocker.patch.multiple(
+        admission, max_pending_jobs=1, max_inflight_ingests=0, min_free_disk_bytes=0, max_spool_bytes=0, cache_ttl=0
+    )
+    # Les relances et imports en masse ne comptent pas dans la limite
+    enqueue_upload_job("uploads/r@example.com-1", "r@example.com", kind=KIND_RETRY)
+    enqueue_upload_job("uploads/b@example.com-1", "b@example.com", kind=KIND_BULK)
+    assert client.post("/uploadfiles/").status_code == 422
+
+    enqueue_upload_job("uploads/a@example.com-1", "a@example.com")
+    response = client.post("/uploadfiles/")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(admission.retry_after)
+    assert "en attente" in response.json()["detail"]
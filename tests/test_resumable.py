@@ -0,0 +1,86 @@
+import asyncio
+import os
+import time
+import pytest
+from fastapi import HTTPException
+from app.resumable import (
+    ResumableSessionRequest, create_session, session_status, append_chunk, finalize_session,
+    collect_stale_sessions
+)
+
+PDF = b"%PDF-1.4\n%%EOF\n"
+
+async def stream_of(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+def test_resume_and_finalize(tmp_path):
+    sessions_dir = str(tmp_path / "sessions")
+    os.makedirs(sessions_dir)
+    session = create_session(sessions_dir, ResumableSessionRequest(
+        name="Test", date_of_birth="1960-01-01", email="test@example.com",
+        files=[{"filename": "releve.pdf", "size": len(PDF), "description": "Releve"}]
+    ))
+
+    assert asyncio.run(append_chunk(sessions_dir, session, 0, 0, stream_of(PDF[:3], PDF[3:4]))) == 4
+    # Un client qui renvoie un offset périmé reçoit l'offset courant
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(append_chunk(sessions_dir, session, 0, 0, stream_of(PDF[:4])))
+    assert exc.value.status_code == 409
+    assert exc.value.detail["offset"] == 4
+
+    with pytest.raises(HTTPException):
+        finalize_session(sessions_dir, session, str(tmp_path / "uploads"))
+
+    assert asyncio.run(append_chunk(sessions_dir, session, 0, 4, stream_of(PDF[4:]))) == len(PDF)
+    assert session_status(sessions_dir, session)["files"][0]["complete"]
+
+    upload_dir, files_info, total = finalize_session(sessions_dir, session, str(tmp_path / "uploads"))
+    assert total == len(PDF)
+    with open(files_info[0]["saved_path"], "rb") as f:
+        assert f.read() == PDF
+    assert os.path.dirname(files_info[0]["saved_path"]) == os.path.join(upload_dir, "Releve")
+    assert os.listdir(sessions_dir) == []
+
+def test_part_with_wrong_signature_is_discarded(tmp_path):
+    sessions_dir = str(tmp_path / "sessions")
+    os.makedirs(sessions_dir)
+    html = b"<html>" + b" " * 2000 + b"</html>"
+    session = create_session(sessions_dir, ResumableSessionRequest(
+        name="Test", date_of_birth="1960-01-01", email="test@example.com",
+        files=[{"filename": "releve.pdf", "size": len(html)}]
+    ))
+
+    assert asyncio.run(append_chunk(sessions_dir, session, 0, 0, stream_of(html[:500]))) == 500
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(append_chunk(sessions_dir, session, 0, 500, stream_of(html[500:])))
+    assert exc.value.status_code == 400
+    assert session_status(sessions_dir, session)["files"][0]["offset"] == 0
+
+def test_collect_stale_sessions(tmp_path):
+    sessions_dir = str(tmp_path / "sessions")
+    os.makedirs(sessions_dir)
+    session = create_session(sessions_dir, ResumableSessionRequest(
+        name="Test", date_of_birth="1960-01-01", email="test@example.com",
+        files=[{"filename": "releve.pdf", "size": 8}]
+    ))
+    old = time.time() - 7200
+    os.utime(os.path.join(sessions_dir, session["session_id"], "session.json"), (old, old))
+
+    assert collect_stale_sessions(sessions_dir, ttl=3600) == 1
+    assert os.listdir(sessions_dir) == []
+
+@pytest.mark.parametrize("filename, description", [
+    ("../../evil.pdf", "Releve"),
+    ("..\\evil.pdf", "Releve"),
+    ("releve.pdf", "../../etc"),
+    ("releve.pdf", "a/b"),
+])
+def test_session_rejects_path_traversal(tmp_path, filename, description):
+    with pytest.raises(HTTPException) as exc:
+        create_session(str(tmp_path), ResumableSessionRequest(
+            name="Test", date_of_birth="1960-01-01", email="test@example.com",
+            files=[{"filename": filename, "size": len(PDF), "description": description}]
+        ))
+    assert exc.value.status_code == 400
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,24 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.security import APITokenValidator, APITokenMiddleware
+
+def test_token_middleware_with_rotation():
+    app = FastAPI()
+    app.add_middleware(APITokenMiddleware, validator=APITokenValidator(["ancien-token", "nouveau-token"]))
+
+    @app.post("/uploadfiles/")
+    async def upload():
+        return {"ok": True}
+
+    client = TestClient(app)
+    assert client.post("/uploadfiles/", headers={"X-API-Token": "ancien-token"}).status_code == 200
+    assert client.post("/uploadfiles/", headers={"X-API-Token": "nouveau-token"}).status_code == 200
+
+    response = client.post("/uploadfiles/", files={"files": ("a.pdf", b"x" * 1024)})
+    assert response.status_code == 401
+    assert response.headers["WWW-Authenticate"] == "Bearer"
+    assert client.post("/uploadfiles/", headers={"X-API-Token": "nouveau"}).status_code == 403
+
+def test_validator_without_tokens_rejects_everything():
+    assert not APITokenValidator([]).is_valid("")
+    assert not APITokenValidator([""]).is_valid("token")
@@ -1,10 +1,11 @@
 import pytest
 from unittest.mock import Mock
 import requests
-from sharepoint_connector.sharepoint_utils import create_folder, upload_file_local
+from requests_mock import ANY
+from sharepoint_connector.sharepoint_utils import create_folder, upload_file_local, upload_file_from_url
 
 def test_create_folder_retry(mocker):
-    mock_post = mocker.patch('requests.post')
+    mock_post = mocker.patch('sharepoint_connector.sharepoint_utils.http_session.post')
     mock_post.side_effect = requests.exceptions.ConnectionError()
 
     with pytest.raises(requests.exceptions.ConnectionError):
@@ -17,8 +18,10 @@ def test_create_folder_retry(mocker):
     
     assert mock_post.call_count == 4  # 3 retries + 1 initial attempt
 
-def test_upload_retry_success(mocker):
-    mock_post = mocker.patch('requests.post')
+def test_upload_retry_success(tmp_path, mocker):
+    local_file = tmp_path / "test.txt"
+    local_file.write_bytes(b"contenu")
+    mock_post = mocker.patch('sharepoint_connector.sharepoint_utils.http_session.post')
     mock_post.side_effect = [
         requests.exceptions.Timeout(),
         Mock(status_code=200, text="Success")
@@ -27,10 +30,38 @@ def test_upload_retry_success(mocker):
     response = upload_file_local(
         "https://contoso.sharepoint.com",
         "/sites/test",
-        "test.txt",
+        str(local_file),
         {"Authorization": "Bearer token"},
         "digest"
     )
 
     assert mock_post.call_count == 2
-    assert response.status_code == 200
\ No newline at end of file
+    assert response.status_code == 200
+
+def test_upload_from_url_small_file(requests_mock):
+    requests_mock.get("https://wp.example.com/docs/rel%C3%A9ve.pdf", content=b"x" * 5)
+    add = requests_mock.post("https://contoso.sharepoint.com/_api/web/GetFolderByServerRelativeUrl('/sites/test')/Files/add(url='rel%C3%A9ve.pdf',overwrite=true)")
+
+    upload_file_from_url(
+        "https://contoso.sharepoint.com", "/sites/test", "https://wp.example.com/docs/rel%C3%A9ve.pdf",
+        {"Authorization": "Bearer token"}, "digest", chunk_size=10
+    )
+
+    assert add.call_count == 1
+    assert add.last_request.body == b"x" * 5
+
+def test_upload_from_url_chunked_session(requests_mock):
+    requests_mock.get("https://wp.example.com/scan.pdf", content=b"0123456789" * 2 + b"abcde")
+    requests_mock.post(ANY)
+
+    upload_file_from_url(
+        "https://contoso.sharepoint.com", "/sites/test", "https://wp.example.com/scan.pdf",
+        {"Authorization": "Bearer token"}, "digest", chunk_size=10
+    )
+
+    posts = [request for request in requests_mock.request_history if request.method == "POST"]
+    assert [request.url.split("/")[-1].split("(")[0] for request in posts] == [
+        "add", "StartUpload", "ContinueUpload", "FinishUpload"
+    ]
+    assert [request.body for request in posts[1:]] == [b"0123456789", b"0123456789", b"abcde"]
+    assert "fileOffset=20" in posts[-1].url
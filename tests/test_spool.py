@@ -0,0 +1,53 @@
+import os
+import time
+from sharepoint_connector.spool import (
+    init_spool, register_dossier, mark_dossier_uploaded, list_pending_dossiers,
+    spool_usage, reconcile_spool, collect_garbage
+)
+from sharepoint_connector.job_queue import init_job_queue, enqueue_upload_job, complete_job
+
+def make_dossier(base, name, content=b"data"):
+    path = base / name
+    path.mkdir()
+    (path / "identification_client.txt").write_text("Nom: Test\nEmail: test@example.com\n", encoding="utf-8")
+    (path / "file.pdf").write_bytes(content)
+    return str(path)
+
+def test_reconcile_and_collect(tmp_path, mocker):
+    db_path = str(tmp_path / "jobs.sqlite3")
+    uploads = tmp_path / "uploads"
+    uploads.mkdir()
+    init_spool(db_path)
+    init_job_queue(db_path)
+
+    uploaded = make_dossier(uploads, "a@example.com-1")
+    pending = make_dossier(uploads, "b@example.com-2", b"x" * 100)
+    register_dossier(uploaded, "a@example.com", 4, db_path=db_path)
+
+    # Le dossier inconnu de l'index est ajouté avec sa taille et son email
+    assert reconcile_spool(str(uploads), db_path=db_path) == 1
+    assert {d["upload_dir"] for d in list_pending_dossiers(db_path)} == {os.path.normpath(uploaded), os.path.normpath(pending)}
+    assert next(d for d in list_pending_dossiers(db_path) if d["upload_dir"] == os.path.normpath(pending))["email"] == "test@example.com"
+
+    mark_dossier_uploaded(uploaded, db_path=db_path)
+    assert collect_garbage(db_path=db_path) == 1
+    assert not os.path.exists(uploaded)
+    assert os.path.exists(pending)
+
+    usage = spool_usage(str(uploads), db_path=db_path)
+    assert usage["dossiers"] == 1
+    assert usage["bytes"] > 100
+
+    # Sans SPOOL_MAX_AGE_DAYS, un dossier jamais uploadé n'expire pas
+    mocker.patch("sharepoint_connector.spool.time.time", return_value=time.time() + 365 * 86400)
+    assert collect_garbage(db_path=db_path) == 0
+
+    # Un dossier expiré n'est pas supprimé tant qu'un job d'upload l'attend
+    mocker.patch("sharepoint_connector.spool.SPOOL_MAX_AGE_DAYS", 30)
+    job_id = enqueue_upload_job(pending, "test@example.com", db_path=db_path)
+    assert collect_garbage(db_path=db_path) == 0
+    assert os.path.exists(pending)
+
+    complete_job(job_id, False, db_path=db_path)
+    assert collect_garbage(db_path=db_path) == 1
+    assert not os.path.exists(pending)
@@ -0,0 +1,118 @@
+import os
+import pytest
+from sharepoint_connector.integrity import hash_dossier
+from sharepoint_connector.job_queue import init_job_queue, enqueue_upload_job, claim_next_job, get_job_status
+from sharepoint_connector.sharepoint_uploader import upload_files_to_sharepoint
+from sharepoint_connector.remote_index import init_remote_index
+from sharepoint_connector.spool import init_spool, register_dossier
+from sharepoint_connector.storage import StorageBackend, LocalDirectoryBackend
+from app.utils import create_identification_file
+
+def _make_dossier(tmp_path, mocker, name="a@example.com-1", content=b"%PDF" * 1000):
+    mocker.patch("sharepoint_connector.job_queue.JOB_DATABASE_PATH", str(tmp_path / "jobs.sqlite3"))
+    mocker.patch("sharepoint_connector.audit.AUDIT_DIRECTORY", str(tmp_path / "audit"))
+    mocker.patch("sharepoint_connector.sharepoint_uploader.TARGET_FOLDER_RELATIVE_URL", "Archives")
+    mocker.patch("sharepoint_connector.sharepoint_uploader.envoyer_notifications_success")
+    mocker.patch("sharepoint_connector.sharepoint_uploader.envoyer_notifications_failure")
+    init_job_queue()
+    init_spool()
+    init_remote_index()
+    dossier = tmp_path / "uploads" / name
+    (dossier / "Releves").mkdir(parents=True)
+    create_identification_file(str(dossier), "A", "1960-01-01", "a@example.com")
+    (dossier / "Releves" / "releve.pdf").write_bytes(content)
+    register_dossier(str(dossier), "a@example.com", 0, files=hash_dossier(str(dossier)))
+    return dossier
+
+def test_fan_out_to_local_backends(tmp_path, mocker):
+    dossier = _make_dossier(tmp_path, mocker)
+    archives = [LocalDirectoryBackend(str(tmp_path / "archive_a")), LocalDirectoryBackend(str(tmp_path / "archive_b"))]
+
+    assert upload_files_to_sharepoint(str(dossier), "a@example.com", backends=archives)
+
+    for archive in ["archive_a", "archive_b"]:
+        target = tmp_path / archive / "Archives" / "a@example.com"
+        assert (target / "Releves" / "releve.pdf").read_bytes() == b"%PDF" * 1000
+        assert (target / "identification_client.txt").exists()
+        # Les métadonnées structurées ne quittent pas le spool
+        assert not (target / ".dossier.json").exists()
+    assert not dossier.exists()
+
+def test_failing_backend_keeps_dossier(tmp_path, mocker):
+    dossier = _make_dossier(tmp_path, mocker)
+    broken = LocalDirectoryBackend(str(tmp_path / "archive_b"))
+    mocker.patch.object(broken, "get_files_metadata", side_effect=lambda urls: [None] * len(urls))
+
+    assert not upload_files_to_sharepoint(str(dossier), "a@example.com", backends=[LocalDirectoryBackend(str(tmp_path / "archive_a")), broken])
+    assert os.path.isdir(dossier)
+
+def test_size_mismatch_fails_job_and_keeps_dossier(tmp_path, mocker):
+    dossier = _make_dossier(tmp_path, mocker)
+    job_id = enqueue_upload_job(str(dossier), "a@example.com")
+    claim_next_job("w")
+    archive = LocalDirectoryBackend(str(tmp_path / "archive"))
+    read_metadata = archive.get_files_metadata
+    # La destination annonce une taille différente de celle envoyée (upload tronqué)
+    mocker.patch.object(archive, "get_files_metadata", side_effect=lambda urls: [
+        dict(metadata, Length=metadata["Length"] - 1) for metadata in read_metadata(urls)
+    ])
+
+    assert not upload_files_to_sharepoint(str(dossier), "a@example.com", job_id=job_id, backends=[archive])
+    assert "octets" in get_job_status(job_id)["error"]
+    assert os.path.isdir(dossier)
+
+def test_resubmission_is_incremental(tmp_path, mocker):
+    archive = LocalDirectoryBackend(str(tmp_path / "archive"))
+    put_file = mocker.spy(archive, "put_file")
+    target = tmp_path / "archive" / "Archives" / "a@example.com" / "Releves"
+    assert upload_files_to_sharepoint(str(_make_dossier(tmp_path, mocker)), "a@example.com", backends=[archive])
+    assert put_file.call_count == 2
+
+    # Mêmes documents : rien n'est renvoyé
+    put_file.reset_mock()
+    assert upload_files_to_sharepoint(str(_make_dossier(tmp_path, mocker, "a@example.com-2")), "a@example.com", backends=[archive])
+    assert put_file.call_args_list == []
+
+    # Même nom, autre contenu : le document archivé n'est pas écrasé
+    assert upload_files_to_sharepoint(str(_make_dossier(tmp_path, mocker, "a@example.com-3", b"%PDF" * 2000)), "a@example.com", backends=[archive])
+    assert (target / "releve.pdf").read_bytes() == b"%PDF" * 1000
+    assert (target / "releve_2.pdf").read_bytes() == b"%PDF" * 2000
+
+    # Un fichier supprimé de la destination est renvoyé
+    (target / "releve.pdf").unlink()
+    assert upload_files_to_sharepoint(str(_make_dossier(tmp_path, mocker, "a@example.com-4")), "a@example.com", backends=[archive])
+    assert (target / "releve.pdf").read_bytes() == b"%PDF" * 1000
+
+def test_concurrent_jobs_reserve_distinct_names(tmp_path, mocker):
+    from sharepoint_connector.remote_index import ParticipantIndex
+    mocker.patch("sharepoint_connector.job_queue.JOB_DATABASE_PATH", str(tmp_path / "jobs.sqlite3"))
+    init_remote_index()
+    # Deux jobs du même participant, chargés avant que l'un ou l'autre n'ait envoyé son fichier
+    first, second = ParticipantIndex("local", "a@example.com"), ParticipantIndex("local", "a@example.com")
+
+    assert first.reserve_name("/Archives/a@example.com/Releves", "releve.pdf") == "releve.pdf"
+    assert second.reserve_name("/Archives/a@example.com/Releves", "releve.pdf") == "releve_2.pdf"
+    # Un upload échoué libère son nom
+    first.release()
+    assert ParticipantIndex("local", "a@example.com").reserve_name("/Archives/a@example.com/Releves", "releve.pdf") == "releve.pdf"
+
+def test_incomplete_backend_and_failed_write(tmp_path):
+    class NoMetadataBackend(StorageBackend):
+        def ensure_folder(self, folder): pass
+        def put_file(self, folder, local_path, on_attempt=None, filename=None): pass
+        def put_content(self, folder, filename, content_factory, on_attempt=None): pass
+        def folder_link(self, folder): return folder
+
+    # Une destination incomplète est refusée dès sa création, pas au milieu d'un upload
+    with pytest.raises(TypeError):
+        NoMetadataBackend()
+
+    def broken_content():
+        yield b"%PDF"
+        raise OSError("lecture interrompue")
+
+    archive = LocalDirectoryBackend(str(tmp_path / "archive"))
+    archive.ensure_folder("/Archives/a@example.com")
+    with pytest.raises(OSError):
+        archive.put_content("/Archives/a@example.com", "releve.pdf", broken_content)
+    assert os.listdir(tmp_path / "archive" / "Archives" / "a@example.com") == []
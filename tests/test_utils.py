@@ -0,0 +1,29 @@
+import json
+import os
+from datetime import datetime
+from app.utils import build_file_save_path, create_identification_file, get_user_name, get_user_email, read_dossier_metadata, DOSSIER_METADATA_FILE
+
+def test_dossier_metadata_survives_free_text(tmp_path):
+    create_identification_file(str(tmp_path), "Jean\nEmail: pirate@example.com", "1960-01-01", "jean@example.com")
+
+    assert get_user_name(str(tmp_path)) == "Jean\nEmail: pirate@example.com"
+    assert get_user_email(str(tmp_path)) == "jean@example.com"
+    assert json.loads((tmp_path / DOSSIER_METADATA_FILE).read_text(encoding="utf-8"))["date_of_birth"] == "1960-01-01"
+    # Le fichier texte envoyé sur SharePoint garde une valeur par ligne
+    lines = (tmp_path / "identification_client.txt").read_text(encoding="utf-8").splitlines()
+    assert lines == ["Nom: Jean Email: pirate@example.com", "Date de naissance: 1960-01-01", "Email: jean@example.com"]
+
+def test_legacy_dossier_without_metadata(tmp_path):
+    (tmp_path / "identification_client.txt").write_text("Nom: Marie\nDate de naissance: 1958-03-02\nEmail: marie@example.com\n", encoding="utf-8")
+
+    assert read_dossier_metadata(str(tmp_path)) == {"name": "Marie", "date_of_birth": "1958-03-02", "email": "marie@example.com"}
+    assert read_dossier_metadata(str(tmp_path / "absent")) == {}
+
+def test_same_name_in_same_second_is_not_overwritten(tmp_path, mocker):
+    mocker.patch("app.utils.datetime").now.return_value = datetime(2024, 1, 1, 12, 0, 0)
+    first = build_file_save_path(str(tmp_path), "releve.pdf", "Releves")
+    open(first, "wb").close()
+    second = build_file_save_path(str(tmp_path), "releve.pdf", "Releves")
+
+    assert second != first
+    assert os.path.basename(second) == "releve_20240101120000_2.pdf"
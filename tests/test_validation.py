@@ -0,0 +1,35 @@
+import pytest
+from fastapi import HTTPException
+from app.validation import StreamValidator, validate_file, HEAD_BYTES
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 2000 + b"IEND\xaeB`\x82"
+
+def test_renamed_html_is_rejected_on_first_chunk():
+    validator = StreamValidator("releve.pdf", max_bytes=10 * 1024 * 1024)
+    with pytest.raises(HTTPException) as exc:
+        validator.feed(b"<!DOCTYPE html>" + b" " * HEAD_BYTES)
+    assert exc.value.status_code == 400
+
+def test_truncated_and_empty_files_are_rejected():
+    validator = StreamValidator("releve.pdf", max_bytes=10 * 1024 * 1024)
+    validator.feed(b"%PDF-1.7\n" + b"x" * 5000)
+    with pytest.raises(HTTPException):
+        validator.finish()
+
+    with pytest.raises(HTTPException):
+        StreamValidator("vide.pdf").finish()
+
+def test_size_limit():
+    validator = StreamValidator("photo.png", max_bytes=1000)
+    with pytest.raises(HTTPException) as exc:
+        validator.feed(PNG)
+    assert exc.value.status_code == 413
+
+def test_validate_file_reads_head_and_tail(tmp_path):
+    path = tmp_path / "photo.png"
+    path.write_bytes(PNG[:8] + b"\x00" * 5 * 1024 * 1024 + PNG[8:])
+    validate_file(str(path), "photo.png")
+
+    path.write_bytes(PNG[:-12])
+    with pytest.raises(HTTPException):
+        validate_file(str(path), "photo.png")
@@ -0,0 +1,82 @@
+import json
+import pytest
+import requests
+from sharepoint_connector.job_queue import init_job_queue, enqueue_upload_job, claim_next_job, complete_job, KIND_RETRY
+from sharepoint_connector.webhooks import (
+    init_webhooks, enqueue_job_webhook, add_job_webhooks, deliver_pending_webhooks, purge_webhook_outbox, sign_payload
+)
+from sharepoint_connector.job_queue import _connect
+
+def test_webhook_batched_signed_and_retried(tmp_path, mocker):
+    db_path = str(tmp_path / "jobs.sqlite3")
+    init_job_queue(db_path)
+    init_webhooks(db_path)
+    mocker.patch("sharepoint_connector.webhooks.WEBHOOK_SECRET", "s3cret")
+    clock = mocker.patch("sharepoint_connector.webhooks.time.time", return_value=1000.0)
+
+    ok = enqueue_upload_job("uploads/a", "a@example.com", reference="42", db_path=db_path)
+    ko = enqueue_upload_job("uploads/b", "b@example.com", reference="43", db_path=db_path)
+    hook = "https://wp.example.com/wp-json/sharepoint-connect/v1/webhook"
+    for _ in range(2):
+        job = claim_next_job("w", db_path=db_path)
+        # Le webhook est ajouté à l'outbox dans la transaction qui termine le job
+        complete_job(
+            job["id"], job["id"] == ok, db_path=db_path,
+            on_complete=lambda conn, status: add_job_webhooks(conn, status, urls=[hook])
+        )
+
+    post = mocker.patch(
+        "sharepoint_connector.webhooks.requests.post",
+        side_effect=requests.exceptions.ConnectionError("down")
+    )
+    assert deliver_pending_webhooks(db_path=db_path) == 0
+    # Les deux événements partent dans une seule requête
+    assert post.call_count == 1
+    # Rien n'est renvoyé avant la fin du délai de reprise
+    assert deliver_pending_webhooks(db_path=db_path) == 0
+    assert post.call_count == 1
+
+    post.side_effect = None
+    post.return_value.raise_for_status.return_value = None
+    clock.return_value = 2000.0
+    assert deliver_pending_webhooks(db_path=db_path) == 2
+    body = post.call_args.kwargs["data"]
+    headers = post.call_args.kwargs["headers"]
+    assert headers["X-Webhook-Signature"] == sign_payload(body, headers["X-Webhook-Timestamp"], "s3cret")
+    events = {event["reference"]: event["type"] for event in json.loads(body)["events"]}
+    assert events == {"42": "upload.succeeded", "43": "upload.failed"}
+    assert deliver_pending_webhooks(db_path=db_path) == 0
+
+    # Une relance du même dossier garde la référence de l'entrée WordPress
+    retry = enqueue_upload_job("uploads/b", "b@example.com", kind=KIND_RETRY, db_path=db_path)
+    with _connect(db_path) as conn:
+        assert conn.execute("SELECT reference FROM upload_jobs WHERE id = ?", (retry,)).fetchone()[0] == "43"
+
+def test_webhook_rolled_back_with_job_and_purged(tmp_path, mocker):
+    db_path = str(tmp_path / "jobs.sqlite3")
+    init_job_queue(db_path)
+    init_webhooks(db_path)
+    hook = "https://wp.example.com/webhook"
+    job_id = enqueue_upload_job("uploads/a", "a@example.com", db_path=db_path)
+    claim_next_job("w", db_path=db_path)
+
+    def failing_outbox(conn, status):
+        add_job_webhooks(conn, status, urls=[hook])
+        raise RuntimeError("outbox indisponible")
+
+    # Ni le job ni son webhook ne sont enregistrés à moitié
+    with pytest.raises(RuntimeError):
+        complete_job(job_id, True, db_path=db_path, on_complete=failing_outbox)
+    with _connect(db_path) as conn:
+        assert conn.execute("SELECT status FROM upload_jobs WHERE id = ?", (job_id,)).fetchone()[0] == "running"
+        assert conn.execute("SELECT COUNT(*) FROM webhook_outbox").fetchone()[0] == 0
+
+    assert enqueue_job_webhook(job_id, urls=[hook, hook + "/2"], db_path=db_path) == 2
+    mocker.patch("sharepoint_connector.webhooks.WEBHOOK_MAX_ATTEMPTS", 1)
+    with _connect(db_path) as conn:
+        conn.execute("UPDATE webhook_outbox SET delivered_at = 1000 WHERE url = ?", (hook,))
+        conn.execute("UPDATE webhook_outbox SET attempts = 1, next_attempt_at = 1000 WHERE url != ?", (hook,))
+    mocker.patch("sharepoint_connector.webhooks.time.time", return_value=1000.0 + 86400)
+    assert purge_webhook_outbox(retention_days=2, db_path=db_path) == 0
+    mocker.patch("sharepoint_connector.webhooks.time.time", return_value=1000.0 + 3 * 86400)
+    assert purge_webhook_outbox(retention_days=2, db_path=db_path) == 2